@@ -0,0 +1,318 @@
+"""
+Benchmarks the sitemap generation throughput.
+
+For each of the sizes given, the foo items table is seeded with that many
+rows and the ``get_urls`` of the ``ImagesSitemap``, ``StaticSitemap`` and
+``RelAlternateHreflangSitemap``, as well as the full view rendering, are
+measured on the first and the last page. URLs per second, queries per page
+and bytes per page are reported and stored as JSON, so that the results of
+different releases can be compared (see the ``--compare`` option).
+
+Every size is seeded and measured in a transaction, which is rolled back
+afterwards, so the foo items of the database are left untouched. Note,
+that the default cache is cleared (cached counts, page boundaries and
+pages of the seeded rows).
+
+:example:
+$ ./manage.py foo_benchmark --sizes=10000,100000,1000000 --output=0.7.json
+$ ./manage.py foo_benchmark --sizes=10000 --compare=0.7.json
+"""
+import datetime
+import json
+import platform
+import time
+from optparse import make_option
+
+from six.moves import range
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.template import loader
+from django.test.client import RequestFactory
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+
+try:
+    from django.urls import resolve
+except ImportError: # Django < 1.10
+    from django.core.urlresolvers import resolve
+
+try:
+    from django.test.utils import CaptureQueriesContext
+except ImportError: # Django < 1.6
+    CaptureQueriesContext = None
+
+import qartez
+from qartez.serializers import serialize_images_urlset, \
+                               serialize_rel_alternate_hreflang_urlset
+
+from foo.models import FooItem
+from foo.sitemap import foo_item_images_sitemap, foo_static_sitemap, \
+                        FooItemAlternateHreflangSitemap
+
+DEFAULT_SIZES = '10000,100000,1000000'
+
+BATCH_SIZE = 1000
+
+OPTIONS = (
+    (('--sizes',), {
+        'dest': 'sizes',
+        'default': DEFAULT_SIZES,
+        'help': "Comma separated numbers of rows to seed. Defaults to "
+                "\"{0}\".".format(DEFAULT_SIZES)}),
+    (('--repeat',), {
+        'dest': 'repeat',
+        'default': 3,
+        'help': "Number of runs of every measurement (best one is "
+                "reported). Defaults to 3."}),
+    (('--output',), {
+        'dest': 'output',
+        'default': None,
+        'help': "File to write the results (JSON) to."}),
+    (('--compare',), {
+        'dest': 'compare',
+        'default': None,
+        'help': "File with the previous results (JSON) to compare with."}),
+)
+
+def seed(size):
+    """
+    Replaces all the foo items with ``size`` new ones (shall be called in a
+    transaction, which is rolled back afterwards).
+
+    :param int size:
+    """
+    FooItem._default_manager.all().delete()
+    now = timezone.now()
+    for start in range(0, size, BATCH_SIZE):
+        FooItem._default_manager.bulk_create([
+            FooItem(
+                title='Foo item {0}'.format(index),
+                slug='foo-item-{0}'.format(index),
+                body='Foo item {0} & body'.format(index),
+                image='foo-images/foo-item-{0}.jpg'.format(index),
+                alternative_url='http://en-us.example.com/{0}/'.format(index),
+                date_published=now - datetime.timedelta(minutes=index),
+                ) \
+            for index in range(start, min(start + BATCH_SIZE, size))
+            ])
+
+def measure(func, repeat):
+    """
+    Runs the function given ``repeat`` times. Returns the best time, the
+    number of queries made (by a single run) and the result.
+
+    :param callable func:
+    :param int repeat:
+    :return tuple: (seconds, queries, result)
+    """
+    best, queries, result = None, None, None
+    for run in range(repeat):
+        if CaptureQueriesContext is not None:
+            with CaptureQueriesContext(connection) as context:
+                start = time.time()
+                result = func()
+                seconds = time.time() - start
+            queries = len(context.captured_queries)
+        else:
+            start = time.time()
+            result = func()
+            seconds = time.time() - start
+        if best is None or seconds < best:
+            best = seconds
+    return (best, queries, result)
+
+def get_benchmarks():
+    """
+    Gets the benchmarks: tuples of the name, sitemap and a function taking
+    the page number and returning a tuple of the number of URLs and the
+    bytes produced.
+
+    :return list:
+    """
+    images_sitemap = foo_item_images_sitemap['foo_item_images']
+    hreflang_sitemap = FooItemAlternateHreflangSitemap()
+    request_factory = RequestFactory()
+
+    def images_get_urls(page):
+        urls = images_sitemap.get_urls(page)
+        return (len(urls), len(serialize_images_urlset(urls)))
+
+    def hreflang_get_urls(page):
+        urls = hreflang_sitemap.get_urls(page)
+        return (len(urls), len(serialize_rel_alternate_hreflang_urlset(urls)))
+
+    def static_get_urls(page):
+        urls = foo_static_sitemap.get_urls(page)
+        # Rendered the same way as by the ``django.contrib.sitemaps`` views
+        content = force_bytes(
+            loader.render_to_string('sitemap.xml', {'urlset': urls})
+            )
+        return (len(urls), len(content))
+
+    def view(url):
+        match = resolve(url)
+        def render(page):
+            response = match.func(
+                request_factory.get(url, {'p': page}), *match.args,
+                **match.kwargs
+                )
+            if hasattr(response, 'render'):
+                response.render()
+            if 200 != response.status_code:
+                raise CommandError(
+                    "{0} responded with {1}".format(url, response.status_code)
+                    )
+            content = force_bytes(response.content)
+            return (content.count(b'<url>'), len(content))
+        return render
+
+    return [
+        ('ImagesSitemap.get_urls', images_sitemap, images_get_urls),
+        ('RelAlternateHreflangSitemap.get_urls', hreflang_sitemap,
+         hreflang_get_urls),
+        ('StaticSitemap.get_urls', foo_static_sitemap, static_get_urls),
+        ('render_images_sitemap', images_sitemap,
+         view('/sitemap-foo-images.xml')),
+        ('sitemap (alternate hreflang)', hreflang_sitemap,
+         view('/sitemap-foo-items-alternate-hreflang.xml')),
+    ]
+
+
+class Rollback(Exception):
+    """
+    Raised to roll back the transaction of the seeded rows.
+    """
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the sitemap generation throughput."
+
+    if django.VERSION < (1, 8):
+        option_list = BaseCommand.option_list + tuple(
+            make_option(*args, **kwargs) for args, kwargs in OPTIONS
+            )
+
+    def add_arguments(self, parser):
+        for args, kwargs in OPTIONS:
+            parser.add_argument(*args, **kwargs)
+
+    def run(self, size, repeat):
+        """
+        Seeds the database and runs all the benchmarks, in a transaction,
+        which is rolled back afterwards.
+
+        :param int size:
+        :param int repeat:
+        :return list:
+        """
+        # Django < 1.6
+        atomic = getattr(transaction, 'atomic', None) \
+                 or transaction.commit_on_success
+        results = []
+        try:
+            with atomic():
+                self.stdout.write("Seeding {0} rows...".format(size))
+                seed(size)
+                # Drop the cached counts, page boundaries and pages of the
+                # old rows
+                cache.clear()
+                results.extend(self.run_benchmarks(size, repeat))
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            # Drop the ones of the seeded rows
+            cache.clear()
+        return results
+
+    def run_benchmarks(self, size, repeat):
+        """
+        Runs all the benchmarks against the rows seeded.
+
+        :param int size:
+        :param int repeat:
+        :return list:
+        """
+        results = []
+        for name, sitemap, benchmark in get_benchmarks():
+            num_pages = sitemap.paginator.num_pages
+            for page in sorted(set([1, num_pages])):
+                seconds, queries, (num_urls, num_bytes) = measure(
+                    lambda: benchmark(page), repeat
+                    )
+                result = {
+                    'size': size,
+                    'benchmark': name,
+                    'page': page,
+                    'urls': num_urls,
+                    'seconds': seconds,
+                    'urls_per_second': num_urls / seconds if seconds else None,
+                    'queries': queries,
+                    'bytes': num_bytes,
+                    }
+                results.append(result)
+                self.stdout.write(
+                    "{size:>8} {benchmark:<38} page {page:<4} "
+                    "{urls:>6} urls {seconds:>8.3f}s {queries!s:>4} queries "
+                    "{bytes!s:>9} bytes".format(**result)
+                    )
+        return results
+
+    def compare(self, results, path):
+        """
+        Prints the URLs per second ratio of the results given to the
+        previous ones.
+
+        :param list results:
+        :param str path:
+        """
+        with open(path) as previous_file:
+            previous = json.load(previous_file)
+
+        previous_results = dict(
+            ((result['size'], result['benchmark'], result['page']), result) \
+            for result in previous['results']
+            )
+        self.stdout.write("Compared to {0} (qartez {1}):".format(
+            path, previous.get('qartez_version')
+            ))
+        for result in results:
+            key = (result['size'], result['benchmark'], result['page'])
+            old = previous_results.get(key)
+            if not old or not old['urls_per_second'] \
+               or not result['urls_per_second']:
+                continue
+            self.stdout.write("{0:>8} {1:<38} page {2:<4} {3:>6.2f}x".format(
+                result['size'], result['benchmark'], result['page'],
+                result['urls_per_second'] / old['urls_per_second']
+                ))
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [
+                int(size) for size in options['sizes'].split(',') if size
+                ]
+        except ValueError:
+            raise CommandError("Invalid sizes: {0}".format(options['sizes']))
+
+        results = []
+        for size in sizes:
+            results.extend(self.run(size, int(options.get('repeat') or 1)))
+
+        output = {
+            'qartez_version': qartez.__version__,
+            'django_version': django.get_version(),
+            'python_version': platform.python_version(),
+            'database': connection.vendor,
+            'date': timezone.now().isoformat(),
+            'results': results,
+            }
+        if options.get('output'):
+            with open(options['output'], 'w') as output_file:
+                json.dump(output, output_file, indent=4, sort_keys=True)
+
+        if options.get('compare'):
+            self.compare(results, options['compare'])
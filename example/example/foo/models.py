@@ -2,7 +2,10 @@ import datetime
 
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
-from django.core.urlresolvers import reverse
+try:
+    from django.urls import reverse
+except ImportError: # Django < 1.10
+    from django.core.urlresolvers import reverse
 
 FOO_IMAGES_STORAGE_PATH = 'foo-images'
 
@@ -3,6 +3,7 @@ __all__ = ('foo_item_images_sitemap', 'foo_static_sitemap', 'FooItemSitemap')
 from django.contrib.sitemaps import Sitemap
 
 from qartez import ImagesSitemap, StaticSitemap, RelAlternateHreflangSitemap
+from qartez.dirty import track_dirty_pages, is_cache_shared
 
 from foo.models import FooItem
 
@@ -10,13 +11,22 @@ foo_item_images_info_dict = {
     'queryset': FooItem._default_manager.exclude(image=None), # Queryset
     'image_location_field': 'image_url', # Image location
     'image_title_field': 'title', # Image title
-    'location_field': 'get_absolute_url' # An absolute URL of the page where image is shown
+    'location_field': 'get_absolute_url', # An absolute URL of the page where image is shown
+    'projection': True, # Fetch only the columns needed
+    'projection_fields': ['image', 'slug'], # Columns used by `image_url` and `get_absolute_url`
+    'date_field': 'date_published', # Used for the lastmod
 }
 
 foo_item_images_sitemap = {
     'foo_item_images': ImagesSitemap(foo_item_images_info_dict, priority=0.6),
 }
 
+# Flag the changed pages, so that `qartez_generate --dirty` regenerates only those. The flags shall be
+# seen by the process running `qartez_generate`, so it's only done if the default cache is shared by the
+# processes (not the default `LocMemCache` of the example project).
+if is_cache_shared():
+    track_dirty_pages(foo_item_images_sitemap)
+
 # Sitemap for service pages like welcome and feedback.
 foo_static_sitemap = StaticSitemap(priority=0.1, changefreq='never')
 foo_static_sitemap.add_named_pattern('foo.welcome')
@@ -29,6 +39,9 @@ class FooItemSitemap(Sitemap):
     changefreq = "weekly"
     priority = 1.0
 
+    # Models invalidating the cached pages (see ``qartez.cache``).
+    page_cache_models = [FooItem]
+
     def location(self, obj):
         return obj.get_absolute_url()
 
@@ -45,6 +58,13 @@ class FooItemAlternateHreflangSitemap(RelAlternateHreflangSitemap):
     # If you want to serve the links on HTTPS.
     protocol = 'https'
 
+    # Models invalidating the cached pages (see ``qartez.cache``).
+    page_cache_models = [FooItem]
+
+    # Build the locations without calling ``reverse`` for every item.
+    location_url_name = 'foo.detail'
+    location_url_kwargs = {'slug': 'slug'}
+
     def alternate_hreflangs(self, item):
         return [('en-us', item.alternative_url),]
 
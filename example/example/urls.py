@@ -5,6 +5,8 @@ from django.contrib import admin
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.conf.urls.static import static
 
+from qartez.cache import invalidate_page_cache_on_change
+
 from foo.sitemap import foo_item_images_sitemap, foo_static_sitemap, FooItemSitemap, FooItemAlternateHreflangSitemap
 
 sitemaps = {
@@ -13,6 +15,10 @@ sitemaps = {
     'foo-static': foo_static_sitemap
 }
 
+# Drop the cached sitemap pages once the items change.
+invalidate_page_cache_on_change(foo_item_images_sitemap)
+invalidate_page_cache_on_change(sitemaps)
+
 admin.autodiscover()
 
 urlpatterns = patterns('',
@@ -28,6 +34,19 @@ urlpatterns = patterns('',
     # Sitemaps
     (r'^sitemap\.xml$', 'django.contrib.sitemaps.views.index', {'sitemaps': sitemaps}),
     (r'^sitemap-foo-images\.xml$', 'qartez.views.render_images_sitemap', {'sitemaps': foo_item_images_sitemap}),
+    (r'^sitemap-foo-images-streaming\.xml$', 'qartez.views.render_images_sitemap',
+     {'sitemaps': foo_item_images_sitemap, 'streaming': True}),
+
+    # Index of the images sitemaps, listing all the pages of all sections.
+    (r'^sitemap-images\.xml$', 'qartez.views.images_sitemap_index',
+     {'sitemaps': foo_item_images_sitemap, 'sitemap_url_name': 'qartez_images_sitemap', 'conditional': True}),
+    url(r'^sitemap-images-(?P<section>.+)\.xml$', 'qartez.views.render_images_sitemap',
+        {'sitemaps': foo_item_images_sitemap, 'conditional': True}, name='qartez_images_sitemap'),
+
+    # Cached sitemaps (see ``qartez.cache``).
+    (r'^sitemap-foo-images-cached\.xml$', 'qartez.views.cached_images_sitemap',
+     {'sitemaps': foo_item_images_sitemap}),
+    (r'^sitemap-cached-(?P<section>.+)\.xml$', 'qartez.views.cached_sitemap', {'sitemaps': sitemaps}),
 
     # Note, that it's necessary to add the 'template_name': 'qartez/rel_alternate_hreflang_sitemap.xml' only in case
     # if you are going to use the ``qartez.RelAlternateHreflangSitemap``.
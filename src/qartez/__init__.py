@@ -2,26 +2,106 @@ __title__ = 'django-qartez'
 __version__ = '0.6'
 __build__ = 0x000006
 __author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
-__all__ = ('ImagesSitemap', 'StaticSitemap', 'RelAlternateHreflangSitemap',)
+__all__ = (
+    'ImagesSitemap', 'StaticSitemap', 'StaticSitemapEntry',
+    'StaticSitemapError', 'FileStaticSitemap', 'RelAlternateHreflangSitemap',
+)
 
 import datetime
+import types
+import warnings
+from collections import namedtuple
+from itertools import islice
+from operator import attrgetter
 
-from six import PY3
+from six import PY3, string_types, text_type
+from six.moves import map
 
 from django.contrib.sitemaps import Sitemap, GenericSitemap
-from django.core.urlresolvers import reverse_lazy
-from django.utils.functional import lazy
-from django.contrib.sites.models import Site
 from django.core.exceptions import ImproperlyConfigured
+try:
+    from django.urls import reverse, get_urlconf, get_script_prefix
+except ImportError: # Django < 1.10
+    from django.core.urlresolvers import reverse, get_urlconf, \
+                                      get_script_prefix
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.functional import lazy
 
-from qartez.constants import REL_ALTERNATE_HREFLANG_SITEMAP_TEMPLATE
+try:
+    from django.db.models import Prefetch
+except ImportError: # Django < 1.7
+    Prefetch = None
+
+from qartez.cache import hreflang_cluster_cache
+from qartez.instrumentation import Measurement
+from qartez.files import FileEntries
+from qartez.entries import ImageEntry, ImagesUrlEntry, \
+                           RelAlternateHreflangUrlEntry, StaticUrlEntry
+from qartez.constants import REL_ALTERNATE_HREFLANG_SITEMAP_TEMPLATE, \
+                             MAX_IMAGES_PER_URL
+from qartez.serializers import serialize_images_urlset, \
+                               serialize_rel_alternate_hreflang_urlset
+from qartez.mixins import PaginationMixin, LocationBuilderMixin, \
+                           IterationMixin
+from qartez.utils import is_concrete_field, unique, as_datetime, \
+                         is_urlconf_loaded
 from qartez.settings import (
-    PREPEND_LOC_URL_WITH_SITE_URL, PREPEND_IMAGE_LOC_URL_WITH_SITE_URL
+    PREPEND_LOC_URL_WITH_SITE_URL, PREPEND_IMAGE_LOC_URL_WITH_SITE_URL,
+    HREFLANG_CLUSTER_CACHE_TIMEOUT, CHANGEFREQ
     )
 
 PY2 = not PY3
 
-class ImagesSitemap(GenericSitemap):
+VALID_CHANGEFREQ = frozenset(CHANGEFREQ)
+
+# Compiled accessors of the ``ImagesSitemap`` URL entry fields (see
+# ``ImagesSitemap.compile_accessors``). Each one is a (function, value)
+# tuple: the function is called with the item, unless it's None, in which
+# case the (constant) value is taken.
+ImagesSitemapAccessors = namedtuple('ImagesSitemapAccessors', (
+    'location', 'lastmod', 'changefreq', 'priority', 'image_location',
+    'image_caption', 'image_title', 'image_license', 'image_geo_location',
+    ))
+
+def compile_accessor(sitemap, name):
+    """
+    Compiles the accessor of the sitemap attribute given: a (bound method,
+    None) tuple for the methods, a (None, value) tuple for the constants.
+
+    :param django.contrib.sitemaps.Sitemap sitemap:
+    :param str name:
+    :return tuple:
+    """
+    attr = getattr(sitemap, name, None)
+    if callable(attr):
+        return (attr, None)
+    return (None, attr)
+
+def is_default_method(sitemap, name, cls):
+    """
+    Checks if the method of the sitemap given is the one of the class given
+    (not overridden, nor replaced on the instance). Overriding with a
+    constant (``lastmod = datetime(...)``) or any other non function value
+    counts as well.
+
+    :param django.contrib.sitemaps.Sitemap sitemap:
+    :param str name:
+    :param type cls:
+    :return bool:
+    """
+    if name in getattr(sitemap, '__dict__', {}):
+        return False
+    # Unbound methods (Python 2) are unwrapped, anything else but a function
+    # is an override
+    attr = getattr(sitemap.__class__, name)
+    func = getattr(attr, '__func__', attr)
+    if not isinstance(func, types.FunctionType):
+        return False
+    default = getattr(cls, name)
+    return func is getattr(default, '__func__', default)
+
+class ImagesSitemap(LocationBuilderMixin, PaginationMixin, IterationMixin, \
+                    GenericSitemap):
     """
     Class for image sitemap. Implemented accordings to specs specifed by Google
     http://www.google.com/support/webmasters/bin/answer.py?answer=178636
@@ -33,15 +113,68 @@ class ImagesSitemap(GenericSitemap):
     >>>     'queryset': FooItem._default_manager.exclude(image=None), # queryset
     >>>     'image_location_field': 'image', # image location
     >>>     'image_title_field': 'title', # image title
-    >>>     'location_field': 'get_absolute_url' # an absolute URL of the page
-    >>>                                          # where image is shown
+    >>>     'location_field': 'get_absolute_url', # an absolute URL of the page
+    >>>                                           # where image is shown
+    >>>     'keyset_pagination': True, # optional, use keyset pagination
+    >>>     'keyset_field': 'pk', # optional, keyset pagination column
+    >>>     'cached_count': True, # optional, take the item count from cache
+    >>>     'max_page_bytes': 10 * 1024 * 1024, # optional, max page size
+    >>>     'projection': True, # optional, fetch only the columns needed
+    >>>     'projection_fields': ['slug'], # optional, columns needed by
+    >>>                                    # callables and properties
+    >>>     'location_url_name': 'foo.detail', # optional, URL name and the
+    >>>     'location_url_kwargs': {'slug': 'slug'}, # field-to-kwarg mapping
+    >>>                                               # to build the location
+    >>>     'page_cache_timeout': 600, # optional, rendered page cache timeout
+    >>>     'page_cache_models': [FooItem], # optional, models invalidating
+    >>>                                     # the rendered page cache
     >>> }
     >>>
     >>> foo_item_images_sitemap = {
     >>>     'foo_item_images': ImagesSitemap(foo_item_images_info_dict, \
     >>>                                      priority=0.6),
     >>> }
+
+    When ``images_field`` (name of a reverse foreign key or a many to many
+    relation of the item) is given, all the related images are listed under
+    the item URL (``max_images`` at most, 1000 by default - the limit of
+    the specs). The related images are loaded with a single
+    ``prefetch_related`` query per page (ordered/filtered by the
+    ``images_queryset`` if given, Django >= 1.7). The ``image_*_field``
+    values then refer to the fields of the related image objects.
+
+    >>> foo_item_gallery_info_dict = {
+    >>>     'queryset': FooItem._default_manager.all(),
+    >>>     'location_field': 'get_absolute_url',
+    >>>     'images_field': 'gallery_images', # related images
+    >>>     'image_location_field': 'image_url', # of the related image
+    >>>     'image_caption_field': 'caption', # of the related image
+    >>> }
+
+    When ``projection`` is set to True, only the columns the sitemap reads
+    are fetched from the database. If all the ``*_field`` values of the
+    ``info_dict`` (and the ``date_field``) are concrete model fields, the
+    items are fetched with ``values_list`` and passed to the accessors as
+    plain (named) tuples - no model instances are created at all. Otherwise
+    (callables, properties), model instances are fetched with ``only``,
+    limited to the concrete fields plus the ``projection_fields`` (list all
+    the fields your callables and properties need in there, since accessing
+    a deferred field costs an extra query per item).
+
+    When ``location_url_name`` and ``location_url_kwargs`` are given, the
+    location is built with a precompiled ``qartez.builders.LocationBuilder``
+    (instead of calling ``reverse`` for every item) and the
+    ``location_field`` is ignored.
+
+    The image license and geo location are not rendered by the bundled
+    template and serializer, so they're not computed (nor fetched in
+    projection mode) unless ``image_extra_fields`` is set to True (for the
+    custom templates rendering them).
     """
+    template_name = 'qartez/images_sitemap.xml'
+    urlset_serializer = staticmethod(serialize_images_urlset)
+    image_extra_fields = False
+
     def __init__(self, info_dict, priority=None, changefreq=None):
         """
         Constructor.
@@ -64,9 +197,112 @@ class ImagesSitemap(GenericSitemap):
             'image_geo_location_field', None
             )
         self.image_license_field = info_dict.get('image_license_field', None)
+        self.image_extra_fields = info_dict.get(
+            'image_extra_fields', self.image_extra_fields
+            )
         self.location_field = info_dict.get('location_field', None)
+        self.keyset_pagination = info_dict.get(
+            'keyset_pagination', self.keyset_pagination
+            )
+        self.keyset_field = info_dict.get('keyset_field', self.keyset_field)
+        self.cached_count = info_dict.get('cached_count', self.cached_count)
+        self.max_page_bytes = info_dict.get(
+            'max_page_bytes', self.max_page_bytes
+            )
+        self.page_size_sample = info_dict.get(
+            'page_size_sample', self.page_size_sample
+            )
+        self.projection = info_dict.get('projection', False)
+        self.projection_fields = info_dict.get('projection_fields', [])
+        self.location_url_name = info_dict.get(
+            'location_url_name', self.location_url_name
+            )
+        self.location_url_kwargs = info_dict.get(
+            'location_url_kwargs', self.location_url_kwargs
+            )
+        self.page_cache_timeout = info_dict.get('page_cache_timeout', None)
+        self.page_cache_models = info_dict.get('page_cache_models', None)
+        self.images_field = info_dict.get('images_field', None)
+        self.images_queryset = info_dict.get('images_queryset', None)
+        if self.images_queryset is not None and Prefetch is None:
+            raise ImproperlyConfigured(
+                "The images_queryset requires Django 1.7 or later."
+                )
+        self.max_images = info_dict.get('max_images', MAX_IMAGES_PER_URL)
+        self._projection = None
+        self._accessors = None
         super(ImagesSitemap, self).__init__(info_dict, priority, changefreq)
 
+    def get_projection(self):
+        """
+        Gets the projection of the sitemap queryset. Returns a tuple of the
+        projection mode ("values_list" or "only"), list of fields and the
+        named tuple class used for the rows (None for "only" mode).
+
+        :return tuple:
+        """
+        if self._projection is not None:
+            return self._projection
+
+        model = self.queryset.model
+        location_builder = self.location_builder
+        if location_builder is not None:
+            location_fields = list(location_builder.fields)
+        else:
+            location_fields = [self.location_field]
+        if self.images_field:
+            # Image fields belong to the related objects
+            image_fields = []
+        else:
+            image_fields = [
+                self.image_location_field,
+                self.image_caption_field,
+                self.image_title_field,
+                ]
+            if self.image_extra_fields:
+                image_fields += [
+                    self.image_geo_location_field,
+                    self.image_license_field,
+                    ]
+        fields = unique(image_fields + [self.date_field] + location_fields)
+        concrete_fields = [f for f in fields if is_concrete_field(model, f)]
+
+        # Location defaults to ``get_absolute_url``, which needs an instance.
+        # Related images can only be prefetched for the instances as well.
+        if all(location_fields) and not self.images_field \
+           and len(concrete_fields) == len(fields):
+            row_class = namedtuple('ImagesSitemapRow', concrete_fields)
+            self._projection = ('values_list', concrete_fields, row_class)
+        else:
+            fields = unique(concrete_fields + list(self.projection_fields))
+            self._projection = ('only', fields, None)
+
+        return self._projection
+
+    def items(self):
+        """
+        Returns sitemap items. In projection mode, only the columns needed
+        are fetched. Related images (if any) are prefetched.
+
+        :return django.db.models.query.QuerySet:
+        """
+        items = super(ImagesSitemap, self).items()
+        if self.images_field:
+            if self.images_queryset is not None:
+                items = items.prefetch_related(
+                    Prefetch(self.images_field, queryset=self.images_queryset)
+                    )
+            else:
+                items = items.prefetch_related(self.images_field)
+
+        if not self.projection:
+            return items
+
+        mode, fields, row_class = self.get_projection()
+        if 'values_list' == mode:
+            return items.values_list(*fields)
+        return items.only(*fields)
+
     def image_location(self, item):
         """
         Gets image location.
@@ -120,6 +356,12 @@ class ImagesSitemap(GenericSitemap):
         """
         Gets image location URL.
         """
+        location_builder = self.location_builder
+        if location_builder is not None:
+            try:
+                return location_builder(item)
+            except Exception as e:
+                return None
         if self.location_field is not None:
             try:
                 location_field = getattr(item, self.location_field)
@@ -131,93 +373,258 @@ class ImagesSitemap(GenericSitemap):
                 return None
         return item.get_absolute_url()
 
-    def __get(self, name, obj, default=None):
-        try:
-            attr = getattr(self, name)
-        except AttributeError:
-            return default
-        if callable(attr):
-            return attr(obj)
-        return attr
+    def compile_accessors(self):
+        """
+        Compiles the accessors of the URL entry fields (see the
+        ``ImagesSitemapAccessors``). Constant values (``changefreq`` and
+        ``priority`` given to the constructor, for instance) are validated
+        once, here. Default (not overridden) field based methods are
+        replaced with the plain getters of the item fields and the fields,
+        which are not set (or not rendered), with None.
 
-    def get_urls(self, page=1, site=None, protocol=None):
-        # Determine protocol
-        if self.protocol is not None:
-            protocol = self.protocol
-        if protocol is None:
-            protocol = 'http'
-
-        # Determine domain
-        if site is None:
-            if Site._meta.installed:
-                try:
-                    site = Site.objects.get_current()
-                except Site.DoesNotExist:
-                    pass
-            if site is None:
-                raise ImproperlyConfigured(
-                    "To use sitemaps, either enable the sites framework or "
-                    "pass a Site/RequestSite object in your view."
-                    )
-        domain = site.domain
-
-        urls = []
-        for item in self.paginator.page(page).object_list:
-            loc = self.__get('location', item, None)
-            if loc and PREPEND_LOC_URL_WITH_SITE_URL:
-                if PY2:
-                    loc = "{0}://{1}{2}".format(
-                        protocol, unicode(domain), unicode(loc)
-                        )
-                else:
-                    loc = "{0}://{1}{2}".format(protocol, str(domain), str(loc))
+        :return ImagesSitemapAccessors:
+        """
+        accessors = dict(
+            (name, compile_accessor(self, name)) \
+            for name in ImagesSitemapAccessors._fields
+            )
+
+        field_names = ['image_caption', 'image_title']
+        if self.image_extra_fields:
+            field_names += ['image_license', 'image_geo_location']
+        else:
+            accessors['image_license'] = accessors['image_geo_location'] = \
+                (None, None)
+        for name in field_names:
+            if is_default_method(self, name, ImagesSitemap):
+                field = getattr(self, '{0}_field'.format(name))
+                accessors[name] = (None, None) if field is None \
+                                  else (attrgetter(str(field)), None)
+
+        if self.image_location_field is None \
+           and is_default_method(self, 'image_location', ImagesSitemap):
+            accessors['image_location'] = (None, None)
+
+        if is_default_method(self, 'lastmod', GenericSitemap):
+            accessors['lastmod'] = (None, None) if self.date_field is None \
+                                   else (attrgetter(str(self.date_field)), None)
+
+        # Validating the constant changefreq and priority
+        get_changefreq, changefreq = accessors['changefreq']
+        if get_changefreq is None and changefreq is not None:
+            assert changefreq in VALID_CHANGEFREQ
+        get_priority, priority = accessors['priority']
+        if get_priority is None and priority is not None:
+            assert priority >= 0 and priority <= 1
+
+        return ImagesSitemapAccessors(**accessors)
+
+    def get_accessors(self):
+        """
+        Gets the accessors of the URL entry fields (compiled on first use).
+
+        :return ImagesSitemapAccessors:
+        """
+        if self._accessors is None:
+            self._accessors = self.compile_accessors()
+        return self._accessors
+
+    def get_images(self, item):
+        """
+        Gets the related images of the item (``max_images`` at most).
 
-            image_loc = self.__get('image_location', item, None)
-            if image_loc and PREPEND_IMAGE_LOC_URL_WITH_SITE_URL:
+        :return iterable:
+        """
+        return islice(
+            getattr(item, self.images_field).all(), self.max_images
+            )
+
+    def _get_related_images(self, item, image_prefix, accessors):
+        """
+        Gets the image entries of the related images of the item.
+
+        :param item:
+        :param str image_prefix: Prepended to the image locations (unless
+            None).
+        :param ImagesSitemapAccessors accessors:
+        :return list: List of ``qartez.entries.ImageEntry``.
+        """
+        get_image_location, image_location = accessors.image_location
+        get_image_caption, image_caption = accessors.image_caption
+        get_image_title, image_title = accessors.image_title
+        get_image_license, image_license = accessors.image_license
+        get_image_geo_location, image_geo_location = \
+            accessors.image_geo_location
+
+        images = []
+        for image in self.get_images(item):
+            image_loc = get_image_location(image) if get_image_location \
+                                                  else image_location
+            if not image_loc:
+                continue
+            if image_prefix is not None:
                 try:
-                    if PY2:
-                        image_loc = "{0}://{1}{2}".format(
-                            protocol, unicode(domain), unicode(image_loc)
-                            )
-                    else:
-                        image_loc = "{0}://{1}{2}".format(
-                            protocol, str(domain), str(image_loc)
-                            )
+                    image_loc = image_prefix + text_type(image_loc)
                 except Exception as e:
                     continue
+            images.append(ImageEntry(
+                image_loc,
+                get_image_caption(image) if get_image_caption \
+                                         else image_caption,
+                get_image_title(image) if get_image_title else image_title,
+                get_image_license(image) if get_image_license \
+                                         else image_license,
+                get_image_geo_location(image) if get_image_geo_location \
+                                              else image_geo_location
+                ))
+        return images
 
-            # Validating the changefreq
-            changefreq = self.__get('changefreq', item, None)
-            if changefreq is not None:
-                assert changefreq in CHANGEFREQ
-
-            # Validating the priority
-            priority = self.__get('priority', item, None)
-            if priority is not None:
-                assert priority >= 0 and priority <= 1
-
-            url_info = {
-                'location': loc,
-                'image_location': image_loc,
-                'image_caption': self.__get('image_caption', item, None),
-                'image_title': self.__get('image_title', item, None),
-                'image_license': self.__get('image_license', item, None),
-                'image_geo_location': self.__get(
-                    'image_geo_location', item, None
-                    ),
-                'lastmod': self.__get('lastmod', item, None),
-                'changefreq': changefreq,
-                'priority': priority
-            }
-            urls.append(url_info)
+    def get_urls(self, page=1, site=None, protocol=None):
+        """
+        Returns the list of URL entries (``qartez.entries.ImagesUrlEntry``) of the
+        given page.
+
+        :param int page:
+        :param django.contrib.sites.models.Site site:
+        :param str protocol:
+        :return list:
+        """
+        with Measurement('get_urls', sitemap=self, page=page) as measurement:
+            urls = list(
+                self.iter_urls(page=page, site=site, protocol=protocol)
+                )
+            measurement.set(items=len(urls))
         return urls
 
+    def iter_urls(self, page=1, site=None, protocol=None):
+        """
+        Same as ``get_urls``, but returns a generator yielding the URL entries
+        one by one. The page number and the site are validated immediately
+        (not on the first iteration), so that ``EmptyPage`` and
+        ``PageNotAnInteger`` exceptions can still be turned into proper 404
+        responses before the streaming starts. The items are fetched in
+        chunks (see ``iter_page_items``), so the page is never held in
+        memory as a whole.
 
-class StaticSitemap(Sitemap):
+        :param int page:
+        :param django.contrib.sites.models.Site site:
+        :param str protocol:
+        :return generator:
+        """
+        domain, protocol = self.get_domain_and_protocol(site, protocol)
+        return self._iter_urls(self.iter_page_items(page), domain, protocol)
+
+    def _iter_urls(self, object_list, domain, protocol):
+        """
+        Yields the URL entries for the items given.
+
+        :param iterable object_list:
+        :param str domain:
+        :param str protocol:
+        :return generator:
+        """
+        if self.projection:
+            row_class = self.get_projection()[2]
+            if row_class is not None:
+                object_list = map(row_class._make, object_list)
+
+        accessors = self.get_accessors()
+        get_location, location = accessors.location
+        get_lastmod, lastmod = accessors.lastmod
+        get_changefreq, changefreq = accessors.changefreq
+        get_priority, priority = accessors.priority
+        get_image_location, image_location = accessors.image_location
+        get_image_caption, image_caption = accessors.image_caption
+        get_image_title, image_title = accessors.image_title
+        get_image_license, image_license = accessors.image_license
+        get_image_geo_location, image_geo_location = \
+            accessors.image_geo_location
+
+        prefix = text_type("{0}://{1}").format(protocol, domain)
+        loc_prefix = prefix if PREPEND_LOC_URL_WITH_SITE_URL else None
+        image_prefix = prefix if PREPEND_IMAGE_LOC_URL_WITH_SITE_URL else None
+        images_field = self.images_field
+
+        for item in object_list:
+            loc = get_location(item) if get_location else location
+            if loc and loc_prefix is not None:
+                loc = loc_prefix + text_type(loc)
+
+            if images_field:
+                images = self._get_related_images(
+                    item, image_prefix, accessors
+                    )
+            else:
+                image_loc = get_image_location(item) if get_image_location \
+                                                     else image_location
+                if image_loc and image_prefix is not None:
+                    try:
+                        image_loc = image_prefix + text_type(image_loc)
+                    except Exception as e:
+                        continue
+                if image_loc:
+                    images = (ImageEntry(
+                        image_loc,
+                        get_image_caption(item) if get_image_caption \
+                                                else image_caption,
+                        get_image_title(item) if get_image_title \
+                                              else image_title,
+                        get_image_license(item) if get_image_license \
+                                                else image_license,
+                        get_image_geo_location(item) \
+                            if get_image_geo_location else image_geo_location
+                        ),)
+                else:
+                    images = ()
+
+            # Constant values are validated once (see ``compile_accessors``)
+            if get_changefreq is None:
+                item_changefreq = changefreq
+            else:
+                item_changefreq = get_changefreq(item)
+                if item_changefreq is not None:
+                    assert item_changefreq in VALID_CHANGEFREQ
+
+            if get_priority is None:
+                item_priority = priority
+            else:
+                item_priority = get_priority(item)
+                if item_priority is not None:
+                    assert item_priority >= 0 and item_priority <= 1
+
+            yield ImagesUrlEntry(
+                loc,
+                get_lastmod(item) if get_lastmod else lastmod,
+                item_changefreq,
+                item_priority,
+                images
+                )
+
+
+# Resolved entry of the ``StaticSitemap``.
+StaticSitemapEntry = namedtuple(
+    'StaticSitemapEntry', ('location', 'lastmod', 'changefreq', 'priority')
+    )
+
+# Named pattern of the ``StaticSitemap``, which could not be resolved.
+StaticSitemapError = namedtuple(
+    'StaticSitemapError', ('viewname', 'args', 'kwargs', 'error')
+    )
+
+
+class StaticSitemap(IterationMixin, Sitemap):
     """
     Sitemap for ``static`` pages. See constructor docstring for list of
     accepted (additional) arguments.
 
+    Named patterns are resolved once per URLconf (and script prefix) on
+    first use and the resolved entries are kept in an immutable tuple (see
+    ``get_entries``), which is safe to be read by any number of threads.
+    Patterns, which can't be resolved, are left out and reported (see
+    ``get_errors``) - the rest of the sitemap is still served. Resolutions
+    with errors are kept as well once the URLconf has finished loading
+    (before, they're retried on the next use).
+
     :example:
     >>> from qartez import StaticSitemap
     >>> service_sitemap = StaticSitemap(priority=0.1, changefreq='never')
@@ -261,23 +668,37 @@ class StaticSitemap(Sitemap):
             self.lastmod = datetime.datetime.now()
 
         super(StaticSitemap, self).__init__(*args, **kwargs)
-        self._items = []
+        # Added (not yet resolved) entries
+        self._static_entries = []
+        # Resolved entries and errors per URLconf and script prefix. Never
+        # modified in place (replaced instead), so it's read without locks.
+        self._resolved = {}
 
     def items(self):
         """
-        Returns sitemap items.
+        Returns sitemap items (resolved entries).
 
-        :return list:
+        :return tuple:
         """
-        return self._items
+        return self.get_entries()
 
     def location(self, obj):
-        return obj['location']
+        return obj.location
+
+    def _add_entry(self, entry):
+        """
+        Adds the (not yet resolved) entry given and drops the resolved ones.
+
+        :param tuple entry:
+        """
+        self._static_entries.append(entry)
+        self._resolved = {}
 
     def add_named_pattern(self, viewname, urlconf=None, args=[], kwargs=None, \
                           lastmod=None, changefreq=None, priority=None):
         """
-        Ads a named pattern to the items list.
+        Ads a named pattern to the items list. The pattern is resolved on
+        first use.
 
         :param str viewname:
         :param urlconf:
@@ -287,16 +708,13 @@ class StaticSitemap(Sitemap):
         :param str changefreq:
         :param float priority:
         """
-        try:
-            loc = reverse_lazy(viewname, urlconf, args, kwargs)
-            self._items.append({
-                'location': loc,
-                'lastmod': lastmod or self.lastmod,
-                'changefreq': changefreq if changefreq else self.changefreq,
-                'priority': priority if priority else self.priority
-                })
-        except Exception as e:
-            pass
+        self._add_entry((
+            self.NAMED_PATTERN,
+            (viewname, urlconf, tuple(args or ()), kwargs),
+            lastmod or self.lastmod,
+            changefreq if changefreq else self.changefreq,
+            priority if priority else self.priority
+            ))
 
     def add_url(self, url, lastmod=None, changefreq=None, priority=None):
         """
@@ -307,29 +725,200 @@ class StaticSitemap(Sitemap):
         :param str changefreq:
         :param float priority:
         """
-        try:
-            self.items.append({
-                'location': url,
-                'lastmod': lastmod or self.lastmod,
-                'changefreq': changefreq if changefreq else self.changefreq,
-                'priority': priority if priority else self.priority
-                })
-        except Exception as e:
-            pass
+        self._add_entry((
+            self.URL,
+            url,
+            lastmod or self.lastmod,
+            changefreq if changefreq else self.changefreq,
+            priority if priority else self.priority
+            ))
+
+    def resolve(self):
+        """
+        Resolves all the entries against the current URLconf.
+
+        :return tuple: (tuple of ``StaticSitemapEntry``, tuple of
+            ``StaticSitemapError``)
+        """
+        entries, errors = [], []
+        for type_, location, lastmod, changefreq, priority \
+                in self._static_entries:
+            if self.NAMED_PATTERN == type_:
+                viewname, urlconf, args, kwargs = location
+                try:
+                    location = reverse(viewname, urlconf, args, kwargs)
+                except Exception as e:
+                    errors.append(
+                        StaticSitemapError(viewname, args, kwargs, e)
+                        )
+                    continue
+            entries.append(
+                StaticSitemapEntry(location, lastmod, changefreq, priority)
+                )
 
-    def get_urls(self, *args, **kwargs):
+        for error in errors:
+            warnings.warn(
+                "Can't resolve the {0} static sitemap entry: {1}".format(
+                    error.viewname, error.error
+                    ),
+                RuntimeWarning
+                )
+        return (tuple(entries), tuple(errors))
+
+    def _get_resolved(self):
         """
-        Make sure nothing breaks if some URL is unresolvable.
+        Gets the resolved entries and errors for the current URLconf and
+        script prefix (resolved on first use).
 
+        :return tuple:
+        """
+        key = (get_urlconf(), get_script_prefix())
+        resolved = self._resolved.get(key)
+        if resolved is None:
+            resolved = self.resolve()
+            # Failed resolutions are not kept while the URLconf is still
+            # being imported (sitemaps used at start up), so they're retried
+            # on the next use. Once it's loaded, the errors are permanent.
+            if not resolved[1] or is_urlconf_loaded(key[0]):
+                # Copy on write: threads reading the old dict are not
+                # affected
+                resolved_all = dict(self._resolved)
+                resolved_all[key] = resolved
+                self._resolved = resolved_all
+        return resolved
+
+    def get_entries(self):
+        """
+        Gets the resolved entries.
+
+        :return tuple: Tuple of ``StaticSitemapEntry``.
+        """
+        return self._get_resolved()[0]
+
+    def get_errors(self):
+        """
+        Gets the entries (named patterns), which could not be resolved.
+
+        :return tuple: Tuple of ``StaticSitemapError``.
+        """
+        return self._get_resolved()[1]
+
+    def get_urls(self, page=1, site=None, protocol=None):
+        """
+        Returns the list of URL entries (``qartez.entries.StaticUrlEntry``) of the
+        given page.
+
+        :param int page:
+        :param django.contrib.sites.models.Site site:
+        :param str protocol:
         :return list:
         """
-        try:
-            return super(StaticSitemap, self).get_urls(*args, **kwargs)
-        except Exception as e:
-            return []
+        with Measurement('get_urls', sitemap=self, page=page) as measurement:
+            domain, protocol = self.get_domain_and_protocol(site, protocol)
+            urls = list(self._iter_urls(
+                self.paginator.page(page).object_list, domain, protocol
+                ))
+            measurement.set(items=len(urls))
+        return urls
+
+    def _iter_urls(self, entries, domain, protocol):
+        """
+        Yields the URL entries for the (resolved) entries given.
+
+        :param iterable entries:
+        :param str domain:
+        :param str protocol:
+        :return generator:
+        """
+        prefix = "{0}://{1}".format(protocol, domain)
+        for entry in entries:
+            yield StaticUrlEntry(
+                entry,
+                prefix + entry.location,
+                entry.lastmod,
+                entry.changefreq,
+                entry.priority
+                )
+
+
+class FileStaticSitemap(StaticSitemap):
+    """
+    ``StaticSitemap`` reading its entries from a CSV or JSONL file (see
+    ``qartez.files.FileEntries``) instead of the ``add_url`` calls. Nothing
+    is read on start up; the file is memory-mapped and indexed (line
+    offsets only) on first use and only the rows of the requested page are
+    parsed.
+
+    Rows shall have the ``location`` (path, prepended with the site domain
+    the same way as the other entries) and optionally the ``lastmod`` (ISO
+    8601 date or datetime), ``changefreq`` and ``priority`` values, falling
+    back to the ones given to the constructor. All the ``lastmod`` values are
+    turned into datetimes (aware if the ``USE_TZ`` is on), so that dates and
+    datetimes of the rows can be compared.
+
+    :example:
+    >>> from qartez import FileStaticSitemap
+    >>> landing_pages_sitemap = FileStaticSitemap(
+    >>>     '/srv/sitemaps/landing-pages.csv', priority=0.5, changefreq='weekly'
+    >>>     )
+    """
+    def __init__(self, path, format=None, *args, **kwargs):
+        """
+        Constructor. Accepts the same optional keyword-arguments as the
+        ``StaticSitemap``.
+
+        :param str path: Path to the file.
+        :param str format: "csv" or "jsonl". Taken from the file extension
+            if not given.
+        """
+        super(FileStaticSitemap, self).__init__(*args, **kwargs)
+        self.entries = FileEntries(path, format, make_entry=self.make_entry)
+
+    def make_entry(self, row):
+        """
+        Turns the row (dict) given into an entry.
+
+        :param dict row:
+        :return qartez.StaticSitemapEntry:
+        """
+        lastmod = row.get('lastmod') or self.lastmod
+        if isinstance(lastmod, string_types):
+            lastmod = parse_datetime(lastmod) or parse_date(lastmod)
+        return StaticSitemapEntry(
+            row['location'],
+            as_datetime(lastmod),
+            row.get('changefreq') or self.changefreq,
+            row.get('priority') or self.priority
+            )
+
+    def _add_entry(self, entry):
+        """
+        Entries are read from the file only (``add_named_pattern`` and
+        ``add_url`` are not supported).
+        """
+        raise TypeError(
+            "Entries of the FileStaticSitemap are read from the file only."
+            )
+
+    def get_entries(self):
+        """
+        Gets the entries (lazily read from the file).
+
+        :return qartez.files.FileEntries:
+        """
+        return self.entries
+
+    def get_errors(self):
+        """
+        Always empty (nothing to resolve).
+
+        :return tuple:
+        """
+        return ()
 
 
-class RelAlternateHreflangSitemap(Sitemap):
+class RelAlternateHreflangSitemap(LocationBuilderMixin, PaginationMixin, \
+                                  IterationMixin, Sitemap):
     """
     Sitemaps: rel="alternate" hreflang="x" implementation.
     
@@ -345,7 +934,67 @@ class RelAlternateHreflangSitemap(Sitemap):
     >>> class ArticleSitemap(RelAlternateHreflangSitemap):
     >>>     def alternate_hreflangs(self, obj):
     >>>         return [('en-us', obj.alternative_object_url),]
+
+    Override the ``alternate_hreflangs_for_items`` instead to look up the
+    alternates of all the items of a page at once.
+
+    >>> class ArticleSitemap(RelAlternateHreflangSitemap):
+    >>>     def alternate_hreflangs_for_items(self, items):
+    >>>         translations = ArticleTranslation._default_manager.filter(
+    >>>             article__in=items
+    >>>             )
+    >>>         alternates = {}
+    >>>         for translation in translations:
+    >>>             alternates.setdefault(translation.article_id, []).append(
+    >>>                 (translation.language, translation.url)
+    >>>                 )
+    >>>         return alternates
+
+    Set ``keyset_pagination`` to True in your sitemap class to paginate by
+    the ``keyset_field`` (primary key by default) column instead of using
+    ``LIMIT/OFFSET`` (see ``qartez.paginator.KeysetPaginator``). Set the
+    ``cached_count`` to True to have the number of items (used to validate
+    the page number) taken from cache (see ``qartez.counters``). Set the
+    ``max_page_bytes`` to have the pages sized by the estimated size of the
+    entries as well (see ``qartez.sizing``).
+
+    Set the ``date_field`` to the name of the field your ``lastmod`` is
+    based on, to have the ``lastmod`` of the pages in the sitemap index
+    determined with a single aggregate query.
+
+    Set the ``page_cache_timeout`` and ``page_cache_models`` to control the
+    rendered page cache of the section (see ``qartez.cache``).
+
+    In an i18n site, all the members of a translation cluster list the same
+    alternates. Set the ``hreflang_cluster_field`` to the name of the item
+    field holding the cluster key (translation group id, for instance) and
+    override the ``alternate_hreflangs_for_clusters`` to have the
+    alternates looked up (with a single call per page) and rendered once
+    per cluster. Rendered blocks are kept in an in-process cache shared by
+    all the sitemaps of the same ``hreflang_cluster_namespace`` (model of
+    the items by default), so the sitemaps of the other languages reuse
+    them.
+
+    >>> class ArticleSitemap(RelAlternateHreflangSitemap):
+    >>>     hreflang_cluster_field = 'translation_group_id'
+    >>>
+    >>>     def alternate_hreflangs_for_clusters(self, cluster_keys):
+    >>>         alternates = {}
+    >>>         for article in Article._default_manager.filter(
+    >>>                 translation_group_id__in=cluster_keys):
+    >>>             alternates.setdefault(
+    >>>                 article.translation_group_id, []
+    >>>                 ).append((article.language, article.url))
+    >>>         return alternates
     """
+    date_field = None
+    page_cache_timeout = None
+    page_cache_models = None
+    hreflang_cluster_field = None
+    hreflang_cluster_namespace = None
+    template_name = 'qartez/rel_alternate_hreflang_sitemap.xml'
+    urlset_serializer = staticmethod(serialize_rel_alternate_hreflang_urlset)
+
     def __get(self, name, obj, default=None):
         try:
             attr = getattr(self, name)
@@ -366,55 +1015,186 @@ class RelAlternateHreflangSitemap(Sitemap):
             """details and examples."""
             )
 
-    def _render_alternate_hreflangs(self, item):
+    def alternate_hreflangs_for_items(self, items):
+        """
+        Batch version of the ``alternate_hreflangs``, called once per page
+        with all the items of the page. Override it to look up the
+        alternates (translations, for instance) of all the items at once,
+        instead of making a query per item.
+
+        Shall return a dict mapping the item primary keys (``item.pk``) to
+        lists of (lang, href) tuples (items missing in the dict have no
+        alternates), or None to fall back to the ``alternate_hreflangs``
+        called per item (the default).
+
+        :param list items:
+        :return dict:
+        """
+        return None
+
+    def alternate_hreflangs_for_clusters(self, cluster_keys):
+        """
+        Looks up the alternates of the translation clusters given (see the
+        ``hreflang_cluster_field``). You should override it in your sitemap
+        class when using the cluster mode.
+
+        Shall return a dict mapping the cluster keys to lists of
+        (lang, href) tuples (clusters missing in the dict, or all of them if
+        None is returned, have no alternates).
+
+        :param list cluster_keys:
+        :return dict:
+        """
+        raise NotImplementedError(
+            """You have to override the "alternate_hreflangs_for_clusters" """
+            """method in your sitemap class when "hreflang_cluster_field" """
+            """is set."""
+            )
+
+    def get_hreflang_cluster_namespace(self):
+        """
+        Gets the namespace of the rendered cluster blocks in the shared
+        cache.
+
+        :return str:
+        """
+        if self.hreflang_cluster_namespace:
+            return self.hreflang_cluster_namespace
+        opts = self.items().model._meta
+        return '{0}.{1}:{2}'.format(
+            opts.app_label, opts.object_name, self.hreflang_cluster_field
+            )
+
+    def _get_hreflang_cluster_blocks(self, items):
+        """
+        Gets the rendered alternate hreflang blocks of the clusters of the
+        items given, from the shared cache if possible. Alternates of the
+        missing clusters are looked up with a single call.
+
+        :param list items:
+        :return dict: Cluster key to the rendered block mapping.
+        """
+        namespace = self.get_hreflang_cluster_namespace()
+        cluster_keys = set(
+            getattr(item, self.hreflang_cluster_field) for item in items
+            )
+        cluster_keys.discard(None)
+        blocks, missing = {}, []
+        for cluster_key in cluster_keys:
+            block = hreflang_cluster_cache.get((namespace, cluster_key))
+            if block is None:
+                missing.append(cluster_key)
+            else:
+                blocks[cluster_key] = block
+
+        if missing:
+            alternates = self.alternate_hreflangs_for_clusters(missing) or {}
+            for cluster_key in missing:
+                block = self._render_alternate_hreflangs(
+                    None, alternates.get(cluster_key, [])
+                    )
+                hreflang_cluster_cache.set(
+                    (namespace, cluster_key), block,
+                    HREFLANG_CLUSTER_CACHE_TIMEOUT
+                    )
+                blocks[cluster_key] = block
+        return blocks
+
+    def _render_alternate_hreflangs(self, item, alternate_hreflangs=None):
         """
         Renders the tiny bit of XML responsible for rendering the alternate
         hreflang code.
 
+        :param item:
+        :param list alternate_hreflangs: When not given, taken from the
+            ``alternate_hreflangs``.
         :return str:
         """
-        alternate_hreflangs = self.__get('alternate_hreflangs', item, [])
-        output = ""
-        if alternate_hreflangs:
-            for hreflang in alternate_hreflangs:
-                output += REL_ALTERNATE_HREFLANG_SITEMAP_TEMPLATE.format(
-                    **{'lang': hreflang[0], 'href': hreflang[1]}
-                    )
-        return output
+        if alternate_hreflangs is None:
+            alternate_hreflangs = self.__get('alternate_hreflangs', item, [])
+        if not alternate_hreflangs:
+            return ""
+        return "".join([
+            REL_ALTERNATE_HREFLANG_SITEMAP_TEMPLATE.format(
+                lang=hreflang[0], href=hreflang[1]
+                ) \
+            for hreflang in alternate_hreflangs
+            ])
 
     def get_urls(self, page=1, site=None, protocol=None):
-        # Determine protocol
-        if self.protocol is not None:
-            protocol = self.protocol
-        if protocol is None:
-            protocol = 'http'
-
-        # Determine domain
-        if site is None:
-            if Site._meta.installed:
-                try:
-                    site = Site.objects.get_current()
-                except Site.DoesNotExist:
-                    pass
-            if site is None:
-                raise ImproperlyConfigured(
-                    "To use sitemaps, either enable the sites framework "
-                    "or pass a Site/RequestSite object in your view."
-                    )
-        domain = site.domain
+        """
+        Returns the list of URL entries (``qartez.entries.RelAlternateHreflangUrlEntry``) of the
+        given page.
 
-        urls = []
-        for item in self.paginator.page(page).object_list:
-            loc = "{0}://{1}{2}".format(
-                protocol, domain, self.__get('location', item)
+        :param int page:
+        :param django.contrib.sites.models.Site site:
+        :param str protocol:
+        :return list:
+        """
+        with Measurement('get_urls', sitemap=self, page=page) as measurement:
+            urls = list(
+                self.iter_urls(page=page, site=site, protocol=protocol)
                 )
-            url_info = {
-                'location': loc,
-                'lastmod': self.__get('lastmod', item, None),
-                'changefreq': self.__get('changefreq', item, None),
-                'priority': self.__get('priority', item, None),
-                'alternate_hreflangs': self._render_alternate_hreflangs(item),
-            }
-
-            urls.append(url_info)
+            measurement.set(items=len(urls))
         return urls
+
+    def iter_urls(self, page=1, site=None, protocol=None):
+        """
+        Same as ``get_urls``, but returns a generator yielding the URL entries
+        one by one. The page number and the site are validated immediately.
+
+        :param int page:
+        :param django.contrib.sites.models.Site site:
+        :param str protocol:
+        :return generator:
+        """
+        domain, protocol = self.get_domain_and_protocol(site, protocol)
+        return self._iter_urls(self.iter_page_items(page), domain, protocol)
+
+    def _iter_urls(self, object_list, domain, protocol):
+        """
+        Yields the URL entries for the items given.
+
+        :param iterable object_list:
+        :param str domain:
+        :param str protocol:
+        :return generator:
+        """
+        blocks = batch = None
+        # The page is only materialized if a page level hook needs it
+        if self.hreflang_cluster_field:
+            object_list = list(object_list)
+            blocks = self._get_hreflang_cluster_blocks(object_list)
+        elif not is_default_method(self, 'alternate_hreflangs_for_items', \
+                                   RelAlternateHreflangSitemap):
+            object_list = list(object_list)
+            batch = self.alternate_hreflangs_for_items(object_list)
+
+        # Compiled once per page
+        get_location, location = compile_accessor(self, 'location')
+        get_lastmod, lastmod = compile_accessor(self, 'lastmod')
+        get_changefreq, changefreq = compile_accessor(self, 'changefreq')
+        get_priority, priority = compile_accessor(self, 'priority')
+        prefix = text_type("{0}://{1}").format(protocol, domain)
+
+        for item in object_list:
+            loc = prefix + text_type(
+                get_location(item) if get_location else location
+                )
+            if blocks is not None:
+                alternate_hreflangs = blocks.get(
+                    getattr(item, self.hreflang_cluster_field), ""
+                    )
+            elif batch is None:
+                alternate_hreflangs = self._render_alternate_hreflangs(item)
+            else:
+                alternate_hreflangs = self._render_alternate_hreflangs(
+                    item, batch.get(item.pk, [])
+                    )
+            yield RelAlternateHreflangUrlEntry(
+                loc,
+                get_lastmod(item) if get_lastmod else lastmod,
+                get_changefreq(item) if get_changefreq else changefreq,
+                get_priority(item) if get_priority else priority,
+                alternate_hreflangs
+                )
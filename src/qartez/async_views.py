@@ -0,0 +1,162 @@
+"""
+Async (ASGI) versions of the ``qartez.views``. Python 3.7+ and Django 3.1+
+only.
+
+The sitemaps are built by the synchronous views, run on a bounded thread
+pool (``ASYNC_VIEWS_MAX_WORKERS`` threads, each with its own database
+connection), so the event loop is never blocked. Streaming responses
+(Django 4.2+) are produced on the pool chunk by chunk, a ``run_in_executor``
+call per chunk, so no pool thread is held while the client reads (and a
+slow client slows the producer down instead of piling the sitemap up in
+memory). Since the chunks may be produced by different threads, the
+streamed iterators must not keep database cursors open between chunks (the
+pages streamed by the ``qartez.views`` are fetched with a query per chunk).
+
+:example:
+>>> from qartez import async_views
+>>>
+>>> urlpatterns = [
+>>>     url(r'^sitemap-foo-images\.xml$', async_views.render_images_sitemap,
+>>>         {'sitemaps': foo_item_images_sitemap, 'streaming': True}),
+>>> ]
+"""
+__title__ = 'qartez.async_views'
+__author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
+__all__ = (
+    'run_in_pool', 'async_view', 'render_images_sitemap', 'render_sitemap',
+    'images_sitemap_index', 'cached_images_sitemap', 'cached_sitemap',
+)
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from threading import Lock
+
+from django.db import close_old_connections
+
+from qartez import views
+from qartez.settings import ASYNC_VIEWS_MAX_WORKERS
+
+# Size (in bytes) of the chunks the streaming responses are sent in
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_executor = None
+_executor_lock = Lock()
+
+def get_executor():
+    """
+    Gets the (process wide) thread pool.
+
+    :return concurrent.futures.ThreadPoolExecutor:
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=ASYNC_VIEWS_MAX_WORKERS,
+                    thread_name_prefix='qartez'
+                    )
+    return _executor
+
+def _call(func, *args, **kwargs):
+    """
+    Calls the function given, closing the expired (or broken) database
+    connections of the thread before and after, the way Django does it
+    around the requests.
+
+    :param callable func:
+    :return object:
+    """
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+async def run_in_pool(func, *args, **kwargs):
+    """
+    Runs the function given on the thread pool.
+
+    :param callable func:
+    :return object:
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_executor(), partial(_call, func, *args, **kwargs)
+        )
+
+def _next_chunk(iterator):
+    """
+    Gets the next ``STREAM_CHUNK_SIZE`` (or so) bytes of the iterator given.
+
+    :param iterator iterator: Iterator of bytes.
+    :return bytes: None once the iterator is exhausted.
+    """
+    parts, size = [], 0
+    for part in iterator:
+        parts.append(part)
+        size += len(part)
+        if size >= STREAM_CHUNK_SIZE:
+            break
+    if not parts:
+        return None
+    return b''.join(parts)
+
+async def _stream_in_pool(iterable):
+    """
+    Yields the content of the (synchronous) iterable given in
+    ``STREAM_CHUNK_SIZE`` chunks, each produced on the thread pool.
+
+    :param iterable iterable: Iterable of bytes.
+    :return async generator:
+    """
+    iterator = iter(iterable)
+    try:
+        while True:
+            chunk = await run_in_pool(_next_chunk, iterator)
+            if chunk is None:
+                break
+            if chunk:
+                yield chunk
+    finally:
+        # Client has gone (or an error occurred). Release the iterator.
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await run_in_pool(close)
+
+def async_view(view):
+    """
+    Turns the synchronous sitemap view given into an async one, run on the
+    thread pool. Streaming responses are streamed asynchronously (Django
+    4.2+).
+
+    :param callable view:
+    :return callable:
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        response = await run_in_pool(view, request, *args, **kwargs)
+        # Async streaming content is supported by Django >= 4.2
+        if response.streaming and hasattr(response, '__aiter__') \
+           and not response.is_async:
+            response.streaming_content = _stream_in_pool(
+                response.streaming_content
+                )
+        return response
+    return wrapper
+
+# Async ``qartez.views.render_images_sitemap``.
+render_images_sitemap = async_view(views.render_images_sitemap)
+
+# Async ``qartez.views.render_sitemap``.
+render_sitemap = async_view(views.render_sitemap)
+
+# Async ``qartez.views.images_sitemap_index``.
+images_sitemap_index = async_view(views.images_sitemap_index)
+
+# Async ``qartez.views.cached_images_sitemap``.
+cached_images_sitemap = async_view(views.cached_images_sitemap)
+
+# Async ``qartez.views.cached_sitemap``.
+cached_sitemap = async_view(views.cached_sitemap)
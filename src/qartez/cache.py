@@ -0,0 +1,320 @@
+__title__ = 'qartez.cache'
+__author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
+__all__ = (
+    'LRUCache', 'PageCache', 'page_cache', 'hreflang_cluster_cache',
+    'get_page_cache_key',
+    'get_page_cache_timeout', 'get_section_versions',
+    'invalidate_page_cache', 'get_page_cache_models',
+    'invalidate_page_cache_on_change',
+)
+
+import time
+from collections import OrderedDict
+from hashlib import md5
+from threading import Lock
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.signals import post_save, post_delete
+from django.utils.encoding import force_bytes, smart_str
+
+import qartez
+from qartez.settings import PAGE_CACHE_TIMEOUT, PAGE_CACHE_LRU_TIMEOUT, \
+                            PAGE_CACHE_LRU_MAX_BYTES, PAGE_CACHE_VERSION, \
+                            HREFLANG_CLUSTER_CACHE_SIZE
+
+class LRUCache(object):
+    """
+    Small, thread safe, in-process least recently used cache with expiring
+    entries. Bounded by the total size of the entries: the number of them,
+    or the sum of the ``get_size`` of the values if given.
+    """
+    def __init__(self, maxsize, get_size=None):
+        """
+        Constructor.
+
+        :param int maxsize: Max total size of the entries.
+        :param callable get_size: Size of the value given. Every entry
+            counts as 1 if not given.
+        """
+        self.maxsize = maxsize
+        self.get_size = get_size
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        """
+        Gets the value stored under the key given.
+
+        :param str key:
+        :param default:
+        :return object:
+        """
+        with self._lock:
+            try:
+                entry = self._data.pop(key)
+            except KeyError:
+                return default
+            expires, value, size = entry
+            if expires < time.time():
+                self.size -= size
+                return default
+            # Most recently used entries go last
+            self._data[key] = entry
+            return value
+
+    def set(self, key, value, timeout):
+        """
+        Stores the value under the key given for ``timeout`` seconds.
+
+        :param str key:
+        :param value:
+        :param int timeout:
+        """
+        size = 1 if self.get_size is None else self.get_size(value)
+        with self._lock:
+            self._pop(key)
+            # Values larger than the whole cache are not kept
+            if size > self.maxsize:
+                return
+            self._data[key] = (time.time() + timeout, value, size)
+            self.size += size
+            while self.size > self.maxsize:
+                self.size -= self._data.popitem(last=False)[1][2]
+
+    def _pop(self, key):
+        """
+        Removes the entry stored under the key given (the lock shall be
+        held).
+
+        :param str key:
+        """
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def delete(self, key):
+        """
+        Deletes the entry stored under the key given.
+
+        :param str key:
+        """
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        """
+        Deletes all the entries.
+        """
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+
+def _get_page_size(entry):
+    """
+    Size (in bytes) of the cached page given: its content (see
+    ``qartez.views.cache_sitemap_page``) or the page itself.
+
+    :param dict|bytes entry:
+    :return int:
+    """
+    if isinstance(entry, dict):
+        entry = entry.get('content', b'')
+    return len(entry)
+
+
+class PageCache(object):
+    """
+    Two tier cache of the rendered sitemap pages: small in-process LRU
+    cache (bounded by the total size of the page contents) in front of the
+    configured Django cache backend. Entries are kept in the LRU cache for
+    ``PAGE_CACHE_LRU_TIMEOUT`` seconds at most, so that the changes made by
+    the other processes are picked up.
+    """
+    def __init__(self, lru_max_bytes=None, lru_timeout=None):
+        """
+        Constructor.
+
+        :param int lru_max_bytes: Defaults to ``PAGE_CACHE_LRU_MAX_BYTES``.
+        :param int lru_timeout: Defaults to ``PAGE_CACHE_LRU_TIMEOUT``.
+        """
+        if lru_max_bytes is None:
+            lru_max_bytes = PAGE_CACHE_LRU_MAX_BYTES
+        if lru_timeout is None:
+            lru_timeout = PAGE_CACHE_LRU_TIMEOUT
+        self.lru = LRUCache(lru_max_bytes, get_size=_get_page_size)
+        self.lru_timeout = lru_timeout
+
+    def get(self, key):
+        """
+        Gets the page stored under the key given.
+
+        :param str key:
+        :return object:
+        """
+        value = self.lru.get(key)
+        if value is None:
+            value = cache.get(key)
+            if value is not None:
+                self.lru.set(key, value, self.lru_timeout)
+        return value
+
+    def set(self, key, value, timeout):
+        """
+        Stores the page under the key given for ``timeout`` seconds.
+
+        :param str key:
+        :param value:
+        :param int timeout:
+        """
+        cache.set(key, value, timeout)
+        self.lru.set(key, value, min(timeout, self.lru_timeout))
+
+    def delete(self, key):
+        """
+        Deletes the page stored under the key given.
+
+        :param str key:
+        """
+        cache.delete(key)
+        self.lru.delete(key)
+
+
+page_cache = PageCache()
+
+# Rendered alternate hreflang blocks of the translation clusters (see
+# ``qartez.RelAlternateHreflangSitemap``).
+hreflang_cluster_cache = LRUCache(HREFLANG_CLUSTER_CACHE_SIZE)
+
+def _get_version_cache_key(section):
+    """
+    Cache key of the section version.
+
+    :param str section:
+    :return str:
+    """
+    return 'qartez.page.version.{0}'.format(
+        md5(force_bytes(section)).hexdigest()
+        )
+
+def get_section_versions(sections):
+    """
+    Gets the current versions of the sections given. Versions are
+    initialised with the current time, so that the pages cached before the
+    version has been evicted from cache are never served again.
+
+    :param list sections:
+    :return list:
+    """
+    keys = [_get_version_cache_key(section) for section in sections]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, int(time.time() * 1000), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+def invalidate_page_cache(section):
+    """
+    Invalidates all the cached pages of the section given (in all the
+    processes), by bumping the section version.
+
+    :param str section:
+    """
+    key = _get_version_cache_key(section)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+
+def get_page_cache_key(sections, page, domain, protocol, extra=()):
+    """
+    Cache key of the rendered page. Depends on the sections (and their
+    current versions), page number, site domain and protocol, the
+    ``PAGE_CACHE_VERSION`` setting, ``qartez`` version and any extra
+    parts given (view and its options).
+
+    :param list sections:
+    :param int|str page:
+    :param str domain:
+    :param str protocol:
+    :param iterable extra:
+    :return str:
+    """
+    parts = [qartez.__version__, PAGE_CACHE_VERSION, page, domain, protocol]
+    parts.extend(
+        '{0}@{1}'.format(section, version) for section, version \
+        in zip(sections, get_section_versions(sections))
+        )
+    parts.extend(extra)
+    hash_ = md5(force_bytes(':'.join(smart_str(part) for part in parts)))
+    return 'qartez.page.{0}'.format(hash_.hexdigest())
+
+def get_page_cache_timeout(sitemaps):
+    """
+    Gets the cache timeout of the page consisting of the sitemaps given:
+    the lowest ``page_cache_timeout`` of the sitemaps, falling back to the
+    ``PAGE_CACHE_TIMEOUT`` setting.
+
+    :param list sitemaps:
+    :return int:
+    """
+    timeouts = []
+    for sitemap in sitemaps:
+        timeout = getattr(sitemap, 'page_cache_timeout', None)
+        timeouts.append(PAGE_CACHE_TIMEOUT if timeout is None else timeout)
+    return min(timeouts) if timeouts else PAGE_CACHE_TIMEOUT
+
+def get_page_cache_models(sitemap):
+    """
+    Gets the models invalidating the page cache of the sitemap given: the
+    ``page_cache_models`` of the sitemap, falling back to the model of its
+    ``queryset`` (``ImagesSitemap``, ``GenericSitemap``). The items are not
+    evaluated, since the sitemaps are usually connected while the URLconf
+    is being imported. Static sitemaps have none.
+
+    :param django.contrib.sitemaps.Sitemap sitemap:
+    :return list:
+    """
+    models = getattr(sitemap, 'page_cache_models', None)
+    if models:
+        return list(models)
+    queryset = getattr(sitemap, 'queryset', None)
+    if queryset is not None:
+        return [queryset.model]
+    if isinstance(sitemap, qartez.StaticSitemap):
+        return []
+    raise ImproperlyConfigured(
+        "Can't determine the models of the {0} sitemap. Set its "
+        "``page_cache_models``.".format(sitemap.__class__.__name__)
+        )
+
+def invalidate_page_cache_on_change(sitemaps):
+    """
+    Connects the ``post_save`` and ``post_delete`` signals of the models
+    of every section of the sitemaps dict given to the cache invalidation of
+    the section (see ``get_page_cache_models``). Sitemaps without the
+    ``queryset`` (``RelAlternateHreflangSitemap`` subclasses, for instance)
+    shall have the ``page_cache_models`` set.
+
+    :param dict sitemaps:
+    """
+    for section, sitemap in sitemaps.items():
+        if callable(sitemap):
+            sitemap = sitemap()
+        models = get_page_cache_models(sitemap)
+
+        def receiver(sender, section=section, **kwargs):
+            invalidate_page_cache(section)
+
+        for model in models:
+            dispatch_uid = 'qartez.cache.{0}.{1}.{2}'.format(
+                section, model._meta.app_label, model.__name__
+                )
+            for signal in (post_save, post_delete):
+                signal.connect(
+                    receiver, sender=model, weak=False,
+                    dispatch_uid=dispatch_uid
+                    )
@@ -1,6 +1,11 @@
 __title__ = 'qartez.constants'
 __author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
-__all__ = ('REL_ALTERNATE_HREFLANG_SITEMAP_TEMPLATE',)
+__all__ = (
+    'REL_ALTERNATE_HREFLANG_SITEMAP_TEMPLATE', 'IMAGES_SITEMAP_HEADER',
+    'IMAGES_SITEMAP_FOOTER', 'REL_ALTERNATE_HREFLANG_SITEMAP_HEADER',
+    'REL_ALTERNATE_HREFLANG_SITEMAP_FOOTER', 'MAX_IMAGES_PER_URL',
+    'MAX_SITEMAP_URLS', 'MAX_SITEMAP_BYTES',
+)
 
 # Tiny bit of XML responsible for rendering the alternate hreflang code
 REL_ALTERNATE_HREFLANG_SITEMAP_TEMPLATE = """
@@ -10,3 +15,33 @@ REL_ALTERNATE_HREFLANG_SITEMAP_TEMPLATE = """
     href="{href}"
     />
 """
+
+# Opening part of the images sitemap (used when streaming the sitemap)
+IMAGES_SITEMAP_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" \
+xmlns:image="http://www.google.com/schemas/sitemap-image/1.1">
+"""
+
+# Closing part of the images sitemap (used when streaming the sitemap)
+IMAGES_SITEMAP_FOOTER = """
+</urlset>"""
+
+# Opening part of the rel="alternate" hreflang="x" sitemap
+REL_ALTERNATE_HREFLANG_SITEMAP_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" \
+xmlns:xhtml="http://www.w3.org/1999/xhtml">
+"""
+
+# Closing part of the rel="alternate" hreflang="x" sitemap
+REL_ALTERNATE_HREFLANG_SITEMAP_FOOTER = """
+</urlset>
+"""
+
+# Max number of images per URL (according to the specs)
+MAX_IMAGES_PER_URL = 1000
+
+# Max number of URLs of a single sitemap (limit of the specs)
+MAX_SITEMAP_URLS = 50000
+
+# Max size (uncompressed, in bytes) of a single sitemap (limit of the specs)
+MAX_SITEMAP_BYTES = 50 * 1024 * 1024
@@ -0,0 +1,219 @@
+__title__ = 'qartez.counters'
+__author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
+__all__ = ('SectionCounter', 'track_counts',)
+
+from hashlib import md5
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, \
+                                     post_delete
+from django.utils.encoding import force_bytes
+
+from qartez.settings import COUNT_CACHE_TIMEOUT
+
+def _in_transaction(using=None):
+    """
+    Checks if a transaction of the database given is in progress (Django <
+    1.9, where the changes can't be deferred until it commits).
+
+    :param str using: Database alias.
+    :return bool:
+    """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    in_atomic_block = getattr(connection, 'in_atomic_block', None)
+    if in_atomic_block is None: # Django < 1.6
+        return transaction.is_managed(using=using)
+    return in_atomic_block
+
+class SectionCounter(object):
+    """
+    Number of items of a sitemap section, stored in the Django cache.
+
+    The value is kept up to date incrementally by the ``post_save`` and
+    ``post_delete`` signals of the queryset model (membership of the saved
+    or deleted object in the queryset is checked before and after the
+    change, unless the queryset is not filtered) and fully recounted once
+    the cache entry expires (every ``timeout`` seconds).
+
+    Changes made in a transaction are counted once it commits (Django >=
+    1.9), so the rolled back ones are not. With older Django versions the
+    cached count is dropped instead (recounted on the next ``get``).
+
+    Every process modifying the objects shall have the counter connected,
+    otherwise the changes it makes aren't counted until the next recount
+    (see ``track_counts``).
+
+    :example:
+    >>> counter = SectionCounter(FooItem._default_manager.exclude(image=None))
+    >>> counter.connect()
+    >>> counter.get()
+    """
+    def __init__(self, queryset, timeout=None):
+        """
+        Constructor.
+
+        :param django.db.models.query.QuerySet queryset:
+        :param int timeout: For how long (in seconds) the count is cached.
+        """
+        self.queryset = queryset.order_by()
+        self.model = queryset.model
+        # Every object belongs to the queryset, which is not filtered (nor
+        # sliced). No membership queries are needed then.
+        query = self.queryset.query
+        self.filtered = bool(query.where) or bool(query.low_mark) \
+                        or query.high_mark is not None
+        if timeout is None:
+            timeout = COUNT_CACHE_TIMEOUT
+        self.timeout = timeout
+        self.cache_key = self.get_cache_key()
+
+    def get_cache_key(self):
+        """
+        Cache key of the count. Depends on the SQL of the queryset.
+
+        :return str:
+        """
+        try:
+            sql = str(self.queryset.query)
+        except Exception as e:
+            # Query is known to produce no results
+            sql = ''
+        return 'qartez.count.{0}'.format(md5(force_bytes(sql)).hexdigest())
+
+    def recount(self):
+        """
+        Counts the items and stores the count in cache.
+
+        :return int:
+        """
+        count = self.queryset.count()
+        cache.set(self.cache_key, count, self.timeout)
+        return count
+
+    def get(self):
+        """
+        Gets the count, from cache if possible.
+
+        :return int:
+        """
+        count = cache.get(self.cache_key)
+        if count is None:
+            count = self.recount()
+        return count
+
+    def incr(self, delta=1):
+        """
+        Increments (or decrements) the cached count. If there's no cached
+        value, nothing is done (it will be recounted on the next ``get``).
+
+        :param int delta:
+        """
+        try:
+            cache.incr(self.cache_key, delta)
+        except ValueError:
+            pass
+
+    def invalidate(self):
+        """
+        Drops the cached count.
+        """
+        cache.delete(self.cache_key)
+
+    def is_member(self, instance):
+        """
+        Checks if the object given belongs to the queryset.
+
+        :param django.db.models.Model instance:
+        :return bool:
+        """
+        if instance.pk is None:
+            return False
+        if not self.filtered:
+            return True
+        return self.queryset.filter(pk=instance.pk).exists()
+
+    def change(self, delta, using=None):
+        """
+        Applies the change of the count given, once the current transaction
+        (of the database given) commits. If the transaction can't be waited
+        for (Django < 1.9), the cached count is dropped instead.
+
+        :param int delta:
+        :param str using: Database alias.
+        """
+        on_commit = getattr(transaction, 'on_commit', None)
+        if on_commit is not None:
+            on_commit(lambda: self.incr(delta), using=using)
+        elif _in_transaction(using):
+            self.invalidate()
+        else:
+            self.incr(delta)
+
+    def _get_flags(self, instance):
+        """
+        Membership flags stored on the instance between the ``pre_*`` and
+        ``post_*`` signals.
+        """
+        try:
+            return instance._qartez_counters
+        except AttributeError:
+            instance._qartez_counters = {}
+            return instance._qartez_counters
+
+    def _on_pre_change(self, sender, instance, **kwargs):
+        if kwargs.get('raw', False) or not self.filtered:
+            return
+        self._get_flags(instance)[self.cache_key] = self.is_member(instance)
+
+    def _on_post_save(self, sender, instance, created=False, **kwargs):
+        if kwargs.get('raw', False):
+            return
+        if self.filtered:
+            was_member = self._get_flags(instance).pop(self.cache_key, False)
+            delta = int(self.is_member(instance)) - int(was_member)
+        else:
+            delta = int(created)
+        if delta:
+            self.change(delta, kwargs.get('using'))
+
+    def _on_post_delete(self, sender, instance, **kwargs):
+        if not self.filtered \
+           or self._get_flags(instance).pop(self.cache_key, False):
+            self.change(-1, kwargs.get('using'))
+
+    def connect(self):
+        """
+        Connects the counter to the model signals. Safe to be called
+        multiple times (for the same queryset).
+        """
+        dispatch_uid = 'qartez.counters.{0}'.format(self.cache_key)
+        for signal, receiver in (
+                (pre_save, self._on_pre_change),
+                (post_save, self._on_post_save),
+                (pre_delete, self._on_pre_change),
+                (post_delete, self._on_post_delete),):
+            signal.connect(
+                receiver, sender=self.model, weak=False,
+                dispatch_uid=dispatch_uid
+                )
+
+
+def track_counts(sitemaps):
+    """
+    Connects the counters of all the sections (having the ``cached_count``
+    set) of the sitemaps dict given. Shall be called at start up (in the
+    ``urls`` module for instance) of every process, which modifies the
+    objects, since the counters are otherwise only connected on the first
+    render of the section.
+
+    :param dict sitemaps:
+    :return list: Counters connected.
+    """
+    counters = []
+    for sitemap in sitemaps.values():
+        if callable(sitemap):
+            sitemap = sitemap()
+        if getattr(sitemap, 'cached_count', False):
+            counters.append(sitemap.get_counter())
+    return counters
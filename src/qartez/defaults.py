@@ -2,7 +2,15 @@ __title__ = 'qartez.defaults'
 __author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
 __all__ = (
     'PREPEND_LOC_URL_WITH_SITE_URL', 'PREPEND_IMAGE_LOC_URL_WITH_SITE_URL',
-    'CHANGEFREQ', 'DEBUG'
+    'CHANGEFREQ', 'KEYSET_BOUNDARIES_CACHE_TIMEOUT',
+    'SECTION_STATS_CACHE_TIMEOUT', 'COUNT_CACHE_TIMEOUT',
+    'DIRTY_PAGES_CACHE_TIMEOUT', 'PAGE_CACHE_TIMEOUT', 'PAGE_CACHE_LRU_MAX_BYTES',
+    'PAGE_CACHE_LRU_TIMEOUT', 'PAGE_CACHE_VERSION',
+    'HREFLANG_CLUSTER_CACHE_SIZE', 'HREFLANG_CLUSTER_CACHE_TIMEOUT',
+    'INSTRUMENTATION_SAMPLE_RATE', 'INSTRUMENTATION_SINKS',
+    'INSTRUMENTATION_STATSD_HOST', 'INSTRUMENTATION_STATSD_PORT',
+    'INSTRUMENTATION_STATSD_PREFIX', 'PAGE_SIZE_ESTIMATE_CACHE_TIMEOUT',
+    'ASYNC_VIEWS_MAX_WORKERS', 'CONCURRENT_SECTIONS_MAX_WORKERS', 'DEBUG'
 )
 
 # When set to True, current site's domain is prepended to the location URL.
@@ -18,4 +26,76 @@ CHANGEFREQ = [
     'always', 'hourly', 'daily', 'weekly', 'monthly', 'yearly', 'never'
     ]
 
+# For how long (in seconds) the page boundaries of the keyset paginated
+# sitemaps are cached.
+KEYSET_BOUNDARIES_CACHE_TIMEOUT = 3600
+
+# For how long (in seconds) the section stats (number of items and pages,
+# lastmod) used by the sitemap index are cached.
+SECTION_STATS_CACHE_TIMEOUT = 600
+
+# For how long (in seconds) the item counts of the sitemaps having the
+# ``cached_count`` option on are cached. Counts are updated incrementally
+# by the model signals in the meantime and fully recounted on expiry.
+COUNT_CACHE_TIMEOUT = 3600
+
+# For how long (in seconds) the dirty page flags and the state of the last
+# generation (see ``qartez.generator.SitemapGenerator.generate_dirty``) are
+# kept. Once expired, sections are fully regenerated.
+DIRTY_PAGES_CACHE_TIMEOUT = 86400
+
+# For how long (in seconds) the rendered sitemap pages are cached by the
+# ``qartez.views.cache_sitemap_page`` decorated views. Can be overridden per
+# sitemap (``page_cache_timeout``).
+PAGE_CACHE_TIMEOUT = 3600
+
+# Max total size (in bytes) of the rendered sitemap pages kept in the
+# in-process cache (in front of the Django cache). Zero disables the
+# in-process cache.
+PAGE_CACHE_LRU_MAX_BYTES = 32 * 1024 * 1024
+
+# For how long (in seconds) the rendered sitemap pages are kept in the
+# in-process cache.
+PAGE_CACHE_LRU_TIMEOUT = 60
+
+# Version of the rendered sitemap pages. Change it to invalidate all of them
+# (for instance, when templates change).
+PAGE_CACHE_VERSION = ''
+
+# Max number of the rendered alternate hreflang blocks of the translation
+# clusters kept in the in-process cache (shared by all the
+# ``RelAlternateHreflangSitemap`` sitemaps in cluster mode).
+HREFLANG_CLUSTER_CACHE_SIZE = 50000
+
+# For how long (in seconds) the rendered alternate hreflang blocks of the
+# translation clusters are kept in the in-process cache.
+HREFLANG_CLUSTER_CACHE_TIMEOUT = 300
+
+# Fraction (0.0 - 1.0) of the sitemap renderings measured (see
+# ``qartez.instrumentation``). Zero disables the instrumentation.
+INSTRUMENTATION_SAMPLE_RATE = 0.0
+
+# Dotted paths of the sinks the measurements are sent to (for instance,
+# ``qartez.instrumentation.StatsdSink``). Measurements are sent with the
+# ``qartez.signals.sitemap_measured`` signal in any case.
+INSTRUMENTATION_SINKS = []
+
+# Address of the statsd server (see ``qartez.instrumentation.StatsdSink``).
+INSTRUMENTATION_STATSD_HOST = 'localhost'
+INSTRUMENTATION_STATSD_PORT = 8125
+
+# Prefix of the statsd metric names.
+INSTRUMENTATION_STATSD_PREFIX = 'qartez'
+
+# For how long (in seconds) the estimated entry sizes of the sitemaps having
+# the ``max_page_bytes`` set are kept (see ``qartez.sizing``).
+PAGE_SIZE_ESTIMATE_CACHE_TIMEOUT = 86400
+
+# Max number of threads the ``qartez.async_views`` build the sitemaps on.
+ASYNC_VIEWS_MAX_WORKERS = 4
+
+# Max number of threads the sections are built on by the
+# ``qartez.views.render_images_sitemap`` view in the ``concurrent`` mode.
+CONCURRENT_SECTIONS_MAX_WORKERS = 4
+
 DEBUG = False
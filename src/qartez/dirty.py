@@ -0,0 +1,210 @@
+__title__ = 'qartez.dirty'
+__author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
+__all__ = ('DirtyPageTracker', 'track_dirty_pages', 'is_cache_shared',)
+
+import warnings
+from bisect import bisect_left
+from hashlib import md5
+
+from django.core.cache import cache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models.query import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.utils.encoding import force_bytes
+
+from qartez.paginator import KeysetPaginator
+from qartez.settings import DIRTY_PAGES_CACHE_TIMEOUT
+
+try:
+    from django.core.cache import caches
+except ImportError: # Django < 1.7
+    caches = None
+
+def is_cache_shared():
+    """
+    Checks if the default cache is shared by the processes (not the
+    ``LocMemCache`` or the ``DummyCache``).
+
+    :return bool:
+    """
+    backend = caches['default'] if caches is not None else cache
+    return not isinstance(backend, (LocMemCache, DummyCache))
+
+class DirtyPageTracker(object):
+    """
+    Tracks the pages of a sitemap section, which have changed since the last
+    (re)generation. Saved or deleted objects are mapped to the page
+    containing them by the ``post_save`` and ``post_delete`` signals of the
+    queryset model and the page is flagged as dirty in the Django cache.
+    Flags are idempotent, so bursts of writes to the same page are
+    coalesced into a single regeneration (see
+    ``qartez.generator.SitemapGenerator.generate_dirty``).
+
+    Objects can only be mapped to a page for the keyset paginated sitemaps
+    (the page boundaries are known upfront and don't move on inserts or
+    deletes, see ``qartez.paginator.KeysetPaginator``). With the default
+    ``LIMIT/OFFSET`` pagination any change shifts the items of all the
+    following pages, so the whole section is flagged as dirty.
+
+    Note, that the signals are only received in the processes the tracker
+    has been connected in. Since the flags are set by those processes and
+    popped by the one generating the sitemaps, the default cache shall be
+    shared by the processes (memcached, redis, database or file based, but
+    not the ``LocMemCache``). A ``RuntimeWarning`` is issued on ``connect``
+    otherwise.
+
+    :example:
+    >>> tracker = DirtyPageTracker(FooItemAlternateHreflangSitemap())
+    >>> tracker.connect()
+    >>> tracker.pop(num_pages=20)
+    """
+    def __init__(self, sitemap, timeout=None):
+        """
+        Constructor.
+
+        :param django.contrib.sitemaps.Sitemap sitemap:
+        :param int timeout: For how long (in seconds) the flags are kept.
+        """
+        self.sitemap = sitemap
+        self.queryset = sitemap.items()
+        self.model = self.queryset.model
+        if timeout is None:
+            timeout = DIRTY_PAGES_CACHE_TIMEOUT
+        self.timeout = timeout
+
+        paginator = sitemap.paginator
+        if isinstance(paginator, KeysetPaginator):
+            self.key = paginator.key
+            self.boundaries_cache_key = paginator.get_cache_key()
+        else:
+            self.key = self.boundaries_cache_key = None
+
+        self.cache_key = self.get_cache_key()
+
+    def get_cache_key(self):
+        """
+        Cache key prefix of the flags. Depends on the SQL of the queryset,
+        the key column and the number of items per page.
+
+        :return str:
+        """
+        try:
+            sql = str(self.queryset.query)
+        except Exception as e:
+            # Query is known to produce no results
+            sql = ''
+        hash_ = md5(force_bytes(
+            '{0}:{1}:{2}'.format(sql, self.key, self.sitemap.limit)
+            ))
+        return 'qartez.dirty.{0}'.format(hash_.hexdigest())
+
+    def get_page_number(self, instance):
+        """
+        Gets the number of the page containing the object given. Returns
+        None if it can't be told (whole section shall be regenerated then).
+        Page boundaries are only taken from the cache, never computed here.
+
+        :param django.db.models.Model instance:
+        :return int:
+        """
+        if self.boundaries_cache_key is None:
+            return None
+        cached = cache.get(self.boundaries_cache_key)
+        if cached is None:
+            return None
+        # Lower boundary of a page is exclusive and the upper one inclusive
+        return bisect_left(cached[0], instance.serializable_value(self.key)) + 1
+
+    def mark_page(self, number):
+        """
+        Flags the page given as dirty.
+
+        :param int number:
+        """
+        cache.set('{0}.{1}'.format(self.cache_key, number), True, self.timeout)
+
+    def mark_all(self):
+        """
+        Flags the whole section as dirty.
+        """
+        cache.set('{0}.all'.format(self.cache_key), True, self.timeout)
+
+    def mark(self, instance):
+        """
+        Flags the page containing the object given as dirty.
+
+        :param django.db.models.Model instance:
+        """
+        number = self.get_page_number(instance)
+        if number is None:
+            self.mark_all()
+        else:
+            self.mark_page(number)
+
+    def pop(self, num_pages):
+        """
+        Gets the numbers of the dirty pages and clears the flags.
+
+        :param int num_pages: Current number of pages of the section.
+        :return list:
+        """
+        keys = ['{0}.all'.format(self.cache_key)] + [
+            '{0}.{1}'.format(self.cache_key, number) \
+            for number in range(1, num_pages + 1)
+            ]
+        flags = cache.get_many(keys)
+        if flags:
+            cache.delete_many(list(flags.keys()))
+        if keys[0] in flags:
+            return list(range(1, num_pages + 1))
+        return [
+            number for number, key in enumerate(keys[1:], start=1) \
+            if key in flags
+            ]
+
+    def _on_change(self, sender, instance, **kwargs):
+        if kwargs.get('raw', False):
+            return
+        self.mark(instance)
+
+    def connect(self):
+        """
+        Connects the tracker to the model signals. Safe to be called
+        multiple times (for the same sitemap).
+        """
+        if not is_cache_shared():
+            warnings.warn(
+                "The dirty pages of the {0} sitemap are flagged in a cache "
+                "not shared by the processes; the other processes (the "
+                "qartez_generate command) won't see them.".format(
+                    self.sitemap.__class__.__name__
+                    ),
+                RuntimeWarning
+                )
+        dispatch_uid = 'qartez.dirty.{0}'.format(self.cache_key)
+        for signal in (post_save, post_delete):
+            signal.connect(
+                self._on_change, sender=self.model, weak=False,
+                dispatch_uid=dispatch_uid
+                )
+
+def track_dirty_pages(sitemaps):
+    """
+    Connects the dirty page trackers of all the (queryset based) sections of
+    the sitemaps dict given. Shall be called at start up (in the ``urls``
+    module for instance) of every process, which modifies the objects.
+
+    :param dict sitemaps:
+    :return list: Trackers connected.
+    """
+    trackers = []
+    for sitemap in sitemaps.values():
+        if callable(sitemap):
+            sitemap = sitemap()
+        if not isinstance(sitemap.items(), QuerySet):
+            continue
+        tracker = DirtyPageTracker(sitemap)
+        tracker.connect()
+        trackers.append(tracker)
+    return trackers
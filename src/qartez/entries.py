@@ -0,0 +1,235 @@
+"""
+Compact URL entries, produced by the ``get_urls`` (and ``iter_urls``) of
+the ``qartez`` sitemaps and consumed by the ``qartez.serializers``.
+
+Entries keep their values in ``__slots__`` (no per-instance ``__dict__``),
+which takes a fraction of the memory of the dicts used before. For the
+templates (``url.image_location``) and the code written for the dicts
+(``url['location']``, ``url.get('lastmod')``), entries are read-only
+mappings of their ``fields`` as well.
+
+:example:
+>>> url = sitemap.get_urls(1)[0]
+>>> url.location == url['location'] == url.get('location')
+>>> url.as_dict()
+"""
+__title__ = 'qartez.entries'
+__author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
+__all__ = (
+    'Entry', 'ImageEntry', 'ImagesUrlEntry',
+    'RelAlternateHreflangUrlEntry', 'StaticUrlEntry',
+)
+
+class Entry(object):
+    """
+    Base of the entries. Subclasses list the constructor arguments (in
+    order) in the ``__slots__`` and all the names readable through the
+    mapping interface in the ``fields``.
+    """
+    __slots__ = ()
+    fields = ()
+
+    @classmethod
+    def from_dict(cls, value):
+        """
+        Makes an entry of the dict given (missing keys are None).
+
+        :param dict value:
+        :return qartez.entries.Entry:
+        """
+        return cls(*[value.get(name) for name in cls.__slots__])
+
+    def __getitem__(self, key):
+        if key not in self.fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        if key not in self.fields:
+            return default
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.fields
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def keys(self):
+        return list(self.fields)
+
+    def values(self):
+        return [getattr(self, name) for name in self.fields]
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in self.fields]
+
+    def as_dict(self):
+        """
+        Gets the (new) dict of the entry fields.
+
+        :return dict:
+        """
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, Entry):
+            return self.as_dict() == other.as_dict()
+        if isinstance(other, dict):
+            return self.as_dict() == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return (
+            self.__class__,
+            tuple(getattr(self, name) for name in self.__slots__)
+            )
+
+    def __repr__(self):
+        return '{0}({1})'.format(self.__class__.__name__, ', '.join(
+            '{0}={1!r}'.format(name, getattr(self, name)) \
+            for name in self.__slots__
+            ))
+
+
+class ImageEntry(Entry):
+    """
+    Image of the ``ImagesUrlEntry``.
+    """
+    __slots__ = fields = (
+        'location', 'caption', 'title', 'license', 'geo_location',
+    )
+
+    def __init__(self, location, caption=None, title=None, license=None, \
+                 geo_location=None):
+        self.location = location
+        self.caption = caption
+        self.title = title
+        self.license = license
+        self.geo_location = geo_location
+
+
+def _first_image_field(name):
+    """
+    Makes a property reading the field given of the first image of the
+    ``ImagesUrlEntry`` (None if there are no images).
+
+    :param str name:
+    :return property:
+    """
+    def getter(self):
+        if not self.images:
+            return None
+        return getattr(self.images[0], name)
+    return property(getter)
+
+
+class ImagesUrlEntry(Entry):
+    """
+    URL entry of the ``qartez.ImagesSitemap``. The ``image_*`` fields are
+    those of the first image.
+    """
+    __slots__ = ('location', 'lastmod', 'changefreq', 'priority', 'images',)
+    fields = __slots__ + (
+        'image_location', 'image_caption', 'image_title', 'image_license',
+        'image_geo_location',
+    )
+
+    def __init__(self, location, lastmod=None, changefreq=None, \
+                 priority=None, images=()):
+        """
+        Constructor.
+
+        :param str location:
+        :param lastmod:
+        :param str changefreq:
+        :param float priority:
+        :param sequence images: Sequence of ``ImageEntry``.
+        """
+        self.location = location
+        self.lastmod = lastmod
+        self.changefreq = changefreq
+        self.priority = priority
+        self.images = images
+
+    image_location = _first_image_field('location')
+    image_caption = _first_image_field('caption')
+    image_title = _first_image_field('title')
+    image_license = _first_image_field('license')
+    image_geo_location = _first_image_field('geo_location')
+
+    @classmethod
+    def from_dict(cls, value):
+        """
+        Makes an entry of the dict given: the ``images`` (list of dicts),
+        or the single image described by the ``image_*`` keys if there are
+        no ``images`` in the dict.
+
+        :param dict value:
+        :return qartez.entries.ImagesUrlEntry:
+        """
+        images = value.get('images')
+        if images is None:
+            images = []
+            if value.get('image_location'):
+                images.append(ImageEntry(
+                    value['image_location'], value.get('image_caption'),
+                    value.get('image_title'), value.get('image_license'),
+                    value.get('image_geo_location')
+                    ))
+        else:
+            images = [
+                image if isinstance(image, ImageEntry) \
+                      else ImageEntry.from_dict(image) \
+                for image in images
+                ]
+        return cls(
+            value.get('location'), value.get('lastmod'),
+            value.get('changefreq'), value.get('priority'), images
+            )
+
+
+class RelAlternateHreflangUrlEntry(Entry):
+    """
+    URL entry of the ``qartez.RelAlternateHreflangSitemap``. The
+    ``alternate_hreflangs`` is the rendered XML of the alternates.
+    """
+    __slots__ = fields = (
+        'location', 'lastmod', 'changefreq', 'priority',
+        'alternate_hreflangs',
+    )
+
+    def __init__(self, location, lastmod=None, changefreq=None, \
+                 priority=None, alternate_hreflangs=''):
+        self.location = location
+        self.lastmod = lastmod
+        self.changefreq = changefreq
+        self.priority = priority
+        self.alternate_hreflangs = alternate_hreflangs
+
+
+class StaticUrlEntry(Entry):
+    """
+    URL entry of the ``qartez.StaticSitemap``. The ``item`` is the
+    ``qartez.StaticSitemapEntry``.
+    """
+    __slots__ = fields = (
+        'item', 'location', 'lastmod', 'changefreq', 'priority',
+    )
+
+    def __init__(self, item, location, lastmod=None, changefreq=None, \
+                 priority=None):
+        self.item = item
+        self.location = location
+        self.lastmod = lastmod
+        self.changefreq = changefreq
+        self.priority = priority
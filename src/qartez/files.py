@@ -0,0 +1,209 @@
+__title__ = 'qartez.files'
+__author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
+__all__ = ('LineIndex', 'FileEntries', 'CSV', 'JSONL',)
+
+import csv
+import json
+import mmap
+import os
+from array import array
+from threading import Lock
+
+from six import PY3
+from six.moves import range
+
+CSV = 'csv'
+JSONL = 'jsonl'
+
+# Type code of the line offsets (unsigned, 8 bytes, whatever the platform)
+try:
+    array('Q')
+    OFFSET_TYPECODE = 'Q'
+except ValueError: # Python < 3.3
+    OFFSET_TYPECODE = 'L'
+
+class LineIndex(object):
+    """
+    Index of the (non blank) lines of a file. The file is memory-mapped and
+    the offsets of the lines are collected in a single pass on first use,
+    so any line can be read without reading the ones before it. Only the
+    offsets (8 bytes per line) are kept in the process memory; the content
+    is paged in by the OS (and shared by the processes) as it's read.
+
+    The index is rebuilt when the file changes (size or modification time).
+    """
+    def __init__(self, path, skip=0):
+        """
+        Constructor.
+
+        :param str path:
+        :param int skip: Number of the leading (non blank) lines to skip
+            (header).
+        """
+        self.path = path
+        self.skip = skip
+        self._state = None
+        self._lock = Lock()
+
+    def _build(self, stat):
+        """
+        Maps the file and collects the line offsets.
+
+        :param os.stat_result stat:
+        :return tuple: (stat key, mmap or None, array of offsets)
+        """
+        offsets = array(OFFSET_TYPECODE)
+        data = None
+        if stat.st_size:
+            with open(self.path, 'rb') as file_:
+                data = mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ)
+            size, position = len(data), 0
+            while position < size:
+                end = data.find(b'\n', position)
+                if -1 == end:
+                    end = size
+                if data[position:end].strip():
+                    offsets.append(position)
+                position = end + 1
+        return ((stat.st_size, stat.st_mtime), data, offsets[self.skip:])
+
+    def _get_state(self):
+        """
+        Gets the (up to date) mapping and offsets.
+
+        :return tuple:
+        """
+        stat = os.stat(self.path)
+        state = self._state
+        if state is None or state[0] != (stat.st_size, stat.st_mtime):
+            with self._lock:
+                state = self._state
+                if state is None \
+                   or state[0] != (stat.st_size, stat.st_mtime):
+                    state = self._state = self._build(stat)
+        return state
+
+    def __len__(self):
+        return len(self._get_state()[2])
+
+    def get_lines(self, start, stop):
+        """
+        Gets the lines (bytes, without the line break) from ``start`` up to
+        (not including) ``stop``.
+
+        :param int start:
+        :param int stop:
+        :return list:
+        """
+        key, data, offsets = self._get_state()
+        lines = []
+        for number in range(start, min(stop, len(offsets))):
+            position = offsets[number]
+            end = data.find(b'\n', position)
+            lines.append(data[position:end if -1 != end else len(data)])
+        return lines
+
+    def get_line(self, number):
+        """
+        Gets the line (bytes) of the number given.
+
+        :param int number:
+        :return bytes:
+        """
+        lines = self.get_lines(number, number + 1) if number >= 0 else []
+        if not lines:
+            raise IndexError(number)
+        return lines[0]
+
+
+class FileEntries(object):
+    """
+    Read-only sequence of the entries stored in a CSV (with a header row
+    naming the columns, no line breaks within the values) or JSONL (one
+    JSON object per line) file. Rows are parsed (into dicts, passed to the
+    ``make_entry``) only when accessed, so the sequence can be paginated
+    (see ``django.core.paginator.Paginator``) without loading the file.
+    """
+    def __init__(self, path, format=None, make_entry=None):
+        """
+        Constructor.
+
+        :param str path:
+        :param str format: "csv" or "jsonl". Taken from the file extension
+            if not given.
+        :param callable make_entry: Turns the row (dict) into an entry.
+        """
+        if format is None:
+            format = JSONL if path.endswith(('.jsonl', '.json')) else CSV
+        if format not in (CSV, JSONL):
+            raise ValueError("Unsupported format: {0}".format(format))
+        self.path = path
+        self.format = format
+        self.make_entry = make_entry
+        self.index = LineIndex(path, skip=1 if CSV == format else 0)
+        self._fieldnames = None
+
+    def get_fieldnames(self):
+        """
+        Gets the column names of the CSV file (first non blank line).
+
+        :return list:
+        """
+        if self._fieldnames is None:
+            header = b''
+            with open(self.path, 'rb') as file_:
+                for line in file_:
+                    if line.strip():
+                        header = line.rstrip(b'\r\n')
+                        break
+            self._fieldnames = [
+                name.strip() for name in self._split_csv_line(header)
+                ]
+        return self._fieldnames
+
+    def _split_csv_line(self, line):
+        """
+        Splits the CSV line given into (unicode) values.
+
+        :param bytes line:
+        :return list:
+        """
+        if PY3:
+            return next(csv.reader([line.decode('utf-8')]))
+        return [
+            value.decode('utf-8') for value in next(csv.reader([line]))
+            ]
+
+    def parse(self, line):
+        """
+        Parses the line given into a dict.
+
+        :param bytes line:
+        :return dict:
+        """
+        if JSONL == self.format:
+            return json.loads(line.decode('utf-8'))
+        return dict(zip(self.get_fieldnames(), self._split_csv_line(line)))
+
+    def _make_entries(self, lines):
+        entries = [self.parse(line) for line in lines]
+        if self.make_entry is not None:
+            entries = [self.make_entry(entry) for entry in entries]
+        return entries
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if 1 != step:
+                return [self[number] for number in range(start, stop, step)]
+            return self._make_entries(self.index.get_lines(start, stop))
+        if index < 0:
+            index += len(self)
+        return self._make_entries([self.index.get_line(index)])[0]
+
+    def __iter__(self):
+        for number in range(len(self)):
+            yield self[number]
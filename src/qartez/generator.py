@@ -0,0 +1,597 @@
+__title__ = 'qartez.generator'
+__author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
+__all__ = (
+    'SitemapGenerator', 'render_sitemap_page', 'serialize_sitemap_page',
+    'write_file',
+)
+
+import multiprocessing
+import os
+import tempfile
+from gzip import GzipFile
+from hashlib import md5
+from io import BytesIO
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.db.models.query import QuerySet
+from django.template import loader
+from django.utils.encoding import force_bytes
+
+try:
+    from django.core.cache import caches
+except ImportError: # Django < 1.7
+    caches = None
+
+from qartez.dirty import DirtyPageTracker
+from qartez.paginator import KeysetPaginator
+from qartez.settings import DIRTY_PAGES_CACHE_TIMEOUT
+from qartez.sizing import record_page_size
+
+def get_template_name(sitemap):
+    """
+    Gets the template name for the sitemap given. The ``qartez`` sitemaps
+    have the ``template_name`` attribute, the rest is rendered with the
+    Django default sitemap template.
+
+    :param django.contrib.sitemaps.Sitemap sitemap:
+    :return str:
+    """
+    return getattr(sitemap, 'template_name', None) or 'sitemap.xml'
+
+def render_sitemap_page(sitemap, page=1, site=None, protocol=None, \
+                        template_name=None):
+    """
+    Renders a single page of the sitemap given. Returns a tuple of the XML
+    (bytes) and the URL entries rendered. The ``urlset_serializer`` of the
+    sitemap is used, unless the ``template_name`` is given. Size of the page
+    is fed to the entry size estimate of the sitemap (see
+    ``qartez.sizing.record_page_size``).
+
+    :param django.contrib.sitemaps.Sitemap sitemap:
+    :param int page:
+    :param django.contrib.sites.models.Site site:
+    :param str protocol:
+    :param str template_name:
+    :return tuple:
+    """
+    urls = sitemap.get_urls(page=page, site=site, protocol=protocol)
+    return (serialize_sitemap_page(sitemap, urls, template_name), urls)
+
+def serialize_sitemap_page(sitemap, urls, template_name=None):
+    """
+    Serializes the URL entries given as a page of the sitemap given (see
+    ``render_sitemap_page``).
+
+    :param django.contrib.sitemaps.Sitemap sitemap:
+    :param list urls:
+    :param str template_name:
+    :return bytes:
+    """
+    serializer = getattr(sitemap, 'urlset_serializer', None)
+    if template_name is None and serializer is not None:
+        xml = serializer(urls)
+    else:
+        xml = force_bytes(loader.render_to_string(
+            template_name or get_template_name(sitemap), {'urlset': urls}
+            ))
+    record_page_size(sitemap, len(urls), len(xml))
+    return xml
+
+def gzip_content(content):
+    """
+    Gzips the content given. Modification time is not stored, so the same
+    content always produces the same output.
+
+    :param bytes content:
+    :return bytes:
+    """
+    buf = BytesIO()
+    gzip_file = GzipFile(fileobj=buf, mode='wb', mtime=0)
+    try:
+        gzip_file.write(content)
+    finally:
+        gzip_file.close()
+    return buf.getvalue()
+
+def write_file(storage, name, content):
+    """
+    Writes the content to the storage given. For the file system based
+    storages (those implementing the ``path`` method), the content is first
+    written to a temporary file in the same directory, which is then renamed
+    (atomically) to the target name. For the rest, existing file is
+    deleted and the new one is saved (not atomic).
+
+    :param django.core.files.storage.Storage storage:
+    :param str name:
+    :param bytes content:
+    :return str: Name of the file written.
+    """
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        path = None
+
+    if path is None:
+        if storage.exists(name):
+            storage.delete(name)
+        return storage.save(name, ContentFile(content))
+
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            # Created by another (worker) process in the meantime
+            if not os.path.isdir(directory):
+                raise
+
+    fd, temp_path = tempfile.mkstemp(
+        prefix='.qartez-', suffix='.tmp', dir=directory
+        )
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(content)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.chmod(temp_path, 0o644)
+        # ``os.replace`` overwrites the target on all platforms (Python 3.3+)
+        getattr(os, 'replace', os.rename)(temp_path, path)
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return name
+
+# Generator of the worker processes (inherited from the parent process)
+_worker_generator = None
+
+def _generate_shard(shard):
+    """
+    Generates the page (shard) given in a worker process.
+
+    :param tuple shard: (section, page)
+    :return dict: Index entry of the page.
+    """
+    section, page = shard
+    return _worker_generator.generate_page(section, page)
+
+def _close_connections():
+    """
+    Closes all the database and cache connections of the current process
+    (thread). They're opened again on demand.
+    """
+    for connection in connections.all():
+        connection.close()
+    backends = [cache] if caches is None \
+               else [caches[alias] for alias in settings.CACHES]
+    for backend in backends:
+        # Django < 1.6 caches have no ``close``
+        close = getattr(backend, 'close', None)
+        if close is not None:
+            close()
+
+
+class SitemapGenerator(object):
+    """
+    Pre-generates sitemaps to files. Every page of every section of the
+    sitemaps dict given (same dicts as passed to the
+    ``qartez.views.render_images_sitemap`` or the
+    ``django.contrib.sitemaps.views.sitemap`` views) is written through the
+    storage given, along with the sitemap index.
+
+    Files are named ``{prefix}-{section}-{page}.xml`` and the index is
+    named ``{prefix}.xml``.
+
+    Once generated, only the pages changed since may be regenerated with
+    ``generate_dirty`` (see ``qartez.dirty``). Files of the clean pages
+    are left untouched.
+
+    When ``processes`` is greater than one, the pages are generated on a
+    pool of that many (forked, so Unix only) worker processes, each with
+    its own database and cache connections. The number of pages and the
+    page boundaries are determined by the parent process beforehand and
+    the index is written once all the pages are done.
+
+    For the large tables, ``generate_streaming`` generates every section in
+    a single pass over its items with a constant memory (the items are
+    fetched in chunks, with a server-side cursor on PostgreSQL) instead.
+
+    :example:
+    >>> from foo.sitemap import foo_item_images_sitemap
+    >>> generator = SitemapGenerator(foo_item_images_sitemap, gzip=True)
+    >>> generator.generate()
+    >>> generator.generate_dirty()
+    >>> generator.generate_streaming()
+    """
+    def __init__(self, sitemaps, storage=None, prefix='sitemap', \
+                 base_url=None, gzip=False, site=None, protocol=None, \
+                 processes=None):
+        """
+        Constructor.
+
+        :param dict sitemaps:
+        :param django.core.files.storage.Storage storage: Defaults to the
+            ``default_storage``.
+        :param str prefix: Prefix of the file names.
+        :param str base_url: Base URL of the files (used in the index). When
+            not given, the ``url`` of the storage is used.
+        :param bool gzip: If set to True, ``.xml.gz`` files are written
+            alongside.
+        :param django.contrib.sites.models.Site site: Defaults to the
+            current site.
+        :param str protocol:
+        :param int processes: Number of the worker processes. The pages are
+            generated in the current process when not given.
+        """
+        self.sitemaps = sitemaps
+        self.storage = storage if storage is not None else default_storage
+        self.prefix = prefix
+        self.base_url = base_url
+        self.gzip = gzip
+        self.site = site
+        self.protocol = protocol
+        self.processes = processes
+        self._instances = {}
+
+    def get_site(self):
+        """
+        Gets the site.
+
+        :return django.contrib.sites.models.Site:
+        """
+        if self.site is None:
+            # Imported here, since the package is imported before the
+            # models can be (app loading of Django >= 1.9)
+            from django.contrib.sites.models import Site
+            self.site = Site.objects.get_current()
+        return self.site
+
+    def get_sitemap(self, section):
+        """
+        Gets the sitemap instance of the section given.
+
+        :param str section:
+        :return django.contrib.sitemaps.Sitemap:
+        """
+        sitemap = self.sitemaps[section]
+        if callable(sitemap):
+            # Sitemap classes are instantiated once per generator
+            if section not in self._instances:
+                self._instances[section] = sitemap()
+            return self._instances[section]
+        return sitemap
+
+    def get_filename(self, section=None, page=None):
+        """
+        Gets the file name of the section page given. When no section is
+        given, the index file name is returned.
+
+        :param str section:
+        :param int page:
+        :return str:
+        """
+        if section is None:
+            return '{0}.xml'.format(self.prefix)
+        return '{0}-{1}-{2}.xml'.format(self.prefix, section, page)
+
+    def get_file_url(self, name):
+        """
+        Gets the absolute URL of the file given.
+
+        :param str name:
+        :return str:
+        """
+        if self.base_url:
+            return '{0}/{1}'.format(self.base_url.rstrip('/'), name)
+        url = self.storage.url(name)
+        if url.startswith('/'):
+            url = '{0}://{1}{2}'.format(
+                self.protocol or 'http', self.get_site().domain, url
+                )
+        return url
+
+    def write(self, name, content):
+        """
+        Writes the file (and the gzipped copy of it if asked to).
+
+        :param str name:
+        :param bytes content:
+        :return list: Names of the files written.
+        """
+        written = [write_file(self.storage, name, content)]
+        if self.gzip:
+            written.append(write_file(
+                self.storage, '{0}.gz'.format(name), gzip_content(content)
+                ))
+        return written
+
+    def generate_page(self, section, page, sitemap=None):
+        """
+        Generates a single page of a section.
+
+        :param str section:
+        :param int page:
+        :param django.contrib.sitemaps.Sitemap sitemap:
+        :return dict: Index entry of the page (``name`` and ``lastmod``).
+        """
+        if sitemap is None:
+            sitemap = self.get_sitemap(section)
+        content, urls = render_sitemap_page(
+            sitemap, page=page, site=self.get_site(), protocol=self.protocol
+            )
+        return self.write_page(section, page, content, urls)
+
+    def write_page(self, section, page, content, urls):
+        """
+        Writes the rendered page of a section.
+
+        :param str section:
+        :param int page:
+        :param bytes content:
+        :param list urls: URL entries of the page.
+        :return dict: Index entry of the page (``name`` and ``lastmod``).
+        """
+        name = self.get_filename(section, page)
+        self.write(name, content)
+
+        lastmods = [url['lastmod'] for url in urls if url.get('lastmod')]
+        return {'name': name, 'lastmod': max(lastmods) if lastmods else None}
+
+    def generate_pages(self, shards):
+        """
+        Generates the pages (shards) given, on the worker processes if asked
+        to.
+
+        :param list shards: List of (section, page) tuples.
+        :return list: Index entries of the pages (in the order of shards).
+        """
+        if not self.processes or self.processes < 2 or len(shards) < 2:
+            return [self.generate_page(section, page) \
+                    for section, page in shards]
+
+        global _worker_generator
+        # Resolved once, shared by the workers
+        self.get_site()
+        # Workers shall not share the (database and cache) connections of
+        # the parent process
+        _close_connections()
+        _worker_generator = self
+        if hasattr(multiprocessing, 'get_context'):
+            context = multiprocessing.get_context('fork')
+        else: # Python 2
+            context = multiprocessing
+        pool = context.Pool(min(self.processes, len(shards)))
+        try:
+            return pool.map(_generate_shard, shards)
+        finally:
+            pool.close()
+            pool.join()
+            _worker_generator = None
+
+    def generate_section(self, section):
+        """
+        Generates all pages of a section.
+
+        :param str section:
+        :return list: Index entries of the pages.
+        """
+        sitemap = self.get_sitemap(section)
+        return self.generate_pages([
+            (section, page) \
+            for page in range(1, sitemap.paginator.num_pages + 1)
+            ])
+
+    def generate_section_streaming(self, section):
+        """
+        Generates all pages of a section in a single pass over its items
+        (see ``qartez.mixins.IterationMixin.iter_all_urls``), with a
+        constant memory: the URL entries are cut into pages of ``limit``
+        entries (fewer for the sitemaps with the ``max_page_bytes``) as
+        they come, so only a single page is held in memory at a time.
+        Sitemaps without the ``iter_all_urls`` are generated page by page.
+
+        :param str section:
+        :return list: Index entries of the pages.
+        """
+        sitemap = self.get_sitemap(section)
+        if not hasattr(sitemap, 'iter_all_urls'):
+            return [
+                self.generate_page(section, page, sitemap) \
+                for page in range(1, sitemap.paginator.num_pages + 1)
+                ]
+
+        per_page = sitemap.limit
+        get_size_estimator = getattr(sitemap, 'get_size_estimator', None)
+        if get_size_estimator is not None \
+           and get_size_estimator() is not None:
+            per_page = get_size_estimator().get_per_page(per_page)
+
+        urls = sitemap.iter_all_urls(
+            site=self.get_site(), protocol=self.protocol
+            )
+        entries, page = [], 1
+        while True:
+            page_urls = list(islice(urls, per_page))
+            # An empty section still gets its (empty) first page
+            if not page_urls and page > 1:
+                break
+            entries.append(self.write_page(
+                section, page, serialize_sitemap_page(sitemap, page_urls),
+                page_urls
+                ))
+            page += 1
+        return entries
+
+    def generate_streaming(self):
+        """
+        Generates all pages of all sections (see
+        ``generate_section_streaming``), plus the index. Pages are cut from
+        the output, so their boundaries may differ from the paginator ones;
+        the record of the last generation is dropped, so that the next
+        ``generate_dirty`` generates everything. Always runs in the current
+        process.
+
+        :return list: Index entries of the pages.
+        """
+        entries = []
+        for section in self.sitemaps.keys():
+            entries.extend(self.generate_section_streaming(section))
+        self.generate_index(entries)
+        cache.delete(self.get_manifest_cache_key())
+        return entries
+
+    def generate_index(self, entries):
+        """
+        Generates the sitemap index.
+
+        :param list entries: Index entries (``name`` and ``lastmod``) of
+            the pages.
+        :return str: Name of the index file.
+        """
+        sitemaps = [
+            {'location': self.get_file_url(entry['name']),
+             'lastmod': entry['lastmod']} \
+            for entry in entries
+            ]
+        content = force_bytes(loader.render_to_string(
+            'qartez/sitemap_index.xml', {'sitemaps': sitemaps}
+            ))
+        name = self.get_filename()
+        self.write(name, content)
+        return name
+
+    def generate(self):
+        """
+        Generates all pages of all sections, plus the index.
+
+        :return list: Index entries of the pages.
+        """
+        shards, manifest = [], {}
+        for section in self.sitemaps.keys():
+            sitemap = self.get_sitemap(section)
+            num_pages = sitemap.paginator.num_pages
+            # Pending flags are covered by this run
+            self.get_dirty_pages(sitemap, num_pages)
+            shards.extend((section, page) for page in range(1, num_pages + 1))
+            manifest[section] = {
+                'state': self.get_section_state(sitemap),
+                'entries': [],
+                }
+
+        entries = self.generate_pages(shards)
+        for (section, page), entry in zip(shards, entries):
+            manifest[section]['entries'].append(entry)
+        self.generate_index(entries)
+        self.save_manifest(manifest)
+        return entries
+
+    def get_manifest_cache_key(self):
+        """
+        Cache key of the manifest (state of the last generation).
+
+        :return str:
+        """
+        hash_ = md5(force_bytes('{0}:{1}:{2}:{3}'.format(
+            self.prefix, getattr(self.storage, 'location', ''),
+            self.base_url, ','.join(sorted(self.sitemaps.keys()))
+            )))
+        return 'qartez.generator.{0}'.format(hash_.hexdigest())
+
+    def get_manifest(self):
+        """
+        Gets the manifest of the last generation: state and index entries
+        of every section.
+
+        :return dict:
+        """
+        return cache.get(self.get_manifest_cache_key())
+
+    def save_manifest(self, manifest):
+        """
+        Saves the manifest.
+
+        :param dict manifest:
+        """
+        cache.set(
+            self.get_manifest_cache_key(), manifest, DIRTY_PAGES_CACHE_TIMEOUT
+            )
+
+    def get_section_state(self, sitemap):
+        """
+        Gets the pagination state of the sitemap: page boundaries for the
+        keyset paginated sitemaps, number of pages for the rest. Once it
+        changes, the whole section shall be regenerated.
+
+        :param django.contrib.sitemaps.Sitemap sitemap:
+        :return tuple:
+        """
+        paginator = sitemap.paginator
+        if isinstance(paginator, KeysetPaginator):
+            return ('keyset', tuple(paginator.get_boundaries()[0]))
+        return ('pages', paginator.num_pages)
+
+    def get_dirty_pages(self, sitemap, num_pages):
+        """
+        Gets (and clears) the dirty pages of the sitemap.
+
+        :param django.contrib.sitemaps.Sitemap sitemap:
+        :param int num_pages:
+        :return list: Page numbers.
+        """
+        if not isinstance(sitemap.items(), QuerySet):
+            # Not tracked (``StaticSitemap`` for instance)
+            return list(range(1, num_pages + 1))
+        return DirtyPageTracker(sitemap).pop(num_pages)
+
+    def generate_dirty(self):
+        """
+        Regenerates only the pages changed since the last generation (as
+        flagged by the ``qartez.dirty.DirtyPageTracker``), plus the index.
+        Sections, whose pagination state has changed since (page boundaries
+        or number of pages), are regenerated completely. If there's no
+        record of the last generation, everything is generated.
+
+        :return list: Index entries of the pages regenerated.
+        """
+        manifest = self.get_manifest()
+        if manifest is None:
+            return self.generate()
+
+        shards, sections = [], {}
+        for section in self.sitemaps.keys():
+            sitemap = self.get_sitemap(section)
+            num_pages = sitemap.paginator.num_pages
+            state = self.get_section_state(sitemap)
+            pages = self.get_dirty_pages(sitemap, num_pages)
+            previous = manifest.get(section)
+            if previous is None or previous['state'] != state:
+                pages = list(range(1, num_pages + 1))
+                previous = {'state': state, 'entries': []}
+
+            sections[section] = (state, num_pages, dict(
+                (number, entry) for number, entry \
+                in enumerate(previous['entries'], start=1)
+                ))
+            shards.extend((section, page) for page in pages)
+
+        regenerated = self.generate_pages(shards)
+        for (section, page), entry in zip(shards, regenerated):
+            sections[section][2][page] = entry
+        for section, (state, num_pages, entries) in sections.items():
+            manifest[section] = {
+                'state': state,
+                'entries': [entries[page] for page in range(1, num_pages + 1)],
+                }
+
+        if regenerated:
+            entries = []
+            for section in self.sitemaps.keys():
+                entries.extend(manifest[section]['entries'])
+            self.generate_index(entries)
+        self.save_manifest(manifest)
+        return regenerated
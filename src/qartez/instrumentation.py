@@ -0,0 +1,364 @@
+__title__ = 'qartez.instrumentation'
+__author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
+__all__ = (
+    'Measurement', 'measure', 'get_metrics_name', 'emit', 'get_sinks',
+    'get_sampling', 'Sampling', 'MemorySink', 'StatsdSink',
+)
+
+import random
+import re
+import socket
+import time
+from collections import deque
+from importlib import import_module
+from threading import local, Lock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+
+from qartez.settings import INSTRUMENTATION_SAMPLE_RATE, \
+                            INSTRUMENTATION_SINKS, INSTRUMENTATION_STATSD_HOST, \
+                            INSTRUMENTATION_STATSD_PORT, \
+                            INSTRUMENTATION_STATSD_PREFIX
+from qartez.signals import sitemap_measured
+
+try:
+    from django.test.utils import CaptureQueriesContext
+except ImportError: # Django < 1.6
+    CaptureQueriesContext = None
+
+# Characters not allowed in the statsd metric names
+METRIC_NAME_RE = re.compile(r'[^A-Za-z0-9_\-]+')
+
+_state = local()
+
+_sinks = None
+_sinks_lock = Lock()
+
+def get_metrics_name(sitemap):
+    """
+    Gets the name the sitemap given is reported under: the ``metrics_name``
+    attribute of the sitemap, falling back to its class name.
+
+    :param django.contrib.sitemaps.Sitemap sitemap:
+    :return str:
+    """
+    return getattr(sitemap, 'metrics_name', None) \
+           or sitemap.__class__.__name__
+
+def _load_sink(path):
+    """
+    Imports the sink class (or factory) by the dotted path given and
+    instantiates it.
+
+    :param str path:
+    :return object:
+    """
+    try:
+        module_name, name = path.rsplit('.', 1)
+        return getattr(import_module(module_name), name)()
+    except (ValueError, ImportError, AttributeError) as e:
+        raise ImproperlyConfigured(
+            "Can't load the instrumentation sink {0}: {1}".format(path, e)
+            )
+
+def get_sinks():
+    """
+    Gets the sinks configured in the ``INSTRUMENTATION_SINKS`` setting
+    (loaded once per process).
+
+    :return list:
+    """
+    global _sinks
+    if _sinks is None:
+        with _sinks_lock:
+            if _sinks is None:
+                _sinks = [_load_sink(path) for path in INSTRUMENTATION_SINKS]
+    return _sinks
+
+def emit(record):
+    """
+    Sends the record given with the ``qartez.signals.sitemap_measured``
+    signal and to all the configured sinks. Errors of the sinks never break
+    the sitemap rendering.
+
+    :param dict record:
+    """
+    sitemap_measured.send(sender=Measurement, record=record)
+    for sink in get_sinks():
+        try:
+            sink.emit(record)
+        except Exception as e:
+            pass
+
+
+class _QueryCounter(object):
+    """
+    Database execute wrapper (Django >= 2.0) counting the queries and the
+    time spent on them.
+    """
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.time()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.time += time.time() - start
+
+
+class Measurement(object):
+    """
+    Context manager measuring a sitemap generation stage: wall time, number
+    of queries (made on the default database connection) and the time spent
+    on them. Anything else (number of items, bytes, cache hit or miss) is
+    set on the measurement with ``set``. The record is emitted on exit (see
+    ``emit``), unless an exception has been raised.
+
+    Only a ``INSTRUMENTATION_SAMPLE_RATE`` fraction of the measurements is
+    taken (none by default). Measurements nested in a taken (or skipped)
+    one are taken (or skipped) as well, so that the records of a single
+    request are complete. Skipped measurements cost a single random number.
+
+    :example:
+    >>> with Measurement('get_urls', sitemap=sitemap, page=1) as measurement:
+    >>>     urls = sitemap.get_urls(1)
+    >>>     measurement.set(items=len(urls))
+    """
+    def __init__(self, stage, sitemap=None, section=None, page=None, \
+                 sample_rate=None):
+        """
+        Constructor.
+
+        :param str stage: "get_urls", "render" or "cache".
+        :param django.contrib.sitemaps.Sitemap sitemap:
+        :param str section:
+        :param int|str page:
+        :param float sample_rate: Defaults to the
+            ``INSTRUMENTATION_SAMPLE_RATE``.
+        """
+        self.stage = stage
+        self.sitemap = sitemap
+        self.section = section
+        self.page = page
+        self.sample_rate = INSTRUMENTATION_SAMPLE_RATE \
+                           if sample_rate is None else sample_rate
+        self.record = None
+        self._counter = self._wrapper = self._capture = None
+
+    def __enter__(self):
+        depth = getattr(_state, 'depth', 0)
+        if depth:
+            sampled = _state.sampled
+        else:
+            sampled = self.sample_rate > 0 \
+                      and random.random() < self.sample_rate
+            _state.sampled = sampled
+        _state.depth = depth + 1
+        if not sampled:
+            return self
+
+        self.record = {
+            'stage': self.stage,
+            'sitemap': get_metrics_name(self.sitemap) \
+                       if self.sitemap is not None else None,
+            'section': self.section,
+            'page': self.page,
+            'wall_time': None,
+            'queries': None,
+            'query_time': None,
+            'items': None,
+            'bytes': None,
+            'cache': None,
+            }
+        if hasattr(connection, 'execute_wrapper'):
+            self._counter = _QueryCounter()
+            self._wrapper = connection.execute_wrapper(self._counter)
+            self._wrapper.__enter__()
+        elif CaptureQueriesContext is not None:
+            self._capture = CaptureQueriesContext(connection)
+            self._capture.__enter__()
+        self._start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _state.depth -= 1
+        if self.record is None:
+            return
+        self.record['wall_time'] = time.time() - self._start
+        if self._wrapper is not None:
+            self._wrapper.__exit__(exc_type, exc_value, traceback)
+            self.record['queries'] = self._counter.count
+            self.record['query_time'] = self._counter.time
+        elif self._capture is not None:
+            self._capture.__exit__(exc_type, exc_value, traceback)
+            queries = self._capture.captured_queries
+            self.record['queries'] = len(queries)
+            self.record['query_time'] = sum(
+                float(query.get('time') or 0) for query in queries
+                )
+        if exc_type is None:
+            emit(self.record)
+
+    @property
+    def sampled(self):
+        """
+        Whether the measurement is being taken.
+
+        :return bool:
+        """
+        return self.record is not None
+
+    def set(self, **kwargs):
+        """
+        Sets the values given on the record (if the measurement is being
+        taken).
+        """
+        if self.record is not None:
+            self.record.update(kwargs)
+
+# Shortcut
+measure = Measurement
+
+def get_sampling():
+    """
+    Gets the sampling decision of the measurement in progress in the current
+    thread, to be passed to the threads doing a part of its work (see
+    ``Sampling``).
+
+    :return bool: None if no measurement is in progress.
+    """
+    if getattr(_state, 'depth', 0):
+        return _state.sampled
+    return None
+
+
+class Sampling(object):
+    """
+    Context manager having the measurements of the current thread taken (or
+    skipped) as decided by the measurement of another thread (see
+    ``get_sampling``), as if they were nested in it. Does nothing if the
+    decision given is None.
+
+    :example:
+    >>> def get_urls(sitemap, page, sampled):
+    >>>     with Sampling(sampled):
+    >>>         return sitemap.get_urls(page)
+    >>>
+    >>> pool.map(partial(get_urls, page=1, sampled=get_sampling()), maps)
+    """
+    def __init__(self, sampled):
+        """
+        Constructor.
+
+        :param bool sampled:
+        """
+        self.sampled = sampled
+        self._previous = None
+
+    def __enter__(self):
+        if self.sampled is None:
+            return self
+        self._previous = (
+            getattr(_state, 'depth', 0), getattr(_state, 'sampled', False)
+            )
+        _state.depth = self._previous[0] + 1
+        _state.sampled = self.sampled
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._previous is not None:
+            _state.depth, _state.sampled = self._previous
+            self._previous = None
+
+
+class MemorySink(object):
+    """
+    Keeps the last ``maxlen`` records in memory. Handy in tests and in the
+    development (``MemorySink.records`` is shared by all the instances).
+
+    :example:
+    >>> QARTEZ_INSTRUMENTATION_SINKS = ['qartez.instrumentation.MemorySink']
+    >>> QARTEZ_INSTRUMENTATION_SAMPLE_RATE = 1.0
+    >>>
+    >>> from qartez.instrumentation import MemorySink
+    >>> MemorySink.records[-1]['wall_time']
+    """
+    records = deque(maxlen=1000)
+
+    def emit(self, record):
+        """
+        :param dict record:
+        """
+        self.records.append(record)
+
+    @classmethod
+    def clear(cls):
+        """
+        Removes all the records kept.
+        """
+        cls.records.clear()
+
+
+class StatsdSink(object):
+    """
+    Sends the records as statsd metrics (line protocol over UDP) to the
+    ``INSTRUMENTATION_STATSD_HOST``:``INSTRUMENTATION_STATSD_PORT``. Metrics
+    are named "{prefix}.{section or sitemap}.{stage}.{metric}": times are
+    sent as timers (in milliseconds), the number of queries, items and bytes
+    as gauges and the cache hits and misses as counters.
+    """
+    def __init__(self, host=None, port=None, prefix=None):
+        """
+        Constructor.
+
+        :param str host: Defaults to the ``INSTRUMENTATION_STATSD_HOST``.
+        :param int port: Defaults to the ``INSTRUMENTATION_STATSD_PORT``.
+        :param str prefix: Defaults to the
+            ``INSTRUMENTATION_STATSD_PREFIX``.
+        """
+        self.address = (
+            host or INSTRUMENTATION_STATSD_HOST,
+            int(port or INSTRUMENTATION_STATSD_PORT)
+            )
+        self.prefix = INSTRUMENTATION_STATSD_PREFIX if prefix is None \
+                                                    else prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def format(self, record):
+        """
+        Formats the record given as statsd lines.
+
+        :param dict record:
+        :return list:
+        """
+        name = '.'.join(
+            METRIC_NAME_RE.sub('_', str(part)) for part in (
+                self.prefix, record['section'] or record['sitemap'],
+                record['stage']
+                ) \
+            if part
+            )
+        lines = []
+        for metric in ('wall_time', 'query_time'):
+            if record[metric] is not None:
+                lines.append('{0}.{1}:{2:.3f}|ms'.format(
+                    name, metric, record[metric] * 1000
+                    ))
+        for metric in ('queries', 'items', 'bytes'):
+            if record[metric] is not None:
+                lines.append('{0}.{1}:{2}|g'.format(name, metric, record[metric]))
+        if record['cache'] is not None:
+            lines.append('{0}.cache_{1}:1|c'.format(name, record['cache']))
+        return lines
+
+    def emit(self, record):
+        """
+        :param dict record:
+        """
+        self.socket.sendto(
+            '\n'.join(self.format(record)).encode('utf-8'), self.address
+            )
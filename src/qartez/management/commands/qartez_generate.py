@@ -0,0 +1,158 @@
+__title__ = 'qartez.management.commands.qartez_generate'
+__author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
+__all__ = ('Command',)
+
+from importlib import import_module
+from optparse import make_option
+
+import django
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from qartez.generator import SitemapGenerator
+
+OPTIONS = (
+    (('--location',), {
+        'dest': 'location',
+        'default': None,
+        'help': "Directory to write the files to. When not given, the "
+                "default storage is used."}),
+    (('--storage',), {
+        'dest': 'storage',
+        'default': None,
+        'help': "Dotted path to the storage (instance or class) to write "
+                "the files through."}),
+    (('--prefix',), {
+        'dest': 'prefix',
+        'default': 'sitemap',
+        'help': "Prefix of the file names. Defaults to \"sitemap\"."}),
+    (('--base-url',), {
+        'dest': 'base_url',
+        'default': None,
+        'help': "Base URL of the files, used in the index."}),
+    (('--protocol',), {
+        'dest': 'protocol',
+        'default': None,
+        'help': "Protocol of the URLs. Defaults to \"http\"."}),
+    (('--gzip',), {
+        'dest': 'gzip',
+        'action': 'store_true',
+        'default': False,
+        'help': "Write gzipped copies (.xml.gz) alongside."}),
+    (('--dirty',), {
+        'dest': 'dirty',
+        'action': 'store_true',
+        'default': False,
+        'help': "Only regenerate the pages changed since the last run."}),
+    (('--processes',), {
+        'dest': 'processes',
+        'default': 1,
+        'help': "Number of the worker processes to generate the pages on. "
+                "Defaults to 1 (no worker processes)."}),
+    (('--streaming',), {
+        'dest': 'streaming',
+        'action': 'store_true',
+        'default': False,
+        'help': "Generate every section in a single pass over its items, "
+                "with a constant memory."}),
+)
+
+def import_object(path):
+    """
+    Imports an object by its dotted path.
+
+    :param str path:
+    :return object:
+    """
+    try:
+        module_path, name = path.rsplit('.', 1)
+        return getattr(import_module(module_path), name)
+    except (ValueError, ImportError, AttributeError) as e:
+        raise CommandError("Can't import {0}: {1}".format(path, e))
+
+
+class Command(BaseCommand):
+    """
+    Pre-generates all pages of all sections of the sitemaps dicts given,
+    plus the sitemap index, to files.
+
+    :example:
+    $ ./manage.py qartez_generate foo.sitemap.foo_item_images_sitemap \
+          --location=/var/www/sitemaps --gzip
+
+    With ``--dirty`` only the pages changed since the last run (see
+    ``qartez.dirty``) are regenerated. With ``--processes`` the pages are
+    generated on that many worker processes. With ``--streaming`` every
+    section is generated in a single pass over its items, with a constant
+    memory (see ``qartez.generator.SitemapGenerator.generate_streaming``).
+    """
+    help = "Pre-generates sitemaps (all sections and pages, plus the index) " \
+           "to files."
+    args = '<dotted.path.to.sitemaps dotted.path.to.sitemaps ...>'
+
+    if django.VERSION < (1, 8):
+        option_list = BaseCommand.option_list + tuple(
+            make_option(*args, **kwargs) for args, kwargs in OPTIONS
+            )
+
+    def add_arguments(self, parser):
+        parser.add_argument('sitemaps', nargs='+')
+        for args, kwargs in OPTIONS:
+            parser.add_argument(*args, **kwargs)
+
+    def get_storage(self, options):
+        """
+        Gets the storage to write the files through.
+
+        :param dict options:
+        :return django.core.files.storage.Storage:
+        """
+        if options.get('location'):
+            return FileSystemStorage(location=options['location'])
+        if options.get('storage'):
+            storage = import_object(options['storage'])
+            return storage() if isinstance(storage, type) else storage
+        return default_storage
+
+    def handle(self, *args, **options):
+        paths = options.get('sitemaps') or args
+        if not paths:
+            raise CommandError("Give at least one sitemaps dict.")
+
+        sitemaps = {}
+        for path in paths:
+            sitemaps.update(import_object(path))
+
+        try:
+            processes = int(options.get('processes') or 1)
+        except ValueError:
+            raise CommandError(
+                "Invalid number of processes: {0}".format(options['processes'])
+                )
+
+        generator = SitemapGenerator(
+            sitemaps,
+            storage=self.get_storage(options),
+            prefix=options.get('prefix') or 'sitemap',
+            base_url=options.get('base_url'),
+            gzip=options.get('gzip', False),
+            protocol=options.get('protocol'),
+            processes=processes
+            )
+        if options.get('streaming', False):
+            if options.get('dirty', False) or processes > 1:
+                raise CommandError(
+                    "--streaming can't be combined with --dirty or "
+                    "--processes."
+                    )
+            entries = generator.generate_streaming()
+        elif options.get('dirty', False):
+            entries = generator.generate_dirty()
+        else:
+            entries = generator.generate()
+
+        if int(options.get('verbosity', 1)) > 0:
+            for entry in entries:
+                self.stdout.write(entry['name'])
+            if entries:
+                self.stdout.write(generator.get_filename())
@@ -0,0 +1,235 @@
+__title__ = 'qartez.mixins'
+__author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
+__all__ = ('PaginationMixin', 'LocationBuilderMixin', 'IterationMixin',)
+
+from itertools import chain
+
+from django.core.exceptions import ImproperlyConfigured
+
+from qartez.builders import LocationBuilder
+from qartez.counters import SectionCounter
+from qartez.paginator import KeysetPaginator, CachedCountPaginator
+from qartez.sizing import EntrySizeEstimator
+from qartez.utils import iter_batches, get_default_site
+
+class PaginationMixin(object):
+    """
+    Pagination options of the sitemap.
+
+    - When ``keyset_pagination`` is set to True, the
+      ``qartez.paginator.KeysetPaginator`` is used instead of the default
+      ``LIMIT/OFFSET`` based one. Items are then ordered by the
+      ``keyset_field`` column.
+    - When ``cached_count`` is set to True, the number of items is taken
+      from the cache (see ``qartez.counters.SectionCounter``), kept up to
+      date by the model signals and fully recounted every
+      ``count_cache_timeout`` seconds. Has no effect with keyset
+      pagination (which caches the count along with the page boundaries).
+    - When ``max_page_bytes`` is set, pages hold as many items (``limit``
+      at most) as fit into that many bytes, based on the estimated size of
+      an entry (see ``qartez.sizing.EntrySizeEstimator``; the first
+      ``page_size_sample`` items are serialized for the first estimate).
+      Implies keyset pagination.
+
+    Should be mixed in before the ``django.contrib.sitemaps.Sitemap``.
+
+    :example:
+    >>> class ArticleSitemap(RelAlternateHreflangSitemap):
+    >>>     keyset_pagination = True
+    >>>     keyset_field = 'pk'
+    >>>     max_page_bytes = 10 * 1024 * 1024
+    """
+    keyset_pagination = False
+    keyset_field = 'pk'
+    keyset_cache_timeout = None
+    cached_count = False
+    count_cache_timeout = None
+    max_page_bytes = None
+    page_size_sample = 100
+
+    def get_counter(self):
+        """
+        Gets the section counter (created and connected to the model signals
+        on first use, unless connected at start up with the
+        ``qartez.counters.track_counts``).
+
+        :return qartez.counters.SectionCounter:
+        """
+        try:
+            return self._counter
+        except AttributeError:
+            self._counter = SectionCounter(
+                self.items(), timeout=self.count_cache_timeout
+                )
+            self._counter.connect()
+            return self._counter
+
+    def get_size_estimator(self):
+        """
+        Gets the entry size estimator. Returns None unless the
+        ``max_page_bytes`` is set.
+
+        :return qartez.sizing.EntrySizeEstimator:
+        """
+        if not self.max_page_bytes:
+            return None
+        try:
+            return self._size_estimator
+        except AttributeError:
+            self._size_estimator = EntrySizeEstimator(
+                self, self.max_page_bytes, sample_size=self.page_size_sample
+                )
+            return self._size_estimator
+
+    def _get_paginator(self):
+        if self.keyset_pagination or self.max_page_bytes:
+            return KeysetPaginator(
+                self.items(), self.limit, key=self.keyset_field,
+                cache_timeout=self.keyset_cache_timeout,
+                size_estimator=self.get_size_estimator()
+                )
+        if self.cached_count:
+            return CachedCountPaginator(
+                self.items(), self.limit, self.get_counter()
+                )
+        return super(PaginationMixin, self).paginator
+    paginator = property(_get_paginator)
+
+
+class LocationBuilderMixin(object):
+    """
+    Builds the item locations with a precompiled
+    ``qartez.builders.LocationBuilder`` (reversed once, then filled in per
+    item), when ``location_url_name`` and ``location_url_kwargs`` (mapping
+    of item field names to the URL keyword argument names) are given.
+
+    Should be mixed in before the ``django.contrib.sitemaps.Sitemap``.
+
+    :example:
+    >>> class ArticleSitemap(RelAlternateHreflangSitemap):
+    >>>     location_url_name = 'foo.detail'
+    >>>     location_url_kwargs = {'slug': 'slug'}
+    """
+    location_url_name = None
+    location_url_kwargs = None
+    location_urlconf = None
+
+    def _get_location_builder(self):
+        if not self.location_url_name:
+            return None
+        try:
+            return self._location_builder
+        except AttributeError:
+            self._location_builder = LocationBuilder(
+                self.location_url_name, self.location_url_kwargs or {},
+                urlconf=self.location_urlconf
+                )
+            return self._location_builder
+    location_builder = property(_get_location_builder)
+
+    def location(self, item):
+        """
+        Gets the item location.
+        """
+        location_builder = self.location_builder
+        if location_builder is not None:
+            return location_builder(item)
+        return super(LocationBuilderMixin, self).location(item)
+
+
+class IterationMixin(object):
+    """
+    Iteration over all the URL entries of the sitemap in a single pass
+    (``iter_all_urls``), for the full dumps of the large tables. Items are
+    fetched ``iteration_chunk_size`` at a time (see
+    ``qartez.utils.iter_batches``) and the URL entries are yielded lazily,
+    so the memory used does not grow with the number of items. Paging (if
+    any) is up to the consumer (see
+    ``qartez.generator.SitemapGenerator.generate_streaming``).
+
+    The sitemap shall have the ``_iter_urls`` (URL entries of a list of
+    items).
+
+    Should be mixed in before the ``django.contrib.sitemaps.Sitemap``.
+
+    :example:
+    >>> for url in sitemap.iter_all_urls(chunk_size=5000):
+    >>>     write(url)
+    """
+    iteration_chunk_size = 2000
+
+    def get_domain_and_protocol(self, site=None, protocol=None):
+        """
+        Determines the domain and the protocol of the URLs.
+
+        :param django.contrib.sites.models.Site site: Defaults to the
+            current site.
+        :param str protocol:
+        :return tuple: (domain, protocol)
+        """
+        # Determine protocol
+        if self.protocol is not None:
+            protocol = self.protocol
+        if protocol is None:
+            protocol = 'http'
+
+        # Determine domain
+        if site is None:
+            site = get_default_site()
+            if site is None:
+                raise ImproperlyConfigured(
+                    "To use sitemaps, either enable the sites framework or "
+                    "pass a Site/RequestSite object in your view."
+                    )
+        return (site.domain, protocol)
+
+    def iter_page_items(self, page, chunk_size=None):
+        """
+        Yields the items of the page given one by one. Items are fetched
+        ``chunk_size`` at a time, with a query per chunk (see
+        ``qartez.utils.iter_batches``), so the page is not held in memory as
+        a whole and no database cursor is kept open between the chunks (the
+        streamed pages may be produced by different threads, see
+        ``qartez.async_views``). The page number is validated immediately.
+
+        :param int page:
+        :param int chunk_size: Defaults to the ``iteration_chunk_size``.
+        :return iterator:
+        """
+        object_list = self.paginator.page(page).object_list
+        return chain.from_iterable(iter_batches(
+            object_list, chunk_size or self.iteration_chunk_size,
+            separate_queries=True
+            ))
+
+    def iter_all_items(self, chunk_size=None):
+        """
+        Yields all the items in lists of ``chunk_size`` (at most), in the
+        order of the pages.
+
+        :param int chunk_size: Defaults to the ``iteration_chunk_size``.
+        :return generator:
+        """
+        items = self.items()
+        if getattr(self, 'keyset_pagination', False) \
+           or getattr(self, 'max_page_bytes', None):
+            items = items.order_by(self.keyset_field)
+        return iter_batches(items, chunk_size or self.iteration_chunk_size)
+
+    def iter_all_urls(self, site=None, protocol=None, chunk_size=None):
+        """
+        Returns a generator yielding the URL entries of all the items, with
+        a constant memory. The site is validated immediately.
+
+        :param django.contrib.sites.models.Site site:
+        :param str protocol:
+        :param int chunk_size: Defaults to the ``iteration_chunk_size``.
+        :return generator:
+        """
+        domain, protocol = self.get_domain_and_protocol(site, protocol)
+        return self._iter_all_urls(domain, protocol, chunk_size)
+
+    def _iter_all_urls(self, domain, protocol, chunk_size):
+        for items in self.iter_all_items(chunk_size):
+            for url in self._iter_urls(items, domain, protocol):
+                yield url
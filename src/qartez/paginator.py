@@ -0,0 +1,228 @@
+__title__ = 'qartez.paginator'
+__author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
+__all__ = ('KeysetPaginator', 'CachedCountPaginator',)
+
+from hashlib import md5
+
+from django.core.cache import cache
+from django.core.paginator import Paginator, Page
+from django.utils.encoding import force_bytes
+
+from qartez.settings import KEYSET_BOUNDARIES_CACHE_TIMEOUT
+
+class KeysetPaginator(Paginator):
+    """
+    Keyset (seek) paginator for querysets. Instead of ``LIMIT/OFFSET``,
+    pages are resolved by the value of an (indexed) ordering column, which
+    makes the last page as cheap as the first one.
+
+    Page boundaries (the last key of every page but the last one) are
+    determined in a single pass over the key column only and cached in the
+    Django cache for ``cache_timeout`` seconds. A page then becomes a range
+    query on the key column (``WHERE key > lower AND key <= upper``). The
+    last page is limited to ``per_page`` items as well (``LIMIT``).
+
+    Note, that the queryset is always ordered by the key column. The key
+    column shall be unique and not nullable (primary key is a perfect
+    choice).
+
+    When the ``size_estimator`` is given (see
+    ``qartez.sizing.EntrySizeEstimator``), the number of items per page is
+    lowered (if needed) to keep the pages under its ``max_bytes``. Page
+    boundaries are cached, so the sitemap index and the pages agree on them
+    until they expire (and are computed with the current estimate again).
+    The number of items per page the boundaries were computed with is
+    cached along with them and limits the last page, so that it stays in
+    line with the other pages while the estimate changes.
+
+    :example:
+    >>> paginator = KeysetPaginator(FooItem._default_manager.all(), 50000)
+    >>> paginator.page(40).object_list
+    """
+    def __init__(self, object_list, per_page, key='pk', cache_timeout=None, \
+                 orphans=0, allow_empty_first_page=True, size_estimator=None):
+        """
+        Constructor.
+
+        :param django.db.models.query.QuerySet object_list:
+        :param int per_page: Max number of items per page.
+        :param str key: Name of the ordering column.
+        :param int cache_timeout: Boundaries cache timeout (in seconds).
+        :param int orphans: Ignored (kept for API compatibility).
+        :param bool allow_empty_first_page:
+        :param qartez.sizing.EntrySizeEstimator size_estimator:
+        """
+        self.key = key
+        self.size_estimator = size_estimator
+        if cache_timeout is None:
+            cache_timeout = KEYSET_BOUNDARIES_CACHE_TIMEOUT
+        self.cache_timeout = cache_timeout
+        self._boundaries = None
+        super(KeysetPaginator, self).__init__(
+            object_list.order_by(key), per_page, orphans=0,
+            allow_empty_first_page=allow_empty_first_page
+            )
+
+    def get_cache_key(self):
+        """
+        Cache key for the page boundaries. Depends on the SQL of the
+        queryset, the key column, the number of items per page and the max
+        page size.
+
+        :return str:
+        """
+        try:
+            sql = str(self.object_list.query)
+        except Exception as e:
+            # Query is known to produce no results
+            return None
+        max_bytes = self.size_estimator.max_bytes \
+                    if self.size_estimator is not None else None
+        hash_ = md5(force_bytes('{0}:{1}:{2}:{3}'.format(
+            sql, self.key, self.per_page, max_bytes
+            )))
+        return 'qartez.keyset.{0}'.format(hash_.hexdigest())
+
+    def get_per_page(self):
+        """
+        Gets the number of items per page (lowered by the size estimator, if
+        any).
+
+        :return int:
+        """
+        per_page = int(self.per_page)
+        if self.size_estimator is not None:
+            per_page = self.size_estimator.get_per_page(per_page)
+        return per_page
+
+    def compute_boundaries(self):
+        """
+        Walks through the key column and collects the page boundaries.
+
+        :return tuple: (list of boundaries, total number of items, number
+            of items per page)
+        """
+        per_page = self.get_per_page()
+        keys = self.object_list.values_list(self.key, flat=True)
+        boundaries, count = [], 0
+        for count, value in enumerate(keys.iterator(), start=1):
+            if 0 == count % per_page:
+                boundaries.append(value)
+        # The last page is open ended
+        num_pages = (count + per_page - 1) // per_page
+        return (boundaries[:max(num_pages - 1, 0)], count, per_page)
+
+    def get_boundaries(self):
+        """
+        Gets the page boundaries, from cache if possible.
+
+        :return tuple: (list of boundaries, total number of items, number
+            of items per page)
+        """
+        if self._boundaries is not None:
+            return self._boundaries
+
+        cache_key = self.get_cache_key()
+        boundaries = cache.get(cache_key) if cache_key else None
+        if boundaries is None:
+            boundaries = self.compute_boundaries()
+            if cache_key:
+                cache.set(cache_key, boundaries, self.cache_timeout)
+
+        self._boundaries = boundaries
+        return boundaries
+
+    def invalidate(self):
+        """
+        Drops the cached page boundaries.
+        """
+        self._boundaries = None
+        cache_key = self.get_cache_key()
+        if cache_key:
+            cache.delete(cache_key)
+
+    def _get_count(self):
+        """
+        Returns the total number of objects, across all pages.
+        """
+        return self.get_boundaries()[1]
+    count = property(_get_count)
+
+    def _get_num_pages(self):
+        """
+        Returns the total number of pages (as many as the boundaries tell).
+        """
+        boundaries, count, per_page = self.get_boundaries()
+        if 0 == count:
+            return 1 if self.allow_empty_first_page else 0
+        return len(boundaries) + 1
+    num_pages = property(_get_num_pages)
+
+    def get_page_range(self, number):
+        """
+        Returns the (lower, upper) keys of the page given. Lower boundary is
+        exclusive, upper is inclusive. None stands for no boundary.
+
+        :param int number:
+        :return tuple:
+        """
+        boundaries = self.get_boundaries()[0]
+        lower = boundaries[number - 2] if number > 1 else None
+        upper = boundaries[number - 1] if number <= len(boundaries) else None
+        return (lower, upper)
+
+    def page(self, number):
+        """
+        Returns a Page object for the given 1-based page number.
+        """
+        number = self.validate_number(number)
+        lower, upper = self.get_page_range(number)
+        object_list = self.object_list
+        if lower is not None:
+            object_list = object_list.filter(
+                **{'{0}__gt'.format(self.key): lower}
+                )
+        if upper is not None:
+            object_list = object_list.filter(
+                **{'{0}__lte'.format(self.key): upper}
+                )
+        else:
+            # The last page is open ended. Items added since the boundaries
+            # were computed go to the next page once they're computed again
+            # (see ``invalidate``), instead of overflowing this one. Limited
+            # to the number of items per page the boundaries were computed
+            # with (the estimate of the size estimator may have changed
+            # since).
+            object_list = object_list[:self.get_boundaries()[2]]
+        return Page(object_list, number, self)
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator taking the total number of objects from a counter (see
+    ``qartez.counters.SectionCounter``) instead of running ``COUNT(*)`` on
+    every request.
+    """
+    def __init__(self, object_list, per_page, counter, orphans=0, \
+                 allow_empty_first_page=True):
+        """
+        Constructor.
+
+        :param django.db.models.query.QuerySet object_list:
+        :param int per_page:
+        :param qartez.counters.SectionCounter counter:
+        :param int orphans:
+        :param bool allow_empty_first_page:
+        """
+        self.counter = counter
+        super(CachedCountPaginator, self).__init__(
+            object_list, per_page, orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page
+            )
+
+    def _get_count(self):
+        """
+        Returns the total number of objects, across all pages.
+        """
+        return self.counter.get()
+    count = property(_get_count)
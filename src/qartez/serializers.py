@@ -0,0 +1,171 @@
+__title__ = 'qartez.serializers'
+__author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
+__all__ = (
+    'escape', 'format_date', 'serialize_image_url',
+    'serialize_rel_alternate_hreflang_url', 'serialize_urlset',
+    'serialize_images_urlset', 'serialize_rel_alternate_hreflang_urlset',
+)
+
+import datetime
+import re
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+
+from six import text_type
+
+from qartez.constants import IMAGES_SITEMAP_HEADER, IMAGES_SITEMAP_FOOTER, \
+                             REL_ALTERNATE_HREFLANG_SITEMAP_HEADER, \
+                             REL_ALTERNATE_HREFLANG_SITEMAP_FOOTER
+from qartez.entries import Entry, ImagesUrlEntry, RelAlternateHreflangUrlEntry
+
+# Whitespace between the tags (same as the ``spaceless`` template tag strips)
+SPACES_BETWEEN_TAGS_RE = re.compile(r'>\s+<')
+
+def escape(value):
+    """
+    Escapes the value given for XML. Same output as the Django template
+    autoescaping.
+
+    :param value:
+    :return str:
+    """
+    if not isinstance(value, text_type):
+        value = text_type(value)
+    return value.replace('&', '&amp;').replace('<', '&lt;') \
+                .replace('>', '&gt;').replace('"', '&quot;') \
+                .replace("'", '&#39;')
+
+def format_date(value):
+    """
+    Formats the date given as "Y-m-d". Same as the ``date:"Y-m-d"``
+    template filter: aware datetimes are converted to the current time zone
+    (when ``USE_TZ`` is on).
+
+    :param datetime.date value:
+    :return str:
+    """
+    if isinstance(value, datetime.datetime):
+        if getattr(settings, 'USE_TZ', False) and timezone.is_aware(value):
+            value = timezone.localtime(value)
+    elif not isinstance(value, datetime.date):
+        return ''
+    # ``strftime`` does not support years before 1900 on Python 2
+    return '{0:04d}-{1:02d}-{2:02d}'.format(value.year, value.month, value.day)
+
+def _serialize_url_details(url, append):
+    """
+    Serializes the ``lastmod``, ``changefreq`` and ``priority`` of the URL
+    entry given.
+
+    :param qartez.entries.Entry url:
+    :param callable append:
+    """
+    lastmod = url.lastmod
+    if lastmod:
+        append('<lastmod>{0}</lastmod>'.format(format_date(lastmod)))
+    changefreq = url.changefreq
+    if changefreq:
+        append('<changefreq>{0}</changefreq>'.format(escape(changefreq)))
+    priority = url.priority
+    if priority:
+        append('<priority>{0}</priority>'.format(escape(priority)))
+
+def serialize_image_url(url):
+    """
+    Serializes the images sitemap URL entry given (all its ``images``).
+    Entries without images are skipped. Dicts (with the ``images``, or the
+    single ``image_location`` if there are no ``images`` in the dict) are
+    accepted as well.
+
+    :param qartez.entries.ImagesUrlEntry|dict url:
+    :return str:
+    """
+    if not isinstance(url, Entry):
+        url = ImagesUrlEntry.from_dict(url)
+    images = url.images
+    if not images:
+        return ''
+    parts = ['<url>']
+    append = parts.append
+    location = url.location
+    if location:
+        append('<loc>{0}</loc>'.format(escape(location)))
+    _serialize_url_details(url, append)
+    for image in images:
+        append('<image:image><image:loc>{0}</image:loc>'.format(
+            escape(image.location)
+            ))
+        caption = image.caption
+        if caption:
+            append('<image:caption>{0}</image:caption>'.format(
+                escape(caption)
+                ))
+        title = image.title
+        if title:
+            append('<image:title>{0}</image:title>'.format(escape(title)))
+        append('</image:image>')
+    append('</url>')
+    return ''.join(parts)
+
+def serialize_rel_alternate_hreflang_url(url):
+    """
+    Serializes the rel="alternate" hreflang="x" sitemap URL entry given
+    (dicts are accepted as well). The ``alternate_hreflangs`` are taken as
+    is (already rendered), only the whitespace between the tags is
+    stripped.
+
+    :param qartez.entries.RelAlternateHreflangUrlEntry|dict url:
+    :return str:
+    """
+    if not isinstance(url, Entry):
+        url = RelAlternateHreflangUrlEntry.from_dict(url)
+    parts = ['<url><loc>{0}</loc>'.format(escape(url.location or ''))]
+    append = parts.append
+    _serialize_url_details(url, append)
+    alternate_hreflangs = url.alternate_hreflangs
+    if alternate_hreflangs:
+        append(SPACES_BETWEEN_TAGS_RE.sub('><', alternate_hreflangs.strip()))
+    append('</url>')
+    return ''.join(parts)
+
+def serialize_urlset(urls, serialize_url, header, footer):
+    """
+    Serializes the URL entries given into the sitemap XML (UTF-8 encoded).
+
+    :param iterable urls:
+    :param callable serialize_url:
+    :param str header:
+    :param str footer:
+    :return bytes:
+    """
+    parts = [header]
+    parts.extend(serialize_url(url) for url in urls)
+    parts.append(footer)
+    return force_bytes(''.join(parts))
+
+def serialize_images_urlset(urls):
+    """
+    Serializes the images sitemap URL entries given.
+
+    :param iterable urls:
+    :return bytes:
+    """
+    return serialize_urlset(
+        urls, serialize_image_url, IMAGES_SITEMAP_HEADER,
+        IMAGES_SITEMAP_FOOTER
+        )
+
+def serialize_rel_alternate_hreflang_urlset(urls):
+    """
+    Serializes the rel="alternate" hreflang="x" sitemap URL entries given.
+
+    :param iterable urls:
+    :return bytes:
+    """
+    return serialize_urlset(
+        urls, serialize_rel_alternate_hreflang_url,
+        REL_ALTERNATE_HREFLANG_SITEMAP_HEADER,
+        REL_ALTERNATE_HREFLANG_SITEMAP_FOOTER
+        )
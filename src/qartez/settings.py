@@ -13,12 +13,69 @@ domain is prepended to the image location URL.
 
 ``CHANGEFREQ``: Valid changefreq values according to the specs
 http://www.sitemaps.org/protocol.html
+
+``KEYSET_BOUNDARIES_CACHE_TIMEOUT``: For how long (in seconds) the page
+boundaries of the keyset paginated sitemaps are cached.
+
+``SECTION_STATS_CACHE_TIMEOUT``: For how long (in seconds) the section stats
+(number of items and pages, lastmod) used by the sitemap index are cached.
+
+``COUNT_CACHE_TIMEOUT``: For how long (in seconds) the item counts of the
+sitemaps having the ``cached_count`` option on are cached.
+
+``DIRTY_PAGES_CACHE_TIMEOUT``: For how long (in seconds) the dirty page flags
+and the state of the last generation are kept.
+
+``PAGE_CACHE_TIMEOUT``: For how long (in seconds) the rendered sitemap pages
+are cached.
+
+``PAGE_CACHE_LRU_MAX_BYTES``: Max total size (in bytes) of the rendered sitemap
+pages kept in the in-process cache.
+
+``PAGE_CACHE_LRU_TIMEOUT``: For how long (in seconds) the rendered sitemap
+pages are kept in the in-process cache.
+
+``PAGE_CACHE_VERSION``: Version of the rendered sitemap pages.
+
+``HREFLANG_CLUSTER_CACHE_SIZE``: Max number of the rendered alternate hreflang
+blocks of the translation clusters kept in the in-process cache.
+
+``HREFLANG_CLUSTER_CACHE_TIMEOUT``: For how long (in seconds) the rendered
+alternate hreflang blocks of the translation clusters are kept in the
+in-process cache.
+
+``INSTRUMENTATION_SAMPLE_RATE``: Fraction of the sitemap renderings measured.
+
+``INSTRUMENTATION_SINKS``: Dotted paths of the sinks the measurements are sent
+to.
+
+``INSTRUMENTATION_STATSD_HOST``, ``INSTRUMENTATION_STATSD_PORT``: Address of
+the statsd server.
+
+``INSTRUMENTATION_STATSD_PREFIX``: Prefix of the statsd metric names.
+
+``PAGE_SIZE_ESTIMATE_CACHE_TIMEOUT``: For how long (in seconds) the estimated
+entry sizes of the sitemaps having the ``max_page_bytes`` set are kept.
+
+``ASYNC_VIEWS_MAX_WORKERS``: Max number of threads the async views build the
+sitemaps on.
+
+``CONCURRENT_SECTIONS_MAX_WORKERS``: Max number of threads the sections are
+built on in the ``concurrent`` mode of the images sitemap view.
 """
 __title__ = 'qartez.settings'
 __author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
 __all__ = (
     'PREPEND_LOC_URL_WITH_SITE_URL', 'PREPEND_IMAGE_LOC_URL_WITH_SITE_URL',
-    'CHANGEFREQ', 'DEBUG',
+    'CHANGEFREQ', 'KEYSET_BOUNDARIES_CACHE_TIMEOUT',
+    'SECTION_STATS_CACHE_TIMEOUT', 'COUNT_CACHE_TIMEOUT',
+    'DIRTY_PAGES_CACHE_TIMEOUT', 'PAGE_CACHE_TIMEOUT', 'PAGE_CACHE_LRU_MAX_BYTES',
+    'PAGE_CACHE_LRU_TIMEOUT', 'PAGE_CACHE_VERSION',
+    'HREFLANG_CLUSTER_CACHE_SIZE', 'HREFLANG_CLUSTER_CACHE_TIMEOUT',
+    'INSTRUMENTATION_SAMPLE_RATE', 'INSTRUMENTATION_SINKS',
+    'INSTRUMENTATION_STATSD_HOST', 'INSTRUMENTATION_STATSD_PORT',
+    'INSTRUMENTATION_STATSD_PREFIX', 'PAGE_SIZE_ESTIMATE_CACHE_TIMEOUT',
+    'ASYNC_VIEWS_MAX_WORKERS', 'CONCURRENT_SECTIONS_MAX_WORKERS', 'DEBUG',
 )
 
 from qartez.conf import get_setting
@@ -29,4 +86,29 @@ PREPEND_IMAGE_LOC_URL_WITH_SITE_URL = get_setting(
     )
 CHANGEFREQ = get_setting('CHANGEFREQ')
 
+KEYSET_BOUNDARIES_CACHE_TIMEOUT = get_setting(
+    'KEYSET_BOUNDARIES_CACHE_TIMEOUT'
+    )
+SECTION_STATS_CACHE_TIMEOUT = get_setting('SECTION_STATS_CACHE_TIMEOUT')
+COUNT_CACHE_TIMEOUT = get_setting('COUNT_CACHE_TIMEOUT')
+DIRTY_PAGES_CACHE_TIMEOUT = get_setting('DIRTY_PAGES_CACHE_TIMEOUT')
+PAGE_CACHE_TIMEOUT = get_setting('PAGE_CACHE_TIMEOUT')
+PAGE_CACHE_LRU_MAX_BYTES = get_setting('PAGE_CACHE_LRU_MAX_BYTES')
+PAGE_CACHE_LRU_TIMEOUT = get_setting('PAGE_CACHE_LRU_TIMEOUT')
+PAGE_CACHE_VERSION = get_setting('PAGE_CACHE_VERSION')
+HREFLANG_CLUSTER_CACHE_SIZE = get_setting('HREFLANG_CLUSTER_CACHE_SIZE')
+HREFLANG_CLUSTER_CACHE_TIMEOUT = get_setting('HREFLANG_CLUSTER_CACHE_TIMEOUT')
+INSTRUMENTATION_SAMPLE_RATE = get_setting('INSTRUMENTATION_SAMPLE_RATE')
+INSTRUMENTATION_SINKS = get_setting('INSTRUMENTATION_SINKS')
+INSTRUMENTATION_STATSD_HOST = get_setting('INSTRUMENTATION_STATSD_HOST')
+INSTRUMENTATION_STATSD_PORT = get_setting('INSTRUMENTATION_STATSD_PORT')
+INSTRUMENTATION_STATSD_PREFIX = get_setting('INSTRUMENTATION_STATSD_PREFIX')
+PAGE_SIZE_ESTIMATE_CACHE_TIMEOUT = get_setting(
+    'PAGE_SIZE_ESTIMATE_CACHE_TIMEOUT'
+    )
+ASYNC_VIEWS_MAX_WORKERS = get_setting('ASYNC_VIEWS_MAX_WORKERS')
+CONCURRENT_SECTIONS_MAX_WORKERS = get_setting(
+    'CONCURRENT_SECTIONS_MAX_WORKERS'
+    )
+
 DEBUG = get_setting('DEBUG')
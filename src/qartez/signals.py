@@ -0,0 +1,11 @@
+__title__ = 'qartez.signals'
+__author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
+__all__ = ('sitemap_measured',)
+
+from django.dispatch import Signal
+
+try:
+    # Sent with the ``record`` (dict) argument, see ``qartez.instrumentation``.
+    sitemap_measured = Signal(providing_args=['record'])
+except TypeError: # Django >= 4.0
+    sitemap_measured = Signal()
@@ -0,0 +1,155 @@
+__title__ = 'qartez.sizing'
+__author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
+__all__ = ('EntrySizeEstimator', 'record_page_size',)
+
+from hashlib import md5
+
+from django.core.cache import cache
+from django.utils.encoding import force_bytes
+
+from qartez.constants import MAX_SITEMAP_URLS
+from qartez.settings import PAGE_SIZE_ESTIMATE_CACHE_TIMEOUT
+from qartez.utils import get_default_site
+
+# Fraction of the byte budget the pages are sized for. Leaves room for the
+# entries larger than the average.
+SAFETY_MARGIN = 0.9
+
+# Weight of the newly observed page in the running average of the entry size
+RUNNING_AVERAGE_WEIGHT = 0.2
+
+class EntrySizeEstimator(object):
+    """
+    Estimates the (serialized) size of a single URL entry of the sitemap
+    given and the number of items fitting into a page of ``max_bytes``.
+
+    The first estimate is made by serializing a sample of the items (first
+    ``sample_size`` in the keyset order). It's then kept up to date with a
+    running average of the pages actually rendered (see
+    ``record_page_size``). Estimates are stored in the Django cache, so
+    that all the processes size the pages the same way.
+
+    The sitemap shall have the ``urlset_serializer`` and the ``_iter_urls``
+    (``qartez.ImagesSitemap`` and ``qartez.RelAlternateHreflangSitemap``
+    do).
+
+    :example:
+    >>> estimator = EntrySizeEstimator(ArticleSitemap(), 10 * 1024 * 1024)
+    >>> estimator.get_per_page(50000)
+    """
+    def __init__(self, sitemap, max_bytes, sample_size=100, timeout=None):
+        """
+        Constructor.
+
+        :param django.contrib.sitemaps.Sitemap sitemap:
+        :param int max_bytes: Target (max) size of a page.
+        :param int sample_size: Number of items serialized for the first
+            estimate.
+        :param int timeout: For how long (in seconds) the estimate is kept.
+        """
+        self.sitemap = sitemap
+        self.max_bytes = max_bytes
+        self.sample_size = sample_size
+        if timeout is None:
+            timeout = PAGE_SIZE_ESTIMATE_CACHE_TIMEOUT
+        self.timeout = timeout
+        self.overhead = len(sitemap.urlset_serializer([]))
+        self.cache_key = self.get_cache_key()
+
+    def get_cache_key(self):
+        """
+        Cache key of the estimate. Depends on the sitemap class and the SQL
+        of its queryset.
+
+        :return str:
+        """
+        try:
+            sql = str(self.sitemap.items().query)
+        except Exception as e:
+            # Query is known to produce no results
+            sql = ''
+        hash_ = md5(force_bytes('{0}.{1}:{2}'.format(
+            self.sitemap.__class__.__module__,
+            self.sitemap.__class__.__name__, sql
+            )))
+        return 'qartez.sizing.{0}'.format(hash_.hexdigest())
+
+    def sample(self):
+        """
+        Serializes a sample of the items and returns the average size of an
+        entry. Returns None if there are no items.
+
+        :return float:
+        """
+        site = get_default_site()
+        domain = site.domain if site is not None else 'example.com'
+        protocol = self.sitemap.protocol or 'http'
+
+        items = self.sitemap.items().order_by(
+            getattr(self.sitemap, 'keyset_field', 'pk')
+            )[:self.sample_size]
+        urls = list(self.sitemap._iter_urls(items, domain, protocol))
+        if not urls:
+            return None
+        size = len(self.sitemap.urlset_serializer(urls)) - self.overhead
+        return float(size) / len(urls)
+
+    def get(self):
+        """
+        Gets the estimated size of an entry (sampled on the first call).
+        Returns None if it can't be estimated (no items).
+
+        :return float:
+        """
+        estimate = cache.get(self.cache_key)
+        if estimate is None:
+            estimate = self.sample()
+            if estimate is not None:
+                cache.set(self.cache_key, estimate, self.timeout)
+        return estimate
+
+    def update(self, num_entries, num_bytes):
+        """
+        Updates the running average of the entry size with the page given.
+
+        :param int num_entries: Number of URL entries of the page.
+        :param int num_bytes: Size of the serialized page.
+        """
+        if not num_entries:
+            return
+        observed = float(num_bytes - self.overhead) / num_entries
+        estimate = cache.get(self.cache_key)
+        if estimate is not None:
+            observed = estimate + RUNNING_AVERAGE_WEIGHT * (observed - estimate)
+        cache.set(self.cache_key, observed, self.timeout)
+
+    def get_per_page(self, per_page=MAX_SITEMAP_URLS):
+        """
+        Gets the number of items per page, so that the page stays under the
+        ``max_bytes`` (with the ``SAFETY_MARGIN``), ``per_page`` at most.
+
+        :param int per_page:
+        :return int:
+        """
+        estimate = self.get()
+        if not estimate:
+            return per_page
+        budget = self.max_bytes * SAFETY_MARGIN - self.overhead
+        return max(1, min(per_page, int(budget // estimate)))
+
+def record_page_size(sitemap, num_entries, num_bytes):
+    """
+    Feeds the size of a rendered page of the sitemap given to the running
+    average of its entry size (see ``EntrySizeEstimator``). Does nothing
+    unless the sitemap has the ``max_page_bytes`` set.
+
+    :param django.contrib.sitemaps.Sitemap sitemap:
+    :param int num_entries:
+    :param int num_bytes:
+    """
+    get_size_estimator = getattr(sitemap, 'get_size_estimator', None)
+    if get_size_estimator is None:
+        return
+    estimator = get_size_estimator()
+    if estimator is not None:
+        estimator.update(num_entries, num_bytes)
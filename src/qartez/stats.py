@@ -0,0 +1,227 @@
+__title__ = 'qartez.stats'
+__author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
+__all__ = (
+    'get_section_stats', 'compute_section_stats', 'get_page_validator',
+)
+
+from hashlib import md5
+
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, PageNotAnInteger
+from django.db.models import Count, Max, Q, F
+from django.db.models.query import QuerySet
+from django.utils.encoding import force_bytes
+
+try:
+    from django.db.models import Case, When
+except ImportError: # Django < 1.8
+    Case = When = None
+
+from qartez.paginator import KeysetPaginator
+from qartez.settings import SECTION_STATS_CACHE_TIMEOUT
+
+def _get_num_pages(count, per_page):
+    """
+    Number of pages, the way ``django.core.paginator.Paginator`` counts
+    them (no orphans, empty first page allowed).
+
+    :param int count:
+    :param int per_page:
+    :return int:
+    """
+    if 0 == count:
+        return 1
+    return (count + per_page - 1) // per_page
+
+def compute_section_stats(sitemap):
+    """
+    Computes the statistics of the sitemap section given: total number of
+    items, number of pages, ``lastmod`` of the section and of each page. A
+    single aggregate query (COUNT plus MAX of the ``date_field``) is made;
+    the items themselves are never fetched.
+
+    The per page ``lastmod`` values can only be told apart for the keyset
+    paginated sections (on Django >= 1.8), since the page ranges of those
+    are known upfront. For the rest, all pages get the ``lastmod`` of the
+    section.
+
+    :param django.contrib.sitemaps.Sitemap sitemap:
+    :return dict:
+    """
+    items = sitemap.items()
+    date_field = getattr(sitemap, 'date_field', None)
+
+    # Not a queryset (``StaticSitemap`` for instance). Nothing to aggregate.
+    if not isinstance(items, QuerySet):
+        paginator = sitemap.paginator
+        return {
+            'count': paginator.count,
+            'num_pages': paginator.num_pages,
+            'lastmod': None,
+            'pages': [None] * paginator.num_pages,
+            }
+
+    paginator = sitemap.paginator
+    if isinstance(paginator, KeysetPaginator):
+        count = paginator.count
+        num_pages = paginator.num_pages
+        if date_field and (Case is not None or 1 == num_pages):
+            aggregates = {}
+            for number in range(1, num_pages + 1):
+                lower, upper = paginator.get_page_range(number)
+                condition = Q()
+                if lower is not None:
+                    condition &= Q(**{'{0}__gt'.format(paginator.key): lower})
+                if upper is not None:
+                    condition &= Q(
+                        **{'{0}__lte'.format(paginator.key): upper}
+                        )
+                if condition:
+                    aggregate = Max(Case(When(condition, then=F(date_field))))
+                else:
+                    aggregate = Max(date_field)
+                aggregates['lastmod_{0}'.format(number)] = aggregate
+
+            result = items.order_by().aggregate(**aggregates)
+            pages = [
+                result['lastmod_{0}'.format(number)] \
+                for number in range(1, num_pages + 1)
+                ]
+            existing = [lastmod for lastmod in pages if lastmod is not None]
+            return {
+                'count': count,
+                'num_pages': num_pages,
+                'lastmod': max(existing) if existing else None,
+                'pages': pages,
+                }
+
+        lastmod = None
+        if date_field:
+            lastmod = items.order_by().aggregate(
+                lastmod=Max(date_field)
+                )['lastmod']
+
+    elif date_field:
+        result = items.order_by().aggregate(
+            count=Count('pk'), lastmod=Max(date_field)
+            )
+        count, lastmod = result['count'], result['lastmod']
+        num_pages = _get_num_pages(count, sitemap.limit)
+
+    else:
+        count, lastmod = items.order_by().count(), None
+        num_pages = _get_num_pages(count, sitemap.limit)
+
+    return {
+        'count': count,
+        'num_pages': num_pages,
+        'lastmod': lastmod,
+        'pages': [lastmod] * num_pages,
+        }
+
+def _get_cache_key(section, sitemap):
+    """
+    Cache key for the section stats.
+
+    :param str section:
+    :param django.contrib.sitemaps.Sitemap sitemap:
+    :return str:
+    """
+    items = sitemap.items()
+    if not isinstance(items, QuerySet):
+        return None
+    try:
+        sql = str(items.query)
+    except Exception as e:
+        # Query is known to produce no results
+        return None
+    hash_ = md5(force_bytes('{0}:{1}:{2}:{3}:{4}'.format(
+        sql, sitemap.limit, getattr(sitemap, 'date_field', None),
+        getattr(sitemap, 'keyset_pagination', False),
+        getattr(sitemap, 'max_page_bytes', None)
+        )))
+    return 'qartez.stats.{0}.{1}'.format(section, hash_.hexdigest())
+
+def get_section_stats(section, sitemap, timeout=None):
+    """
+    Gets the section stats (see ``compute_section_stats``), cached for
+    ``timeout`` seconds (``SECTION_STATS_CACHE_TIMEOUT`` by default).
+
+    :param str section:
+    :param django.contrib.sitemaps.Sitemap sitemap:
+    :param int timeout:
+    :return dict:
+    """
+    if timeout is None:
+        timeout = SECTION_STATS_CACHE_TIMEOUT
+
+    cache_key = _get_cache_key(section, sitemap)
+    if cache_key is None:
+        return compute_section_stats(sitemap)
+
+    stats = cache.get(cache_key)
+    if stats is None:
+        stats = compute_section_stats(sitemap)
+        cache.set(cache_key, stats, timeout)
+    return stats
+
+def validate_page_number(number, count, per_page):
+    """
+    Validates the page number the way ``django.core.paginator.Paginator``
+    does, for the total number of items given.
+
+    :param int|str number:
+    :param int count:
+    :param int per_page:
+    :return int:
+    """
+    try:
+        number = int(number)
+    except (TypeError, ValueError):
+        raise PageNotAnInteger('That page number is not an integer')
+    if number < 1:
+        raise EmptyPage('That page number is less than 1')
+    if number > _get_num_pages(count, per_page):
+        raise EmptyPage('That page contains no results')
+    return number
+
+def get_page_validator(sitemap, page):
+    """
+    Gets the validator (number of items and the max value of the
+    ``date_field``) of the sitemap page given, with a single aggregate
+    query. For the keyset paginated sitemaps, only the rows of the page are
+    aggregated (indexed range). For the rest, the whole section is (any
+    change may shift the items between the pages anyway).
+
+    The page number is validated (``EmptyPage`` and ``PageNotAnInteger``
+    are raised the same way as by the paginator).
+
+    Returns None when the validator can't be determined cheaply (the
+    sitemap has no ``date_field`` or its items are not a queryset).
+
+    :param django.contrib.sitemaps.Sitemap sitemap:
+    :param int|str page:
+    :return tuple: (count, lastmod)
+    """
+    items = sitemap.items()
+    date_field = getattr(sitemap, 'date_field', None)
+    if not date_field or not isinstance(items, QuerySet):
+        return None
+
+    paginator = sitemap.paginator
+    if isinstance(paginator, KeysetPaginator):
+        number = paginator.validate_number(page)
+        lower, upper = paginator.get_page_range(number)
+        items = items.order_by()
+        if lower is not None:
+            items = items.filter(**{'{0}__gt'.format(paginator.key): lower})
+        if upper is not None:
+            items = items.filter(**{'{0}__lte'.format(paginator.key): upper})
+        result = items.aggregate(count=Count('pk'), lastmod=Max(date_field))
+        return (result['count'], result['lastmod'])
+
+    result = items.order_by().aggregate(
+        count=Count('pk'), lastmod=Max(date_field)
+        )
+    validate_page_number(page, result['count'], sitemap.limit)
+    return (result['count'], result['lastmod'])
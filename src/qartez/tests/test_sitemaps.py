@@ -8,6 +8,7 @@ import os
 
 # Skipping from non-Django tests.
 if os.environ.get("DJANGO_SETTINGS_MODULE", None):
+    import django
     from django.test import Client
 
     from qartez.tests.base import print_info
@@ -92,6 +93,1166 @@ if os.environ.get("DJANGO_SETTINGS_MODULE", None):
             self.assertTrue('https://example.com/sitemap-foo-items-alternate-hreflang.xml' in response.content)
             self.assertTrue('http://example.com/sitemap-foo-items.xml' in response.content)
 
+        @print_info
+        def test_05_images_sitemap_streaming(self):
+            """
+            Test streaming images sitemap.
+            """
+            from foo.sitemap import foo_item_images_sitemap
+
+            c = Client()
+            response = c.get('/sitemap-foo-images-streaming.xml', {})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.streaming)
+            content = b''.join(response.streaming_content)
+            self.assertTrue(b'http://www.google.com/schemas/sitemap-image/1.1' in content)
+            self.assertTrue(b'<image:loc>' in content)
+            self.assertTrue(content.strip().endswith(b'</urlset>'))
+
+            response = c.get('/sitemap-foo-images-streaming.xml', {'p': 1000})
+            self.assertEqual(response.status_code, 404)
+
+            # Items streamed in chunks
+            sitemap = foo_item_images_sitemap['foo_item_images']
+            self.assertEqual(
+                sorted(item.pk for item in sitemap.iter_page_items(
+                    1, chunk_size=2
+                    )),
+                sorted(
+                    item.pk for item in sitemap.paginator.page(1).object_list
+                    )
+                )
+
+        @print_info
+        def test_06_keyset_pagination(self):
+            """
+            Test that the keyset paginated images sitemap produces the same
+            pages as the ``LIMIT/OFFSET`` paginated one.
+            """
+            from qartez import ImagesSitemap
+            from foo.models import FooItem
+
+            info_dict = {
+                'queryset': FooItem._default_manager.exclude(image=None) \
+                                                   .order_by('pk'),
+                'image_location_field': 'image_url',
+                'location_field': 'get_absolute_url',
+            }
+            offset_sitemap = ImagesSitemap(info_dict)
+            keyset_sitemap = ImagesSitemap(
+                dict(info_dict, keyset_pagination=True)
+                )
+            offset_sitemap.limit = keyset_sitemap.limit = 3
+
+            paginator = keyset_sitemap.paginator
+            self.assertEqual(paginator.count, offset_sitemap.paginator.count)
+            for page in range(1, paginator.num_pages + 1):
+                self.assertEqual(
+                    [url['location'] for url in keyset_sitemap.get_urls(page)],
+                    [url['location'] for url in offset_sitemap.get_urls(page)]
+                    )
+
+        @print_info
+        def test_07_images_sitemap_index(self):
+            """
+            Test images sitemap index.
+            """
+            c = Client()
+            response = c.get('/sitemap-images.xml', {})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(b'<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">' in response.content)
+            self.assertTrue(b'http://example.com/sitemap-images-foo_item_images.xml' in response.content)
+            self.assertTrue(b'<lastmod>' in response.content)
+
+        @print_info
+        def test_08_conditional_get(self):
+            """
+            Test conditional GET of the images sitemap.
+            """
+            c = Client()
+            url = '/sitemap-images-foo_item_images.xml'
+            response = c.get(url, {})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.has_header('ETag'))
+            self.assertTrue(response.has_header('Last-Modified'))
+
+            not_modified = c.get(url, {}, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(not_modified.status_code, 304)
+
+            not_modified = c.get(
+                url, {}, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                )
+            self.assertEqual(not_modified.status_code, 304)
+
+            modified = c.get(url, {}, HTTP_IF_NONE_MATCH='"outdated"')
+            self.assertEqual(modified.status_code, 200)
+
+        @print_info
+        def test_09_page_cache(self):
+            """
+            Test the cached images and alternate hreflang sitemaps.
+            """
+            c = Client()
+            response = c.get('/sitemap-foo-images.xml', {})
+            for i in range(2):
+                cached = c.get('/sitemap-foo-images-cached.xml', {})
+                self.assertEqual(cached.status_code, 200)
+                self.assertEqual(cached.content, response.content)
+
+            response = c.get('/sitemap-foo-items-alternate-hreflang.xml', {})
+            for i in range(2):
+                cached = c.get('/sitemap-cached-foo-items-alternate-hreflang.xml', {})
+                self.assertEqual(cached.status_code, 200)
+                self.assertEqual(cached.content, response.content)
+
+        @print_info
+        def test_10_instrumentation(self):
+            """
+            Test the measurements of the images sitemap.
+            """
+            from qartez import instrumentation
+            from qartez.signals import sitemap_measured
+
+            records = []
+            def receiver(sender, record, **kwargs):
+                records.append(record)
+
+            sample_rate = instrumentation.INSTRUMENTATION_SAMPLE_RATE
+            instrumentation.INSTRUMENTATION_SAMPLE_RATE = 1.0
+            sitemap_measured.connect(receiver)
+            try:
+                c = Client()
+                response = c.get('/sitemap-foo-images.xml', {})
+            finally:
+                sitemap_measured.disconnect(receiver)
+                instrumentation.INSTRUMENTATION_SAMPLE_RATE = sample_rate
+
+            self.assertEqual(
+                [record['stage'] for record in records],
+                ['get_urls', 'render']
+                )
+            self.assertEqual(records[1]['bytes'], len(response.content))
+            self.assertEqual(records[0]['items'], records[1]['items'])
+            self.assertTrue(records[1]['wall_time'] >= 0)
+
+        @print_info
+        def test_11_static_sitemap_resolved_before_urlconf(self):
+            """
+            Test that the static sitemap entries used before the URLconf is
+            loaded are resolved once it is.
+            """
+            import warnings
+
+            try:
+                from django.urls import clear_url_caches, get_urlconf, \
+                                        set_urlconf
+            except ImportError: # Django < 1.10
+                from django.core.urlresolvers import clear_url_caches, \
+                                                  get_urlconf, set_urlconf
+            from django.test.utils import override_settings
+
+            from qartez import StaticSitemap
+
+            sitemap = StaticSitemap()
+            sitemap.add_named_pattern('foo.contact')
+
+            # Resolved against the ``ROOT_URLCONF`` both times
+            urlconf = get_urlconf()
+            set_urlconf(None)
+            try:
+                # This module has no ``urlpatterns``, same as a URLconf,
+                # which is still being imported.
+                with override_settings(ROOT_URLCONF=__name__):
+                    clear_url_caches()
+                    with warnings.catch_warnings():
+                        warnings.simplefilter('ignore')
+                        self.assertEqual(len(sitemap.items()), 0)
+                        self.assertEqual(len(sitemap.get_errors()), 1)
+                clear_url_caches()
+
+                self.assertEqual(
+                    [entry.location for entry in sitemap.items()],
+                    ['/foo/contact/']
+                    )
+                self.assertEqual(len(sitemap.get_errors()), 0)
+
+                # Resolved once the URLconf is loaded, errors included
+                sitemap.add_named_pattern('foo.nonexistent')
+                with warnings.catch_warnings(record=True) as caught:
+                    warnings.simplefilter('always')
+                    for i in range(3):
+                        self.assertEqual(len(sitemap.items()), 1)
+                        self.assertEqual(len(sitemap.get_errors()), 1)
+                self.assertEqual(len(caught), 1)
+            finally:
+                set_urlconf(urlconf)
+
+        @unittest.skipIf(django.VERSION < (3, 1),
+                         "Async views are supported by Django 3.1+")
+        @print_info
+        def test_12_async_views(self):
+            """
+            Test that the async views respond the same as the synchronous
+            ones, streaming responses included.
+            """
+            import asyncio
+
+            from django.test.client import RequestFactory
+
+            from qartez import async_views, views
+
+            from foo.sitemap import foo_item_images_sitemap
+
+            factory = RequestFactory()
+            loop = asyncio.new_event_loop()
+            try:
+                for streaming in (False, True):
+                    kwargs = {
+                        'sitemaps': foo_item_images_sitemap,
+                        'streaming': streaming,
+                    }
+                    expected = views.render_images_sitemap(
+                        factory.get('/sitemap-foo-images.xml'), **kwargs
+                        )
+                    response = loop.run_until_complete(
+                        async_views.render_images_sitemap(
+                            factory.get('/sitemap-foo-images.xml'), **kwargs
+                            )
+                        )
+                    self.assertEqual(response.status_code, 200)
+                    if not streaming:
+                        self.assertEqual(response.content, expected.content)
+                        continue
+
+                    self.assertTrue(response.is_async)
+                    content, chunks = [], response.streaming_content
+                    while True:
+                        try:
+                            content.append(
+                                loop.run_until_complete(chunks.__anext__())
+                                )
+                        except StopAsyncIteration:
+                            break
+                    self.assertEqual(
+                        b''.join(content),
+                        b''.join(expected.streaming_content)
+                        )
+            finally:
+                loop.close()
+
+        @print_info
+        def test_13_file_static_sitemap_lastmods(self):
+            """
+            Test that the mixed (date, naive and aware datetime, missing)
+            ``lastmod`` values of the file static sitemap rows are turned
+            into comparable datetimes.
+            """
+            import datetime
+            import shutil
+            import tempfile
+
+            from django.conf import settings
+            from django.core.files.storage import FileSystemStorage
+            from django.utils import timezone
+
+            from qartez import FileStaticSitemap
+            from qartez.generator import SitemapGenerator
+
+            files_dir = os.path.join(os.path.dirname(__file__), 'files')
+            for name in ('landing-pages.csv', 'landing-pages.jsonl'):
+                sitemap = FileStaticSitemap(os.path.join(files_dir, name))
+                urls = sitemap.get_urls(1)
+                self.assertEqual(len(urls), 4)
+                for url in urls:
+                    self.assertTrue(
+                        isinstance(url['lastmod'], datetime.datetime)
+                        )
+                    self.assertEqual(
+                        timezone.is_aware(url['lastmod']), settings.USE_TZ
+                        )
+                self.assertEqual(
+                    urls[0]['lastmod'].replace(tzinfo=None),
+                    datetime.datetime(2014, 1, 2)
+                    )
+                self.assertTrue(urls[1]['lastmod'] < urls[2]['lastmod'])
+
+                directory = tempfile.mkdtemp()
+                try:
+                    generator = SitemapGenerator(
+                        {'landing': sitemap},
+                        storage=FileSystemStorage(location=directory)
+                        )
+                    entry = generator.generate_page('landing', 1)
+                finally:
+                    shutil.rmtree(directory)
+                self.assertEqual(entry['lastmod'], urls[3]['lastmod'])
+
+                with self.assertRaises(TypeError):
+                    sitemap.add_url('/foo/')
+
+        @print_info
+        def test_14_keyset_last_page_bounded(self):
+            """
+            Test that the (open ended) last page of the keyset paginator
+            doesn't outgrow the ``per_page`` when the items were added after
+            the page boundaries had been computed.
+            """
+            from qartez.paginator import KeysetPaginator
+
+            from foo.models import FooItem
+
+            queryset = FooItem._default_manager.all()
+            self.assertTrue(queryset.count() > 2)
+
+            paginator = KeysetPaginator(queryset, 2)
+            # Boundaries computed when there were no more than 2 items
+            paginator._boundaries = ([], 2, 2)
+            self.assertEqual(paginator.num_pages, 1)
+            self.assertEqual(len(paginator.page(1).object_list), 2)
+
+            paginator.invalidate()
+            self.assertEqual(
+                sum(len(paginator.page(number).object_list) \
+                    for number in paginator.page_range),
+                queryset.count()
+                )
+
+        @print_info
+        def test_15_cached_count_tracked_before_render(self):
+            """
+            Test that the objects saved before the first render of a section
+            (having the count cached already) are counted.
+            """
+            from qartez import ImagesSitemap
+            from qartez.counters import SectionCounter, track_counts
+
+            from foo.models import FooItem
+
+            queryset = FooItem._default_manager.filter(
+                slug__startswith='qartez-count-'
+                )
+            sitemap = ImagesSitemap({
+                'queryset': queryset,
+                'image_location_field': 'image_url',
+                'location_field': 'get_absolute_url',
+                'cached_count': True,
+            })
+            # Count cached by another process
+            SectionCounter(queryset).recount()
+
+            track_counts({'count': sitemap})
+            item = FooItem._default_manager.create(
+                title='Count', slug='qartez-count-1', body='Count'
+                )
+            try:
+                self.assertEqual(sitemap.paginator.count, 1)
+            finally:
+                item.delete()
+            self.assertEqual(sitemap.paginator.count, 0)
+
+        @print_info
+        def test_16_serializers(self):
+            """
+            Test that the images sitemap written by the serializers is the
+            same (XML) as the one rendered with the templates, streaming
+            included.
+            """
+            from xml.etree import ElementTree
+
+            from django.test.client import RequestFactory
+
+            from qartez.views import render_images_sitemap
+
+            from foo.sitemap import foo_item_images_sitemap
+
+            def parse(content):
+                return [
+                    (element.tag, (element.text or '').strip(),
+                     sorted(element.attrib.items())) \
+                    for element in ElementTree.fromstring(content).iter()
+                    ]
+
+            factory = RequestFactory()
+            for streaming in (False, True):
+                responses = [
+                    render_images_sitemap(
+                        factory.get('/sitemap-foo-images.xml'),
+                        foo_item_images_sitemap, streaming=streaming,
+                        **kwargs
+                        ) \
+                    for kwargs in ({}, {'template_name': None,
+                                       'url_template_name': None})
+                    ]
+                contents = [
+                    b''.join(response.streaming_content) if streaming \
+                        else response.content \
+                    for response in responses
+                    ]
+                self.assertTrue(b'<image:loc>' in contents[1])
+                self.assertEqual(parse(contents[0]), parse(contents[1]))
+
+        @print_info
+        def test_17_generator_modes(self):
+            """
+            Test that the sitemaps generated on the worker processes and in
+            the streaming mode are the same as the ones generated serially.
+            """
+            import shutil
+            import tempfile
+
+            from django.core.files.storage import FileSystemStorage
+
+            from foo.sitemap import foo_item_images_sitemap
+
+            from qartez.generator import SitemapGenerator
+
+            def generate(method='generate', **kwargs):
+                directory = tempfile.mkdtemp()
+                try:
+                    generator = SitemapGenerator(
+                        foo_item_images_sitemap,
+                        storage=FileSystemStorage(location=directory),
+                        **kwargs
+                        )
+                    getattr(generator, method)()
+                    files = {}
+                    for name in os.listdir(directory):
+                        with open(os.path.join(directory, name), 'rb') as f:
+                            files[name] = f.read()
+                    return files
+                finally:
+                    shutil.rmtree(directory)
+
+            sitemap = foo_item_images_sitemap['foo_item_images']
+            limit, sitemap.limit = sitemap.limit, 2
+            try:
+                serial = generate()
+                self.assertTrue(len(serial) > 2)
+                self.assertEqual(generate(processes=2), serial)
+                self.assertEqual(generate('generate_streaming'), serial)
+            finally:
+                sitemap.limit = limit
+
+        @print_info
+        def test_18_dirty_pages_cache_warning(self):
+            """
+            Test that connecting the dirty page trackers warns about the
+            cache not shared by the processes.
+            """
+            import warnings
+
+            from qartez import dirty
+            from qartez.dirty import DirtyPageTracker, is_cache_shared
+
+            from foo.sitemap import foo_item_images_sitemap
+
+            tracker = DirtyPageTracker(
+                foo_item_images_sitemap['foo_item_images']
+                )
+            # Python 2 never repeats a warning (whatever the filters), once
+            # it's in the registry of the module.
+            getattr(dirty, '__warningregistry__', {}).clear()
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                tracker.connect()
+            self.assertEqual(
+                [warning.category for warning in caught],
+                [] if is_cache_shared() else [RuntimeWarning]
+                )
+
+        @print_info
+        def test_19_alternate_hreflang_hooks(self):
+            """
+            Test the page level hooks of the alternate hreflang sitemap: the
+            clusters hook returning None, and the page not materialized
+            when no hook needs it.
+            """
+            from foo.models import FooItem
+            from foo.sitemap import FooItemAlternateHreflangSitemap
+
+            class ClusterSitemap(FooItemAlternateHreflangSitemap):
+                hreflang_cluster_field = 'slug'
+                hreflang_cluster_namespace = 'qartez.tests.none'
+
+                def alternate_hreflangs_for_clusters(self, cluster_keys):
+                    return None
+
+            urls = ClusterSitemap().get_urls(1)
+            self.assertTrue(urls)
+            self.assertEqual(
+                set(url['alternate_hreflangs'] for url in urls), set([''])
+                )
+
+            sitemap = FooItemAlternateHreflangSitemap()
+            fetched = []
+            def items():
+                for item in sitemap.items():
+                    fetched.append(item)
+                    yield item
+            urls = sitemap._iter_urls(items(), 'example.com', 'https')
+            next(urls)
+            self.assertEqual(len(fetched), 1)
+
+        @print_info
+        def test_20_concurrent_sections(self):
+            """
+            Test that the sections built concurrently are the same as the
+            ones built serially, and measured the same way.
+            """
+            import random
+            import threading
+
+            from django.db import connections
+            from django.test.client import RequestFactory
+
+            from qartez import ImagesSitemap, instrumentation
+            from qartez.signals import sitemap_measured
+            from qartez.views import render_images_sitemap
+
+            from foo.sitemap import foo_item_images_info_dict
+
+            connection = connections['default']
+            name = connection.settings_dict['NAME'] or ''
+            share_connection = 'sqlite' == connection.vendor \
+                and (':memory:' == name or 'mode=memory' in name) \
+                and not getattr(
+                    connection.features, 'can_share_in_memory_db', False
+                    )
+            if share_connection:
+                # The in-memory test database is only seen by the connection
+                # of the main thread (unless the SQLite shared cache is
+                # supported, Django 1.8+ on Python 3.4+), share it with the
+                # pool threads.
+                connection.allow_thread_sharing = True
+
+                class Sitemap(ImagesSitemap):
+                    def get_urls(self, *args, **kwargs):
+                        connections['default'] = connection
+                        return super(Sitemap, self).get_urls(*args, **kwargs)
+            else:
+                Sitemap = ImagesSitemap
+
+            sitemaps = {
+                'images': Sitemap(foo_item_images_info_dict),
+                'more_images': Sitemap(
+                    foo_item_images_info_dict, priority=0.2
+                    ),
+            }
+
+            main_thread = threading.current_thread()
+            class Random(object):
+                """
+                Samples the measurements started in the main thread only.
+                """
+                def random(self):
+                    if threading.current_thread() is main_thread:
+                        return 0.0
+                    return 0.99
+
+            records = []
+            def receiver(sender, record, **kwargs):
+                records.append(record['stage'])
+
+            factory = RequestFactory()
+            sample_rate = instrumentation.INSTRUMENTATION_SAMPLE_RATE
+            instrumentation.INSTRUMENTATION_SAMPLE_RATE = 0.5
+            instrumentation.random = Random()
+            sitemap_measured.connect(receiver)
+            try:
+                responses, stages = [], []
+                for concurrent in (False, True):
+                    responses.append(render_images_sitemap(
+                        factory.get('/sitemap-images.xml'), sitemaps,
+                        concurrent=concurrent
+                        ))
+                    stages.append(sorted(records))
+                    del records[:]
+            finally:
+                sitemap_measured.disconnect(receiver)
+                instrumentation.INSTRUMENTATION_SAMPLE_RATE = sample_rate
+                instrumentation.random = random
+                if share_connection:
+                    connection.allow_thread_sharing = False
+
+            self.assertTrue(b'<priority>0.2</priority>' in responses[0].content)
+            self.assertEqual(responses[1].content, responses[0].content)
+            self.assertEqual(stages[1], stages[0])
+            self.assertEqual(stages[0], ['get_urls', 'get_urls', 'render'])
+
+        @print_info
+        def test_21_projection(self):
+            """
+            Test that the images sitemaps in the projection mode (both
+            ``values_list`` and ``only``) list the same URLs as without it.
+            """
+            from qartez import ImagesSitemap
+
+            from foo.models import FooItem
+
+            info_dict = {
+                'queryset': FooItem._default_manager.exclude(image=None) \
+                                                   .order_by('pk'),
+                'image_location_field': 'image',
+                'image_title_field': 'title',
+                'location_field': 'slug',
+                'date_field': 'date_published',
+            }
+            expected = ImagesSitemap(info_dict).get_urls(1)
+            self.assertTrue(expected)
+
+            sitemap = ImagesSitemap(dict(info_dict, projection=True))
+            self.assertEqual(sitemap.get_projection()[0], 'values_list')
+            self.assertEqual(sitemap.get_urls(1), expected)
+
+            info_dict.update(
+                image_location_field='image_url',
+                location_field='get_absolute_url'
+                )
+            expected = ImagesSitemap(info_dict).get_urls(1)
+            sitemap = ImagesSitemap(dict(
+                info_dict, projection=True,
+                projection_fields=['image', 'slug']
+                ))
+            self.assertEqual(sitemap.get_projection()[0], 'only')
+            self.assertEqual(sitemap.get_urls(1), expected)
+
+        @print_info
+        def test_22_location_builder(self):
+            """
+            Test that the locations built by the ``LocationBuilder`` are the
+            same as the ones of ``reverse``.
+            """
+            try:
+                from django.urls import reverse
+            except ImportError: # Django < 1.10
+                from django.core.urlresolvers import reverse
+
+            from qartez.builders import LocationBuilder
+
+            from foo.models import FooItem
+            from foo.sitemap import FooItemAlternateHreflangSitemap
+
+            builder = LocationBuilder('foo.detail', {'slug': 'slug'})
+            items = list(FooItem._default_manager.all()) + [
+                FooItem(slug=slug) \
+                for slug in ('lorem-ipsum', 'a.b,c', u'\xfcml\xe4ut')
+                ]
+            for item in items:
+                self.assertEqual(
+                    builder(item),
+                    reverse('foo.detail', kwargs={'slug': item.slug})
+                    )
+
+            sitemap = FooItemAlternateHreflangSitemap()
+            self.assertTrue(sitemap.location_builder is not None)
+            self.assertEqual(
+                [url['location'] for url in sitemap.get_urls(1)],
+                ['https://example.com{0}'.format(item.get_absolute_url()) \
+                 for item in sitemap.paginator.page(1).object_list]
+                )
+
+        @print_info
+        def test_23_generate_command(self):
+            """
+            Test the ``qartez_generate`` command: pages written the same as
+            served by the view, gzipped copies and the index.
+            """
+            import gzip
+            import shutil
+            import tempfile
+
+            from django.core.management import call_command
+            from django.test.client import RequestFactory
+
+            from qartez.views import render_images_sitemap
+
+            from foo.sitemap import foo_item_images_sitemap
+
+            directory = tempfile.mkdtemp()
+            try:
+                call_command(
+                    'qartez_generate', 'foo.sitemap.foo_item_images_sitemap',
+                    location=directory, gzip=True, verbosity=0
+                    )
+                self.assertEqual(
+                    sorted(os.listdir(directory)),
+                    ['sitemap-foo_item_images-1.xml',
+                     'sitemap-foo_item_images-1.xml.gz', 'sitemap.xml',
+                     'sitemap.xml.gz']
+                    )
+                path = os.path.join(directory, 'sitemap-foo_item_images-1.xml')
+                with open(path, 'rb') as f:
+                    content = f.read()
+                with gzip.open(path + '.gz', 'rb') as f:
+                    self.assertEqual(f.read(), content)
+                with open(os.path.join(directory, 'sitemap.xml'), 'rb') as f:
+                    self.assertTrue(
+                        b'sitemap-foo_item_images-1.xml' in f.read()
+                        )
+            finally:
+                shutil.rmtree(directory)
+
+            response = render_images_sitemap(
+                RequestFactory().get('/sitemap-foo-images.xml'),
+                foo_item_images_sitemap, template_name=None
+                )
+            self.assertEqual(content, response.content)
+
+        @print_info
+        def test_24_alternate_hreflangs_for_items(self):
+            """
+            Test that the alternates looked up for the whole page are
+            rendered the same as the ones looked up per item.
+            """
+            from foo.sitemap import FooItemAlternateHreflangSitemap
+
+            class BatchSitemap(FooItemAlternateHreflangSitemap):
+                def alternate_hreflangs(self, item):
+                    raise AssertionError("Looked up per item")
+
+                def alternate_hreflangs_for_items(self, items):
+                    return dict(
+                        (item.pk, [('en-us', item.alternative_url)]) \
+                        for item in items
+                        )
+
+            expected = FooItemAlternateHreflangSitemap().get_urls(1)
+            self.assertTrue(expected)
+            self.assertEqual(BatchSitemap().get_urls(1), expected)
+
+        @print_info
+        def test_25_multiple_images(self):
+            """
+            Test the images sitemap listing the related images of the items
+            (prefetched with a single query per page).
+            """
+            from django.contrib.auth.models import Group, User
+            from django.core.exceptions import ImproperlyConfigured
+            from django.db import connection
+            try:
+                from django.test.utils import CaptureQueriesContext
+            except ImportError: # Django < 1.6
+                CaptureQueriesContext = None
+
+            from qartez import ImagesSitemap
+
+            groups = [
+                Group._default_manager.create(name='qartez-{0}'.format(name)) \
+                for name in ('b', 'a', 'c')
+                ]
+            users = [
+                User._default_manager.create(username='qartez-{0}'.format(i)) \
+                for i in range(3)
+                ]
+            users[0].groups.add(*groups)
+            users[1].groups.add(groups[0])
+            try:
+                info_dict = {
+                    'queryset': User._default_manager.filter(
+                        username__startswith='qartez-'
+                        ).order_by('pk'),
+                    'location_field': 'username',
+                    'images_field': 'groups',
+                    'image_location_field': 'name',
+                    'image_title_field': 'name',
+                    'images_queryset': Group._default_manager.order_by('name'),
+                }
+                if django.VERSION < (1, 7):
+                    # No ``Prefetch``, images listed in no particular order
+                    with self.assertRaises(ImproperlyConfigured):
+                        ImagesSitemap(info_dict)
+                    del info_dict['images_queryset']
+                    ordered = sorted
+                else:
+                    ordered = list
+
+                sitemap = ImagesSitemap(info_dict)
+                if CaptureQueriesContext is not None:
+                    with CaptureQueriesContext(connection) as queries:
+                        urls = sitemap.get_urls(1)
+                    # Count, items and images
+                    self.assertEqual(len(queries), 3)
+                else:
+                    urls = sitemap.get_urls(1)
+                self.assertEqual(
+                    [ordered(image.title for image in url.images) \
+                     for url in urls],
+                    [['qartez-a', 'qartez-b', 'qartez-c'], ['qartez-b'], []]
+                    )
+                self.assertEqual(urls[1]['image_title'], 'qartez-b')
+
+                urls = ImagesSitemap(dict(info_dict, max_images=2)).get_urls(1)
+                self.assertEqual(
+                    [len(url.images) for url in urls], [2, 1, 0]
+                    )
+            finally:
+                for obj in users + groups:
+                    obj.delete()
+
+        @print_info
+        def test_26_page_byte_budget(self):
+            """
+            Test that the pages sized by a byte budget stay under it and
+            list all the items.
+            """
+            from qartez import ImagesSitemap
+            from qartez.serializers import serialize_images_urlset
+
+            from foo.models import FooItem
+
+            info_dict = {
+                'queryset': FooItem._default_manager.exclude(image=None) \
+                                                   .filter(pk__gte=0),
+                'image_location_field': 'image_url',
+                'location_field': 'get_absolute_url',
+            }
+            expected = [
+                url['location'] for url in ImagesSitemap(info_dict).get_urls(1)
+                ]
+            self.assertTrue(len(expected) > 3)
+            max_bytes = len(serialize_images_urlset(
+                ImagesSitemap(info_dict).get_urls(1)
+                )) // 2
+
+            sitemap = ImagesSitemap(dict(info_dict, max_page_bytes=max_bytes))
+            sitemap.paginator.invalidate()
+            num_pages = sitemap.paginator.num_pages
+            self.assertTrue(num_pages > 2)
+            locations = []
+            for page in range(1, num_pages + 1):
+                urls = sitemap.get_urls(page)
+                self.assertTrue(
+                    len(serialize_images_urlset(urls)) <= max_bytes
+                    )
+                locations.extend(url['location'] for url in urls)
+            self.assertEqual(sorted(locations), sorted(expected))
+
+        @print_info
+        def test_27_url_entries(self):
+            """
+            Test that the (``__slots__``) URL entries render the same as the
+            dicts they replace and keep the dict-style access.
+            """
+            import pickle
+
+            from django.template import loader
+
+            from foo.sitemap import foo_item_images_sitemap, \
+                                   FooItemAlternateHreflangSitemap
+
+            def as_dict(url):
+                value = url.as_dict()
+                if 'images' in value:
+                    value['images'] = [image.as_dict() for image in url.images]
+                return value
+
+            for template_name, urls in (
+                    ('qartez/images_sitemap.xml',
+                     foo_item_images_sitemap['foo_item_images'].get_urls(1)),
+                    ('qartez/rel_alternate_hreflang_sitemap.xml',
+                     FooItemAlternateHreflangSitemap().get_urls(1)),):
+                self.assertTrue(urls)
+                dicts = [as_dict(url) for url in urls]
+                self.assertEqual(
+                    loader.render_to_string(template_name, {'urlset': urls}),
+                    loader.render_to_string(template_name, {'urlset': dicts})
+                    )
+
+                url = urls[0]
+                self.assertFalse(hasattr(url, '__dict__'))
+                self.assertEqual(url['location'], url.location)
+                self.assertEqual(url.get('location'), url.location)
+                self.assertEqual(url.get('missing', 'default'), 'default')
+                self.assertRaises(KeyError, lambda: url['missing'])
+                self.assertTrue('lastmod' in url)
+                self.assertEqual(dict(url), url.as_dict())
+                self.assertEqual(pickle.loads(pickle.dumps(url)), url)
+
+        @print_info
+        def test_28_compiled_accessors(self):
+            """
+            Test that the compiled accessors of the images sitemap honor the
+            methods overridden in the subclasses and replaced on the
+            instances.
+            """
+            import datetime
+
+            from qartez import ImagesSitemap
+
+            from foo.models import FooItem
+
+            lastmod = datetime.datetime(2014, 1, 1)
+
+            class OverriddenSitemap(ImagesSitemap):
+                def location(self, item):
+                    return '/overridden/{0}/'.format(item.slug)
+
+                def lastmod(self, item):
+                    return lastmod
+
+                def image_title(self, item):
+                    return item.title.upper()
+
+            info_dict = {
+                'queryset': FooItem._default_manager.exclude(image=None) \
+                                                   .order_by('pk'),
+                'image_location_field': 'image_url',
+                'image_title_field': 'title',
+                'location_field': 'get_absolute_url',
+                'date_field': 'date_published',
+            }
+            items = list(info_dict['queryset'])
+            urls = OverriddenSitemap(info_dict).get_urls(1)
+            self.assertTrue(urls)
+            for item, url in zip(items, urls):
+                self.assertTrue(
+                    url.location.endswith('/overridden/{0}/'.format(item.slug))
+                    )
+                self.assertEqual(url.lastmod, lastmod)
+                self.assertEqual(url.image_title, item.title.upper())
+
+            sitemap = ImagesSitemap(info_dict)
+            sitemap.image_caption = lambda item: 'Caption'
+            for url in sitemap.get_urls(1):
+                self.assertEqual(url.image_caption, 'Caption')
+
+        @print_info
+        def test_29_page_byte_budget_estimate_changed(self):
+            """
+            Test that the pages sized by a byte budget list all the items
+            when the size estimate changes between the renders.
+            """
+            from django.core.cache import cache
+
+            from qartez import ImagesSitemap
+
+            from foo.models import FooItem
+
+            info_dict = {
+                'queryset': FooItem._default_manager.exclude(image=None) \
+                                                   .filter(pk__gte=1),
+                'image_location_field': 'image_url',
+                'location_field': 'get_absolute_url',
+            }
+            expected = [
+                url['location'] for url in ImagesSitemap(info_dict).get_urls(1)
+                ]
+            self.assertTrue(len(expected) > 3)
+
+            sitemap = ImagesSitemap(dict(info_dict, max_page_bytes=10000))
+            estimator = sitemap.paginator.size_estimator
+            # Room for half of the items per page
+            per_page = (len(expected) + 1) // 2
+            cache.set(
+                estimator.cache_key,
+                (10000 * 0.9 - estimator.overhead) / (per_page + 0.5)
+                )
+            sitemap.paginator.invalidate()
+            num_pages = sitemap.paginator.num_pages
+            self.assertEqual(num_pages, 2)
+
+            locations = []
+            for page in range(1, num_pages + 1):
+                # Entries estimated twice as large by the previous render
+                cache.set(
+                    estimator.cache_key, cache.get(estimator.cache_key) * 2
+                    )
+                sitemap = ImagesSitemap(dict(info_dict, max_page_bytes=10000))
+                self.assertEqual(sitemap.paginator.num_pages, num_pages)
+                locations.extend(
+                    url['location'] for url in sitemap.get_urls(page)
+                    )
+            self.assertEqual(sorted(locations), sorted(expected))
+
+        @print_info
+        def test_30_conditional_get_date_lastmods(self):
+            """
+            Test the ``Last-Modified`` of the sections, which ``date_field``
+            is a ``DateField`` (or has naive values).
+            """
+            import datetime
+
+            from django.utils import timezone
+
+            from qartez.views import _get_conditional_headers
+
+            aware = timezone.make_aware(
+                datetime.datetime(2014, 1, 1), timezone.get_current_timezone()
+                )
+            expected = _get_conditional_headers([], [aware])[1]
+            self.assertTrue(expected)
+            for lastmods in ([datetime.date(2014, 1, 1)],
+                             [datetime.datetime(2014, 1, 1)],
+                             [datetime.date(2013, 1, 1), None, aware]):
+                self.assertEqual(
+                    _get_conditional_headers([], lastmods)[1], expected
+                    )
+
+
+        @print_info
+        def test_31_compiled_accessors_constants(self):
+            """
+            Test that the compiled accessors of the images sitemap honor the
+            methods overridden with constants in the subclasses.
+            """
+            import datetime
+
+            from qartez import ImagesSitemap
+
+            from foo.models import FooItem
+
+            class ConstantSitemap(ImagesSitemap):
+                lastmod = datetime.datetime(2014, 1, 1)
+                image_title = 'Title'
+
+            urls = ConstantSitemap({
+                'queryset': FooItem._default_manager.exclude(image=None),
+                'image_location_field': 'image_url',
+                'image_title_field': 'title',
+                'location_field': 'get_absolute_url',
+                'date_field': 'date_published',
+            }).get_urls(1)
+            self.assertTrue(urls)
+            for url in urls:
+                self.assertEqual(url.lastmod, ConstantSitemap.lastmod)
+                self.assertEqual(url.image_title, 'Title')
+
+
+        @print_info
+        def test_32_images_templates_legacy_urls(self):
+            """
+            Test that the images templates render the URL dicts having the
+            single ``image_location`` (no ``images``).
+            """
+            from django.template import loader
+
+            url = {
+                'location': 'http://example.com/foo/',
+                'image_location': 'http://example.com/foo.jpg',
+                'image_title': 'Foo',
+            }
+            for template_name, context in (
+                    ('qartez/images_sitemap.xml', {'urlset': [url]}),
+                    ('qartez/images_sitemap_url.xml', {'url': url})):
+                content = loader.render_to_string(template_name, context)
+                self.assertTrue(
+                    '<image:loc>http://example.com/foo.jpg</image:loc>' \
+                    in content
+                    )
+                self.assertTrue('<image:title>Foo</image:title>' in content)
+
+
+        @print_info
+        def test_33_iter_batches(self):
+            """
+            Test that the batches of the querysets list all the items in the
+            queryset order (chunked by a unique ordering field on Django <
+            1.11 or with separate queries), ``values`` and ``values_list``
+            included.
+            """
+            from itertools import chain
+
+            from qartez.utils import iter_batches
+
+            from foo.models import FooItem
+
+            manager = FooItem._default_manager
+            self.assertTrue(manager.count() > 3)
+            for queryset in (manager.order_by('-pk'),
+                             manager.order_by('slug'),
+                             manager.order_by('title', 'pk'),
+                             manager.order_by('-slug').values('title', 'slug'),
+                             manager.order_by('pk').values_list('title', 'pk'),
+                             manager.order_by('-pk').values_list(
+                                 'pk', flat=True
+                                 ),
+                             manager.order_by('pk')[1:],
+                             manager.order_by('-pk')[1:4],
+                             manager.order_by('title', 'pk')[1:4]):
+                for separate_queries in (False, True):
+                    batches = list(iter_batches(
+                        queryset, 2, separate_queries=separate_queries
+                        ))
+                    self.assertTrue(all(len(batch) <= 2 for batch in batches))
+                    self.assertEqual(
+                        list(chain.from_iterable(batches)), list(queryset)
+                        )
+
+
+        @unittest.skipIf(django.VERSION < (1, 6),
+                         "transaction.atomic is available in Django 1.6+")
+        @print_info
+        def test_34_cached_count_transactions(self):
+            """
+            Test that the cached counts (of the filtered and unfiltered
+            querysets) are right after the committed and the rolled back
+            changes.
+            """
+            from django.db import transaction
+
+            from qartez.counters import SectionCounter
+
+            from foo.models import FooItem
+
+            manager = FooItem._default_manager
+            counters = [
+                SectionCounter(manager.all()),
+                SectionCounter(manager.filter(slug__startswith='qartez-tx-')),
+                ]
+            self.assertEqual(
+                [counter.filtered for counter in counters], [False, True]
+                )
+            for counter in counters:
+                counter.recount()
+                counter.connect()
+
+            def assert_counts():
+                for counter in counters:
+                    self.assertEqual(counter.get(), counter.queryset.count())
+
+            try:
+                with transaction.atomic():
+                    manager.create(title='Tx', slug='qartez-tx-1', body='Tx')
+                    raise ValueError
+            except ValueError:
+                pass
+            assert_counts()
+
+            item = manager.create(title='Tx', slug='qartez-tx-2', body='Tx')
+            try:
+                assert_counts()
+                with transaction.atomic():
+                    item.slug = 'moved'
+                    item.save()
+                assert_counts()
+            finally:
+                item.delete()
+            assert_counts()
+
+
+        @print_info
+        def test_35_page_cache_max_bytes(self):
+            """
+            Test that the in-process page cache is bounded by the total size
+            of the pages.
+            """
+            from qartez.cache import PageCache
+
+            page_cache = PageCache(lru_max_bytes=100)
+            for key, size in (('a', 40), ('b', 40), ('c', 30), ('d', 101)):
+                page_cache.lru.set(key, {'content': b'x' * size}, 60)
+            # Least recently used evicted, too large never kept
+            self.assertEqual(page_cache.lru.get('a'), None)
+            self.assertEqual(page_cache.lru.get('d'), None)
+            self.assertEqual(len(page_cache.lru.get('b')['content']), 40)
+            self.assertEqual(page_cache.lru.size, 70)
+
+            page_cache.lru.set('e', {'content': b'x' * 50}, 60)
+            self.assertEqual(page_cache.lru.get('c'), None)
+            self.assertEqual(page_cache.lru.size, 90)
+            page_cache.lru.delete('b')
+            self.assertEqual(page_cache.lru.size, 50)
+
 
 if __name__ == "__main__":
     # Tests
@@ -0,0 +1,299 @@
+__title__ = 'qartez.utils'
+__author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
+__all__ = (
+    'is_concrete_field', 'unique', 'iter_batches', 'get_default_site',
+    'as_datetime', 'is_urlconf_loaded',
+)
+
+import datetime
+import sys
+from itertools import islice
+
+from six import string_types
+
+import django
+from django.conf import settings
+from django.db.models.query import QuerySet
+from django.utils import timezone
+
+try:
+    from django.db.models.query import ModelIterable
+except ImportError: # Django < 1.9
+    from django.db.models.query import ValuesQuerySet
+    ModelIterable = None
+
+try:
+    from django.db.models import prefetch_related_objects
+except ImportError: # Django < 1.10
+    from django.db.models.query import prefetch_related_objects as \
+                                       _prefetch_related_objects
+
+    def prefetch_related_objects(model_instances, *related_lookups):
+        return _prefetch_related_objects(model_instances, related_lookups)
+
+def is_concrete_field(model, name):
+    """
+    Checks if the ``name`` given is a concrete (having a database column),
+    non-relational field of the ``model`` given. Values of such fields can
+    be fetched with ``values_list`` and are identical to the values of the
+    model instance attributes.
+
+    :param django.db.models.Model model:
+    :param str name:
+    :return bool:
+    """
+    try:
+        field = model._meta.get_field(name)
+    except Exception as e:
+        return False
+
+    if not getattr(field, 'column', None):
+        return False
+
+    # ``remote_field`` in Django >= 1.9, ``rel`` before
+    if getattr(field, 'remote_field', None) or getattr(field, 'rel', None):
+        return False
+
+    return True
+
+def unique(values):
+    """
+    Removes duplicates and empty values from the sequence given, preserving
+    the order.
+
+    :param iterable values:
+    :return list:
+    """
+    seen = set()
+    result = []
+    for value in values:
+        if value and value not in seen:
+            seen.add(value)
+            result.append(value)
+    return result
+
+def _get_keyset(queryset):
+    """
+    Gets the (unique) field the queryset given is ordered by, for the keyset
+    chunking of ``iter_batches``. Returns None if there's no such field
+    (ordered by several or non unique fields, values without the field,
+    etc.).
+
+    :param django.db.models.query.QuerySet queryset:
+    :return tuple: (unsliced queryset ordered by the field, lookup of the
+        next chunk, function getting the field value of an item, offset and
+        limit of the slice)
+    """
+    query = queryset.query
+    if query.extra_order_by:
+        return None
+    offset = query.low_mark
+    limit = None if query.high_mark is None \
+            else query.high_mark - query.low_mark
+
+    opts = queryset.model._meta
+    if query.order_by:
+        ordering = list(query.order_by)
+    elif query.default_ordering and opts.ordering:
+        ordering = list(opts.ordering)
+    else:
+        ordering = ['pk']
+    if 1 != len(ordering):
+        return None
+
+    name = ordering[0]
+    descending = name.startswith('-')
+    name = name.lstrip('-')
+    try:
+        field = opts.pk if 'pk' == name else opts.get_field(name)
+    except Exception as e:
+        return None
+    if not field.unique:
+        return None
+
+    if ModelIterable is not None:
+        of_instances = queryset._iterable_class is ModelIterable
+    else:
+        of_instances = not isinstance(queryset, ValuesQuerySet)
+    if of_instances:
+        get_value = lambda obj: getattr(obj, field.attname)
+    else:
+        # ``values`` (dicts) or ``values_list`` (tuples or flat values)
+        names = list(getattr(queryset, '_fields', None) or ())
+        for alias in (name, field.name, 'pk' if field is opts.pk else None):
+            if alias in names:
+                index = names.index(alias)
+                break
+        else:
+            return None
+
+        def get_value(row):
+            if isinstance(row, dict):
+                return row[alias]
+            if isinstance(row, tuple):
+                return row[index]
+            return row
+
+    queryset = queryset.all()
+    queryset.query.clear_limits()
+    queryset = queryset.order_by(ordering[0])
+    lookup = '{0}__{1}'.format(field.name, 'lt' if descending else 'gt')
+    return (queryset, lookup, get_value, offset, limit)
+
+def _iter_keyset_batches(queryset, chunk_size, lookup, get_value, offset=0, \
+                         limit=None):
+    """
+    Yields the items of the queryset given in lists of ``chunk_size`` items
+    (at most), with a query per list: the rows following the last item of
+    the previous list (keyset chunking). The first list starts at the
+    ``offset`` given and ``limit`` items are yielded at most.
+
+    :param django.db.models.query.QuerySet queryset:
+    :param int chunk_size:
+    :param str lookup:
+    :param callable get_value:
+    :param int offset:
+    :param int limit:
+    :return generator:
+    """
+    chunk = queryset
+    while True:
+        size = chunk_size if limit is None else min(chunk_size, limit)
+        if size < 1:
+            return
+        batch = list(chunk[offset:offset + size])
+        if not batch:
+            return
+        last = get_value(batch[-1])
+        yield batch
+        if len(batch) < size:
+            return
+        if limit is not None:
+            limit -= len(batch)
+        chunk, offset = queryset.filter(**{lookup: last}), 0
+
+def _iter_chunks(items, chunk_size):
+    """
+    Yields the items of the iterator given in lists of ``chunk_size`` items
+    (at most).
+
+    :param iterator items:
+    :param int chunk_size:
+    :return generator:
+    """
+    while True:
+        batch = list(islice(items, chunk_size))
+        if not batch:
+            return
+        yield batch
+
+def iter_batches(items, chunk_size, separate_queries=False):
+    """
+    Yields the items given in lists of ``chunk_size`` items (at most),
+    holding a single list in memory at a time.
+
+    Querysets are iterated with ``QuerySet.iterator`` (rows are fetched
+    ``chunk_size`` at a time, with a server-side cursor on PostgreSQL) and
+    never cached. Since the ``iterator`` ignores the ``prefetch_related``
+    (Django < 4.1), the prefetch lookups of the queryset are applied to
+    every list instead (a query per lookup and list).
+
+    Django < 1.11 has no server-side cursors (all the rows of the
+    ``iterator`` are fetched by the database driver at once), so the
+    querysets ordered by a unique field (the primary key if not ordered)
+    are fetched with a query per list instead (``WHERE field > last value
+    of the previous list LIMIT chunk_size``). The rest are iterated with the
+    ``iterator``.
+
+    With ``separate_queries``, every list is fetched with its own query (no
+    database cursor is kept open between the lists, so they may be
+    consumed by different threads), the keyset way as well. The querysets,
+    which can't be fetched that way, are fetched at once.
+
+    :param iterable items: Queryset or any other iterable.
+    :param int chunk_size:
+    :param bool separate_queries:
+    :return generator:
+    """
+    lookups = getattr(items, '_prefetch_related_lookups', None)
+    if lookups:
+        items = items.prefetch_related(None)
+
+    keyset = None
+    if isinstance(items, QuerySet) \
+       and (separate_queries or django.VERSION < (1, 11)):
+        keyset = _get_keyset(items)
+    if keyset is not None:
+        batches = _iter_keyset_batches(keyset[0], chunk_size, *keyset[1:])
+    elif separate_queries:
+        batches = _iter_chunks(iter(list(items)), chunk_size)
+    else:
+        if hasattr(items, 'iterator'):
+            if django.VERSION >= (2, 0):
+                items = items.iterator(chunk_size=chunk_size)
+            else:
+                items = items.iterator()
+        batches = _iter_chunks(iter(items), chunk_size)
+
+    for batch in batches:
+        if lookups:
+            prefetch_related_objects(batch, *lookups)
+        yield batch
+
+def get_default_site():
+    """
+    Gets the current site of the sites framework. Returns None if the sites
+    framework is not installed (or the current site does not exist).
+
+    :return django.contrib.sites.models.Site:
+    """
+    # Imported here, since the package is imported before the models can be
+    # (app loading of Django >= 1.9)
+    from django.contrib.sites.models import Site
+
+    try:
+        from django.apps import apps
+        installed = apps.is_installed('django.contrib.sites')
+    except ImportError: # Django < 1.7
+        installed = Site._meta.installed
+    if not installed:
+        return None
+    try:
+        return Site.objects.get_current()
+    except Site.DoesNotExist:
+        return None
+
+def as_datetime(value):
+    """
+    Turns the date (or datetime) given into a datetime, so that the values
+    can be compared: aware (naive values taken as in the current time zone)
+    if the ``USE_TZ`` is on, naive (in the current time zone) otherwise.
+
+    :param datetime.date value:
+    :return datetime.datetime:
+    """
+    if value is None:
+        return None
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time())
+    if settings.USE_TZ:
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value, timezone.get_current_timezone())
+    elif timezone.is_aware(value):
+        value = timezone.make_naive(value, timezone.get_current_timezone())
+    return value
+
+def is_urlconf_loaded(urlconf=None):
+    """
+    Checks if the URLconf given (``ROOT_URLCONF`` if None) has finished
+    loading (has the ``urlpatterns``). Sitemaps used at start up may be
+    resolved against a URLconf, which is still being imported.
+
+    :param str urlconf: URLconf module (or its name).
+    :return bool:
+    """
+    if urlconf is None:
+        urlconf = settings.ROOT_URLCONF
+    if isinstance(urlconf, string_types):
+        urlconf = sys.modules.get(urlconf)
+    return urlconf is not None and hasattr(urlconf, 'urlpatterns')
@@ -1,21 +1,249 @@
 __title__ = 'qartez.views'
 __author__ = 'Artur Barseghyan <artur.barseghyan@gmail.com>'
-__all__ = ('render_images_sitemap',)
+__all__ = (
+    'render_images_sitemap', 'render_sitemap', 'images_sitemap_index',
+    'cache_sitemap_page', 'cached_images_sitemap', 'cached_sitemap',
+)
 
-from django.http import HttpResponse, Http404
-from django.template import loader
-from django.utils.encoding import smart_str
+import calendar
+import datetime
+from functools import partial, wraps
+from hashlib import md5
+from multiprocessing.pool import ThreadPool
+
+from django.http import HttpResponse, StreamingHttpResponse, Http404, \
+                        HttpResponseNotModified
+from django.template import loader, Context
+from django.utils.encoding import smart_str, force_bytes
+from django.utils import timezone
+from django.utils.http import http_date, parse_http_date_safe, parse_etags, \
+                              quote_etag
 from django.core.paginator import EmptyPage, PageNotAnInteger
+from django.db import connections
+
+try:
+    from django.urls import reverse
+except ImportError: # Django < 1.10
+    from django.core.urlresolvers import reverse
+
+try:
+    from django.contrib.sites.shortcuts import get_current_site
+except ImportError: # Django < 1.7
+    from django.contrib.sites.models import get_current_site
+
+import qartez
+from qartez.cache import page_cache, get_page_cache_key, \
+                         get_page_cache_timeout
+from qartez.constants import IMAGES_SITEMAP_HEADER, IMAGES_SITEMAP_FOOTER
+from qartez.instrumentation import Measurement, Sampling, get_sampling
+from qartez.serializers import serialize_image_url, serialize_images_urlset
+from qartez.settings import CONCURRENT_SECTIONS_MAX_WORKERS
+from qartez.sizing import record_page_size
+from qartez.stats import get_section_stats, get_page_validator
+
+def _get_url_renderer(template_name):
+    """
+    Loads the template given once and returns a function, which renders a
+    single URL entry with it.
+
+    :param str template_name:
+    :return callable:
+    """
+    template = loader.get_template(template_name)
+    # Templates of the Django >= 1.8 template backends accept plain dicts
+    # (and wrap the original template object), older ones want a ``Context``.
+    if hasattr(template, 'template'):
+        return lambda url: template.render({'url': url})
+    return lambda url: template.render(Context({'url': url}))
+
+def _get_timestamp(value):
+    """
+    Converts the date (or datetime) given into a UNIX timestamp. Dates are
+    taken as the midnight and naive values as in the current time zone.
+
+    :param datetime.date value:
+    :return int:
+    """
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time())
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, timezone.get_current_timezone())
+    return calendar.timegm(value.utctimetuple())
+
+def _get_conditional_headers(parts, lastmods):
+    """
+    Builds the ``ETag`` and ``Last-Modified`` header values. ``ETag`` is a
+    hash of the parts given and the ``qartez`` version.
+
+    :param list parts:
+    :param list lastmods:
+    :return tuple: (etag, last_modified timestamp or None)
+    """
+    parts = [qartez.__version__] + [smart_str(part) for part in parts]
+    etag = md5(force_bytes(':'.join(parts))).hexdigest()
+    # Converted before compared, since the dates and datetimes (as well as
+    # the naive and aware ones) don't compare
+    timestamps = [
+        _get_timestamp(lastmod) for lastmod in lastmods if lastmod is not None
+        ]
+    last_modified = max(timestamps) if timestamps else None
+    return (etag, last_modified)
+
+def _get_conditional_response(request, etag, last_modified):
+    """
+    Returns the "304 Not Modified" response if the validators sent by the
+    client match (``If-None-Match`` takes precedence over
+    ``If-Modified-Since``), or an empty response for ``HEAD`` requests.
+    Returns None otherwise (the content shall be generated).
+
+    :param django.http.HttpRequest request:
+    :param str etag:
+    :param int last_modified:
+    :return django.http.HttpResponse:
+    """
+    response = None
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+    if if_none_match:
+        # Django < 1.11 strips the quotes, later versions keep them
+        etags = parse_etags(if_none_match)
+        if etag in etags or quote_etag(etag) in etags or '*' in etags:
+            response = HttpResponseNotModified()
+    elif if_modified_since and last_modified is not None:
+        if_modified_since = parse_http_date_safe(if_modified_since)
+        if if_modified_since is not None \
+           and last_modified <= if_modified_since:
+            response = HttpResponseNotModified()
+
+    if response is None and 'HEAD' == request.method:
+        response = HttpResponse(content_type='application/xml')
+
+    if response is not None:
+        _set_conditional_headers(response, etag, last_modified)
+    return response
+
+def _set_conditional_headers(response, etag, last_modified):
+    """
+    Sets the ``ETag`` and ``Last-Modified`` headers.
+
+    :param django.http.HttpResponse response:
+    :param str etag:
+    :param int last_modified:
+    """
+    response['ETag'] = quote_etag(etag)
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+
+def _stream_images_sitemap(url_iterators, url_template_name=None):
+    """
+    Yields the images sitemap XML chunk by chunk, one ``<url>`` element at a
+    time.
+
+    :param list url_iterators: List of iterables of URL entries.
+    :param str url_template_name: When None, the entries are written with
+        the ``qartez.serializers.serialize_image_url``.
+    :return generator:
+    """
+    if url_template_name is None:
+        render_url = serialize_image_url
+    else:
+        render_url = _get_url_renderer(url_template_name)
+    yield IMAGES_SITEMAP_HEADER
+    for urls in url_iterators:
+        for url in urls:
+            yield smart_str(render_url(url).strip())
+    yield IMAGES_SITEMAP_FOOTER
+
+def _xml_response(xml):
+    """
+    Wraps the XML given into a response.
+
+    :param str xml:
+    :return django.http.HttpResponse:
+    """
+    try:
+        return HttpResponse(xml, mimetype='application/xml')
+    except TypeError:
+        return HttpResponse(xml, content_type='application/xml')
+
+def _get_section_urls(site, page, sampled=None):
+    """
+    Gets the URL entries of the sitemap page given and closes the database
+    connections of the (pool) thread.
+
+    :param django.contrib.sitemaps.Sitemap site:
+    :param int page:
+    :param bool sampled: Sampling decision of the measurement of the
+        request (see ``qartez.instrumentation.get_sampling``).
+    :return list:
+    """
+    try:
+        with Sampling(sampled):
+            return site.get_urls(page)
+    finally:
+        for connection in connections.all():
+            connection.close()
+
+def _get_urls_concurrently(maps, page):
+    """
+    Gets the URL entries of the page given of all the sitemaps given at the
+    same time, on a pool of ``CONCURRENT_SECTIONS_MAX_WORKERS`` threads.
+
+    :param list maps:
+    :param int page:
+    :return list: List of the lists of URL entries (in the order of maps).
+    """
+    pool = ThreadPool(min(len(maps), CONCURRENT_SECTIONS_MAX_WORKERS))
+    try:
+        return pool.map(
+            partial(_get_section_urls, page=page, sampled=get_sampling()),
+            maps
+            )
+    finally:
+        pool.close()
+        pool.join()
 
 def render_images_sitemap(request, sitemaps, section=None, \
-                          template_name='qartez/images_sitemap.xml'):
+                          template_name='qartez/images_sitemap.xml', \
+                          streaming=False, \
+                          url_template_name='qartez/images_sitemap_url.xml', \
+                          conditional=False, concurrent=False):
     """
     Renders images sitemap.
 
+    When the ``template_name`` is set to None, the XML is written with the
+    ``qartez.serializers`` instead of the template (many times faster, but
+    the overrides of the template in the project are not used).
+
+    When ``streaming`` is set to True, a ``StreamingHttpResponse`` is
+    returned and the ``<url>`` elements are written one by one (rendered
+    with the ``url_template_name`` template, or serialized if it's set to
+    None) as the URL entries are being produced, instead of building the
+    whole document in memory. The ``template_name`` is not used in that
+    case.
+
+    When ``conditional`` is set to True, ``ETag`` and ``Last-Modified``
+    headers are sent, based on the page validators (see
+    ``qartez.stats.get_page_validator``; all the sitemaps shall have the
+    ``date_field`` set). Conditional requests (``If-None-Match``,
+    ``If-Modified-Since``) are answered with "304 Not Modified" and ``HEAD``
+    requests with an empty body, without building any URL entries.
+
+    When ``concurrent`` is set to True and no ``section`` is given, the
+    sections are built at the same time, on a pool of
+    ``CONCURRENT_SECTIONS_MAX_WORKERS`` threads (each with its own database
+    connection, so the uncommitted changes of the request are not seen),
+    and merged in the order of the ``sitemaps``. Has no effect when
+    ``streaming``.
+
     :param django.http.HttpRequest request:
     :param sitemaps:
     :param secion:
     :param str template_name:
+    :param bool streaming:
+    :param str url_template_name:
+    :param bool conditional:
+    :param bool concurrent:
     :return django.http.HttpResponse:
     """
     maps, urls = [], []
@@ -28,20 +256,282 @@ def render_images_sitemap(request, sitemaps, section=None, \
     else:
         maps = sitemaps.values()
     page = request.GET.get("p", 1)
-    for site in maps:
+    maps = [site() if callable(site) else site for site in maps]
+
+    etag = last_modified = None
+    if conditional:
+        parts = [section, page, request.get_host(), request.is_secure(),
+                 template_name, streaming, url_template_name]
+        lastmods = []
+        for site in maps:
+            try:
+                validator = get_page_validator(site, page)
+            except EmptyPage:
+                raise Http404("Page {0} empty".format(page))
+            except PageNotAnInteger:
+                raise Http404("No page {0}".format(page))
+            if validator is None:
+                break
+            parts.extend(validator)
+            lastmods.append(validator[1])
+        else:
+            etag, last_modified = _get_conditional_headers(parts, lastmods)
+            response = _get_conditional_response(
+                request, etag, last_modified
+                )
+            if response is not None:
+                return response
+
+    with Measurement('render', section=section, page=page) as measurement:
         try:
-            if callable(site):
-                urls.extend(site().get_urls(page))
+            if concurrent and not streaming and len(maps) > 1:
+                for site_urls in _get_urls_concurrently(maps, page):
+                    urls.extend(site_urls)
             else:
-                urls.extend(site.get_urls(page))
+                for site in maps:
+                    if streaming and hasattr(site, 'iter_urls'):
+                        # Page is validated right away, the items are
+                        # fetched lazily
+                        urls.append(site.iter_urls(page))
+                    elif streaming:
+                        urls.append(site.get_urls(page))
+                    else:
+                        urls.extend(site.get_urls(page))
         except EmptyPage:
             raise Http404("Page {0} empty".format(page))
         except PageNotAnInteger:
             raise Http404("No page {0}".format(page))
-    xml = smart_str(loader.render_to_string(
-        template_name, {'urlset': urls, 'request': request})
-        )
-    try:
-        return HttpResponse(xml, mimetype='application/xml')
-    except TypeError:
-        return HttpResponse(xml, content_type='application/xml')
+
+        if streaming:
+            response = StreamingHttpResponse(
+                _stream_images_sitemap(urls, url_template_name),
+                content_type='application/xml'
+                )
+        else:
+            if template_name is None:
+                response = _xml_response(serialize_images_urlset(urls))
+            else:
+                response = _xml_response(smart_str(loader.render_to_string(
+                    template_name, {'urlset': urls, 'request': request})
+                    ))
+            measurement.set(items=len(urls), bytes=len(response.content))
+            if 1 == len(maps):
+                record_page_size(maps[0], len(urls), len(response.content))
+
+    if etag is not None:
+        _set_conditional_headers(response, etag, last_modified)
+    return response
+
+def render_sitemap(request, sitemaps, section=None, template_name=None):
+    """
+    Renders the sitemap (same as the ``django.contrib.sitemaps.views.sitemap``
+    view). The XML is written with the ``urlset_serializer`` of the
+    sitemaps (``qartez.RelAlternateHreflangSitemap`` for instance; all the
+    sitemaps shall share the same one), unless the ``template_name`` is
+    given. Sitemaps without serializer are rendered with the Django default
+    "sitemap.xml" template.
+
+    :param django.http.HttpRequest request:
+    :param dict sitemaps:
+    :param str section:
+    :param str template_name:
+    :return django.http.HttpResponse:
+    """
+    if section is not None:
+        if section not in sitemaps:
+            raise Http404(
+                "No sitemap available for section: {0}".format(section)
+                )
+        maps = [sitemaps[section]]
+    else:
+        maps = sitemaps.values()
+    maps = [site() if callable(site) else site for site in maps]
+
+    page = request.GET.get("p", 1)
+    current_site = get_current_site(request)
+    protocol = 'https' if request.is_secure() else 'http'
+
+    urls = []
+    with Measurement('render', section=section, page=page) as measurement:
+        for site in maps:
+            try:
+                urls.extend(site.get_urls(
+                    page=page, site=current_site, protocol=protocol
+                    ))
+            except EmptyPage:
+                raise Http404("Page {0} empty".format(page))
+            except PageNotAnInteger:
+                raise Http404("No page {0}".format(page))
+
+        serializers = set(
+            getattr(site, 'urlset_serializer', None) for site in maps
+            )
+        if template_name is None and 1 == len(serializers) \
+           and None not in serializers:
+            response = _xml_response(serializers.pop()(urls))
+        else:
+            response = _xml_response(smart_str(loader.render_to_string(
+                template_name or 'sitemap.xml',
+                {'urlset': urls, 'request': request}
+                )))
+        measurement.set(items=len(urls), bytes=len(response.content))
+        if 1 == len(maps):
+            record_page_size(maps[0], len(urls), len(response.content))
+    return response
+
+def images_sitemap_index(request, sitemaps, \
+                         template_name='qartez/sitemap_index.xml', \
+                         sitemap_url_name='qartez.views.render_images_sitemap', \
+                         conditional=False):
+    """
+    Renders the sitemap index, listing every page of every section given.
+    Number of pages and the ``lastmod`` of each page are taken from the
+    (cached) section stats (see ``qartez.stats.get_section_stats``) - at
+    most one aggregate query per section is made, the items are never
+    fetched.
+
+    The ``sitemap_url_name`` URL shall accept the ``section`` keyword
+    argument.
+
+    When ``conditional`` is set to True, ``ETag`` and ``Last-Modified``
+    headers (based on the section stats) are sent and the conditional and
+    ``HEAD`` requests are answered without rendering.
+
+    :param django.http.HttpRequest request:
+    :param dict sitemaps:
+    :param str template_name:
+    :param str sitemap_url_name:
+    :param bool conditional:
+    :return django.http.HttpResponse:
+    """
+    current_site = get_current_site(request)
+    request_protocol = 'https' if request.is_secure() else 'http'
+
+    entries, parts = [], [request.get_host(), request_protocol, template_name]
+    for section, site in sitemaps.items():
+        if callable(site):
+            site = site()
+        protocol = site.protocol if site.protocol is not None \
+                                 else request_protocol
+        sitemap_url = reverse(sitemap_url_name, kwargs={'section': section})
+        absolute_url = '{0}://{1}{2}'.format(
+            protocol, current_site.domain, sitemap_url
+            )
+
+        stats = get_section_stats(section, site)
+        parts.extend([section, stats['count'], stats['lastmod']])
+        for page in range(1, stats['num_pages'] + 1):
+            entries.append({
+                'location': absolute_url if 1 == page \
+                            else '{0}?p={1}'.format(absolute_url, page),
+                'lastmod': stats['pages'][page - 1],
+                })
+
+    etag = last_modified = None
+    if conditional:
+        etag, last_modified = _get_conditional_headers(
+            parts, [entry['lastmod'] for entry in entries]
+            )
+        response = _get_conditional_response(request, etag, last_modified)
+        if response is not None:
+            return response
+
+    response = _xml_response(smart_str(loader.render_to_string(
+        template_name, {'sitemaps': entries, 'request': request})
+        ))
+
+    if etag is not None:
+        _set_conditional_headers(response, etag, last_modified)
+    return response
+
+def cache_sitemap_page(view):
+    """
+    Decorator caching the responses of a sitemap view (any view accepting
+    the ``sitemaps`` dict and an optional ``section``) in the two tier page
+    cache (see ``qartez.cache.PageCache``).
+
+    Pages are cached per section (and its version - see
+    ``qartez.cache.invalidate_page_cache``), page number, site domain,
+    protocol, ``PAGE_CACHE_VERSION`` setting and the view options, for the
+    ``page_cache_timeout`` seconds of the sitemap (``PAGE_CACHE_TIMEOUT``
+    by default; zero disables the cache). Streaming responses and the
+    responses other than "200 OK" are not cached. Headers (``ETag`` and
+    ``Last-Modified`` included) are stored along and the conditional
+    requests are answered from the cache.
+
+    :param callable view:
+    :return callable:
+    """
+    @wraps(view)
+    def wrapper(request, sitemaps, section=None, **kwargs):
+        if kwargs.get('streaming', False) \
+           or request.method not in ('GET', 'HEAD') \
+           or (section is not None and section not in sitemaps):
+            return view(request, sitemaps, section=section, **kwargs)
+
+        sections = [section] if section is not None \
+                             else sorted(sitemaps.keys())
+        timeout = get_page_cache_timeout(
+            [sitemaps[name] for name in sections]
+            )
+        if not timeout:
+            return view(request, sitemaps, section=section, **kwargs)
+
+        page = request.GET.get('p', 1)
+        cache_key = get_page_cache_key(
+            sections,
+            page,
+            get_current_site(request).domain,
+            'https' if request.is_secure() else 'http',
+            extra=['{0}.{1}'.format(view.__module__, view.__name__)] + [
+                '{0}={1}'.format(key, value) \
+                for key, value in sorted(kwargs.items())
+                ]
+            )
+
+        with Measurement('cache', section=section, page=page) as measurement:
+            entry = page_cache.get(cache_key)
+            measurement.set(cache='miss' if entry is None else 'hit')
+            if entry is None:
+                response = view(request, sitemaps, section=section, **kwargs)
+                if 200 != response.status_code or response.streaming \
+                   or 'HEAD' == request.method:
+                    return response
+                if hasattr(response, 'render') and callable(response.render):
+                    response.render()
+                etag = response.get('ETag')
+                last_modified = response.get('Last-Modified')
+                entry = {
+                    'content': response.content,
+                    'headers': [
+                        (header, value) \
+                        for header, value in response.items() \
+                        if 'content-length' != header.lower()
+                        ],
+                    'etag': etag.strip('"') if etag else None,
+                    'last_modified': parse_http_date_safe(last_modified) \
+                                     if last_modified else None,
+                    }
+                page_cache.set(cache_key, entry, timeout)
+                measurement.set(bytes=len(entry['content']))
+                return response
+
+            if entry['etag'] is not None:
+                response = _get_conditional_response(
+                    request, entry['etag'], entry['last_modified']
+                    )
+                if response is not None:
+                    return response
+
+            response = HttpResponse(entry['content'])
+            for header, value in entry['headers']:
+                response[header] = value
+            measurement.set(bytes=len(entry['content']))
+            return response
+    return wrapper
+
+# Images sitemap (see ``render_images_sitemap``), cached.
+cached_images_sitemap = cache_sitemap_page(render_images_sitemap)
+
+# Sitemap (see ``render_sitemap``), cached.
+cached_sitemap = cache_sitemap_page(render_sitemap)